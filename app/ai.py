@@ -1,18 +1,34 @@
-import re
 import os
 import json
+import time
+import asyncio
 from openai import AsyncOpenAI
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator, Hashable, Tuple
 from datetime import datetime, timedelta, timezone
 
 from config import API_KEY
 from app.logger import logger
+from app.metrics import Metrics
+from app.ai_cache import ResponseCache
+from app.transport import Transport, CircuitOpenError
+from app.streaming import PayloadStream
+from app.ai_json import JsonExtractor, TaskDiff
+from app.prompt_builder import PromptBuilder
 
 class AI:
   MODEL = "xiaomi/mimo-v2-flash:free"
-  BASE_URL = "https://openrouter.ai/api/v1"
+  STREAM_REPLIES = os.getenv("AI_STREAM_REPLIES", "1") == "1"
+  BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+  # Пакетные дайджесты: бюджет токенов одного запроса (вход + ожидаемый ответ) и предел пользователей в нем
+  DIGEST_BATCH_TOKENS = int(os.getenv("AI_DIGEST_BATCH_TOKENS", "6000"))
+  DIGEST_BATCH_SIZE = int(os.getenv("AI_DIGEST_BATCH_SIZE", "40"))
+  DIGEST_REPORT_TOKENS = 150
+
+  # Одновременных запросов дайджестов: сбой провайдера не должен превращаться в лавину поштучных запросов
+  DIGEST_CONCURRENCY = int(os.getenv("AI_DIGEST_CONCURRENCY", "4"))
     
-  client = AsyncOpenAI(base_url=BASE_URL, api_key=API_KEY)
+  client: Optional[AsyncOpenAI] = None
 
   PROMPTS_DIR = "app/prompts"
     
@@ -37,10 +53,40 @@ class AI:
     return cls._prompts_cache.get(filename, "")
 
   @classmethod
-  async def _ask_ai(cls, messages: List[Dict[str, str]], json_mode: bool = False) -> str:
+  def get_client(cls) -> AsyncOpenAI:
+
+    """Ленивое создание клиента OpenRouter с настроенным транспортом"""
+
+    if cls.client is None:
+      cls.client = Transport.build_client(cls.BASE_URL, API_KEY)
+
+    return cls.client
+
+  @classmethod
+  async def close(cls) -> None:
+
+    """Закрывает пул соединений клиента"""
+
+    if cls.client is not None:
+      await cls.client.close()
+      cls.client = None
+
+  @classmethod
+  async def _ask_ai(cls, messages: List[Dict[str, str]], json_mode: bool = False, cache: bool = True, kind: str = "other") -> str:
       
     """Единый внутренний метод для всех запросов к ИИ"""
 
+    if not cache:
+      return await cls._request(messages, json_mode, kind)
+
+    key = ResponseCache.make_key(cls.MODEL, messages, json_mode)
+    return await ResponseCache.get_or_call(key, lambda: cls._request(messages, json_mode, kind))
+
+  @classmethod
+  async def _request(cls, messages: List[Dict[str, str]], json_mode: bool = False, kind: str = "other") -> str:
+
+    """Запрос к OpenRouter без кэша"""
+
     try:
       kwargs = {
         "model": cls.MODEL,
@@ -50,73 +96,267 @@ class AI:
       if json_mode:
         kwargs["response_format"] = {"type": "json_object"}
 
-      completion = await cls.client.chat.completions.create(**kwargs)
-        
+      client = cls.get_client()
+      with Metrics.LLM_SECONDS.time(prompt=kind):
+        completion = await Transport.call(lambda: client.chat.completions.create(**kwargs))
+
+      cls._count_tokens(kind, completion.usage)
       return completion.choices[0].message.content or ""
       
     except Exception as e:
+      Metrics.LLM_ERRORS.inc(prompt=kind)
       logger.error(f"Ошибка API OpenRouter: {e}")
       raise e
 
-  @staticmethod
-  def _parse_json(text: str) -> Dict[str, Any]:
-        
-    """Универсальный и безопасный парсер JSON из текста"""
+  @classmethod
+  async def _stream_ai(cls, messages: List[Dict[str, str]], json_mode: bool = False, kind: str = "other") -> AsyncIterator[str]:
+
+    """
+    Потоковый запрос к OpenRouter (stream=True), отдает куски текста. Дедлайн
+    Transport общий на открытие потока и чтение всех кусков: поток, застрявший
+    на середине, обрывается с asyncio.TimeoutError и не держит ход пользователя
+    """
+
+    kwargs = {
+      "model": cls.MODEL,
+      "messages": messages,
+      "stream": True,
+      "stream_options": {"include_usage": True},
+    }
+
+    if json_mode:
+      kwargs["response_format"] = {"type": "json_object"}
+
+    started = time.perf_counter()
+    deadline = time.monotonic() + Transport.DEADLINE
+    stream = None
 
     try:
-      return json.loads(text)
-      
-    except json.JSONDecodeError:
-      match = re.search(r'(\{.*\})', text, re.DOTALL)
-        
-      if match:
+      client = cls.get_client()
+      stream = await Transport.call(lambda: client.chat.completions.create(**kwargs))
+      chunks = stream.__aiter__()
+
+      while True:
         try:
-          return json.loads(match.group(1))
-          
-        except:
-          pass
-        
-    return {"added_tasks": [], "deleted_tasks": [], "updated_tasks": [], "reply": text}
+          # Ожидание ограничено только чтением куска: потребитель между yield не прерывается
+          chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(deadline - time.monotonic(), 0.0))
+
+        except StopAsyncIteration:
+          break
+
+        if chunk.usage:
+          cls._count_tokens(kind, chunk.usage)
+
+        if chunk.choices and chunk.choices[0].delta.content:
+          yield chunk.choices[0].delta.content
+
+    except Exception as e:
+      Metrics.LLM_ERRORS.inc(prompt=kind)
+      logger.error(f"Ошибка потокового API OpenRouter: {e.__class__.__name__} {e}")
+      raise e
+
+    finally:
+      if stream is not None:
+        await stream.close()
+      Metrics.LLM_SECONDS.observe(time.perf_counter() - started, prompt=kind)
+
+  @staticmethod
+  def _count_tokens(kind: str, usage: Any) -> None:
+    if usage is None:
+      return
+
+    Metrics.LLM_TOKENS.inc(usage.prompt_tokens or 0, prompt=kind, direction="in")
+    Metrics.LLM_TOKENS.inc(usage.completion_tokens or 0, prompt=kind, direction="out")
+
+  @staticmethod
+  def cache_stats() -> Dict[str, Any]:
+
+    """Счетчики попаданий и промахов кэша ответов"""
+
+    return ResponseCache.stats()
+
+  @classmethod
+  def _build_chat_messages(cls, prompt: str, tz_offset: int, tasks: List[Any], history: List[Any], summary: Optional[str] = None) -> List[Dict[str, str]]:
+
+    """Сборка сообщений для извлечения задач в пределах бюджета токенов"""
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=tz_offset)
+    time_str = now.strftime("%Y-%m-%d %H:%M:%S")
+
+    return PromptBuilder.build(
+      template=cls._get_prompt('system_prompt.txt'),
+      time_str=time_str,
+      now=now,
+      prompt=prompt,
+      tasks=tasks,
+      history=history,
+      summary=summary
+    )
 
   @classmethod
-  async def extract_tasks_from_ai(cls, prompt: str, tz_offset: int, tasks: List[Any], history: List[Any]) -> Dict[str, Any]:
+  async def extract_tasks_from_ai(cls, prompt: str, tz_offset: int, tasks: List[Any], history: List[Any], summary: Optional[str] = None) -> TaskDiff:
       
     """Извлечение задач из текста"""
 
-    tasks_str = "\n".join([f"- {t.name}" for t in tasks]) if tasks else "Пусто"
-    now = datetime.now(timezone.utc).replace(tzinfo=None)
-    time_str = (now + timedelta(hours=tz_offset)).strftime("%Y-%m-%d %H:%M:%S")
+    messages = cls._build_chat_messages(prompt, tz_offset, tasks, history, summary)
+    raw_response = await cls._ask_ai(messages, json_mode=True, cache=False, kind="chat")
+    
+    return TaskDiff.parse(raw_response)
 
-    template = cls._get_prompt('system_prompt.txt')
-    system_instructions = template.format(
-      current_time_str=time_str, 
-      tasks_str=tasks_str
-    )
+  @classmethod
+  async def stream_tasks_from_ai(cls, prompt: str, tz_offset: int, tasks: List[Any], history: List[Any], summary: Optional[str] = None) -> AsyncIterator[PayloadStream]:
 
-    messages = [
-      {"role": "system", "content": system_instructions},
-    ]
+    """Потоковое извлечение задач: после каждого куска отдает состояние разбора"""
 
-    for msg in history:
-      messages.append({"role": msg.role, "content": msg.content})
+    messages = cls._build_chat_messages(prompt, tz_offset, tasks, history, summary)
+    payload = PayloadStream()
 
-    messages.append({"role": "user", "content": prompt})
+    async for chunk in cls._stream_ai(messages, json_mode=True, kind="chat"):
+      payload.feed(chunk)
+      yield payload
 
-    raw_response = await cls._ask_ai(messages, json_mode=True)
-    
-    return cls._parse_json(raw_response)
+  @staticmethod
+  def format_day_tasks(tasks: List[Any]) -> str:
+    return "\n".join([f"- {t.name} ({t.deadline.strftime('%H:%M')})" for t in tasks]) if tasks else "Планов нет."
 
   @classmethod
   async def generate_morning_report(cls, name: str, tasks: List[Any]) -> str:
     
     """Генерация утреннего дайджеста"""
     
-    tasks_text = "\n".join([f"- {t.name} ({t.deadline.strftime('%H:%M')})" for t in tasks]) if tasks else "Планов нет."
-        
+    return await cls._morning_report(name, cls.format_day_tasks(tasks))
+
+  @classmethod
+  async def _morning_report(cls, name: str, tasks_text: str) -> str:
     template = cls._get_prompt('morning_report.txt')
     prompt = template.format(name=name, tasks_text=tasks_text)
 
-    return await cls._ask_ai([{"role": "user", "content": prompt}])
+    return await cls._ask_ai([{"role": "user", "content": prompt}], kind="morning_report")
+
+  @classmethod
+  async def generate_morning_reports(cls, users: Dict[Hashable, Tuple[str, List[Any]]]) -> Dict[Hashable, str]:
+
+    """
+    Дайджесты для многих пользователей: пачки по бюджету токенов уходят одним
+    JSON-запросом, пользователи без разобранного ответа генерируются поштучно.
+    Пользователя, для которого не удалось ни то ни другое, в результате нет
+    """
+
+    entries = [(key, name, cls.format_day_tasks(tasks)) for key, (name, tasks) in users.items()]
+    limit = asyncio.Semaphore(cls.DIGEST_CONCURRENCY)
+    batches = await asyncio.gather(*(cls._morning_reports_batch(batch, limit) for batch in cls._digest_batches(entries)))
+
+    reports: Dict[Hashable, str] = {}
+    for batch in batches:
+      reports.update(batch)
+
+    return reports
+
+  @classmethod
+  def _digest_batches(cls, entries: List[Tuple[Hashable, str, str]]) -> List[List[Tuple[Hashable, str, str]]]:
+
+    """Делит пользователей на пачки: вход и ожидаемые ответы укладываются в DIGEST_BATCH_TOKENS"""
+
+    overhead = PromptBuilder.count_tokens(cls._get_prompt('morning_report_batch.txt'))
+    batches: List[List[Tuple[Hashable, str, str]]] = []
+    current: List[Tuple[Hashable, str, str]] = []
+    used = overhead
+
+    for entry in entries:
+      cost = PromptBuilder.count_tokens(entry[1]) + PromptBuilder.count_tokens(entry[2]) + cls.DIGEST_REPORT_TOKENS
+
+      if current and (used + cost > cls.DIGEST_BATCH_TOKENS or len(current) >= cls.DIGEST_BATCH_SIZE):
+        batches.append(current)
+        current, used = [], overhead
+
+      current.append(entry)
+      used += cost
+
+    if current:
+      batches.append(current)
+
+    return batches
+
+  @classmethod
+  async def _morning_reports_batch(
+    cls,
+    batch: List[Tuple[Hashable, str, str]],
+    limit: asyncio.Semaphore,
+    split: bool = True
+  ) -> Dict[Hashable, str]:
+
+    """
+    Одна пачка дайджестов. Сбой запроса (транспорт, 5xx) повторяется один раз
+    двумя половинами пачки; поштучно догенерируются только записи, которых
+    не оказалось в полученном ответе
+    """
+
+    texts: Dict[str, str] = {}
+
+    if len(batch) > 1:
+      entries = [{"id": str(index), "name": name, "tasks": tasks_text} for index, (_, name, tasks_text) in enumerate(batch)]
+      prompt = cls._get_prompt('morning_report_batch.txt').format(entries=json.dumps(entries, ensure_ascii=False))
+
+      try:
+        async with limit:
+          raw_response = await cls._ask_ai([{"role": "user", "content": prompt}], json_mode=True, cache=False, kind="morning_report_batch")
+        texts = cls._parse_reports(raw_response)
+
+      except CircuitOpenError as e:
+        logger.error(f"Digest batch of {len(batch)} skipped: {e}")
+        return {}
+
+      except Exception as e:
+        if not split:
+          logger.error(f"Digest batch of {len(batch)} failed again, giving up: {e}")
+          return {}
+
+        logger.warning(f"Digest batch of {len(batch)} failed, retrying as two halves: {e}")
+        half = len(batch) // 2
+        parts = await asyncio.gather(
+          cls._morning_reports_batch(batch[:half], limit, split=False),
+          cls._morning_reports_batch(batch[half:], limit, split=False)
+        )
+        return {**parts[0], **parts[1]}
+
+    reports = {key: texts[str(index)] for index, (key, _, _) in enumerate(batch) if str(index) in texts}
+    missing = [entry for entry in batch if entry[0] not in reports]
+
+    if missing and len(batch) > 1:
+      logger.warning(f"Digest batch: {len(missing)}/{len(batch)} entries regenerated one by one")
+
+    async def single(name: str, tasks_text: str) -> str:
+      async with limit:
+        return await cls._morning_report(name, tasks_text)
+
+    results = await asyncio.gather(*(single(name, tasks_text) for _, name, tasks_text in missing), return_exceptions=True)
+
+    for (key, _, _), result in zip(missing, results):
+      if isinstance(result, BaseException):
+        logger.error(f"Morning report for {key} failed: {result}")
+        continue
+
+      reports[key] = result
+
+    return reports
+
+  @staticmethod
+  def _parse_reports(raw_response: str) -> Dict[str, str]:
+
+    """Ответ пакетного запроса -> {id: текст}; некорректные элементы пропускаются"""
+
+    data, status = JsonExtractor.loads(raw_response)
+    Metrics.LLM_JSON.inc(status=status)
+
+    items = data.get("reports") if data else None
+    if not isinstance(items, list):
+      return {}
+
+    return {
+      str(item["id"]): item["text"].strip()
+      for item in items
+      if isinstance(item, dict) and "id" in item and isinstance(item.get("text"), str) and item["text"].strip()
+    }
 
   @classmethod
   async def generate_ai_reminder_text(cls, name: str, tasks_data: str) -> str:
@@ -126,4 +366,16 @@ class AI:
     template = cls._get_prompt('reminder.txt')
     prompt = template.format(user_name=name, tasks_data=tasks_data)
 
-    return await cls._ask_ai([{"role": "user", "content": prompt}])
\ No newline at end of file
+    return await cls._ask_ai([{"role": "user", "content": prompt}], kind="reminder")
+
+  @classmethod
+  async def summarize_history(cls, summary: Optional[str], history: List[Any]) -> str:
+
+    """Дополнение конспекта диалога новыми сообщениями"""
+
+    messages_text = "\n".join([f"{msg.role}: {msg.content}" for msg in history])
+
+    template = cls._get_prompt('history_summary.txt')
+    prompt = template.format(summary=summary or "Пусто", messages=messages_text)
+
+    return await cls._ask_ai([{"role": "user", "content": prompt}], kind="history_summary")
\ No newline at end of file
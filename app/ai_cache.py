@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.logger import logger
+
+class ResponseCache:
+    """Кэш ответов ИИ с TTL, LRU-вытеснением и объединением одинаковых запросов"""
+
+    TTL = 6 * 60 * 60
+    MAX_ENTRIES = 5000
+    PERSIST_PATH: Optional[str] = os.getenv("AI_CACHE_PATH")
+
+    _entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+    _inflight: Dict[str, "asyncio.Future[Optional[str]]"] = {}
+    _loaded = False
+
+    hits = 0
+    misses = 0
+    coalesced = 0
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], json_mode: bool = False) -> str:
+
+        """Ключ кэша: модель + хэш нормализованных сообщений"""
+
+        normalized = [
+            {"role": m["role"], "content": " ".join(unicodedata.normalize("NFC", m["content"]).split())}
+            for m in messages
+        ]
+        payload = json.dumps([model, json_mode, normalized], ensure_ascii=False, separators=(",", ":"))
+
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @classmethod
+    async def get_or_call(cls, key: str, call: Callable[[], Awaitable[str]]) -> str:
+
+        """
+        Возвращает ответ из кэша или выполняет один общий запрос к API. Ошибку
+        запроса получают все ожидающие; если же отменен сам ведущий вызов
+        (например, ход его пользователя), ожидающие повторяют запрос сами
+        """
+
+        cls._load()
+
+        while True:
+            cached = cls._get(key)
+            if cached is not None:
+                cls.hits += 1
+                return cached
+
+            inflight = cls._inflight.get(key)
+            if inflight is None:
+                break
+
+            cls.coalesced += 1
+            result = await asyncio.shield(inflight)
+            if result is not None:
+                return result
+
+        cls.misses += 1
+        future: "asyncio.Future[Optional[str]]" = asyncio.get_running_loop().create_future()
+        cls._inflight[key] = future
+
+        try:
+            result = await call()
+
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+
+        except BaseException:
+
+            # Отмена относится только к вызвавшему: None будит ожидающих без ошибки
+            future.set_result(None)
+            raise
+
+        else:
+            future.set_result(result)
+            if result:
+                cls._set(key, result)
+            return result
+
+        finally:
+            if cls._inflight.get(key) is future:
+                del cls._inflight[key]
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "coalesced": cls.coalesced,
+            "size": len(cls._entries),
+        }
+
+    @classmethod
+    def save(cls) -> None:
+
+        """Сохраняет непросроченные записи на диск (если задан PERSIST_PATH)"""
+
+        if not cls.PERSIST_PATH:
+            return
+
+        now = time.time()
+        entries = {k: v for k, v in cls._entries.items() if v[0] > now}
+        tmp_path = f"{cls.PERSIST_PATH}.tmp"
+
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, cls.PERSIST_PATH)
+
+        except OSError as e:
+            logger.error(f"Не удалось сохранить кэш ответов ИИ: {e}")
+
+    @classmethod
+    def _load(cls) -> None:
+        if cls._loaded:
+            return
+
+        cls._loaded = True
+        if not cls.PERSIST_PATH or not os.path.exists(cls.PERSIST_PATH):
+            return
+
+        try:
+            with open(cls.PERSIST_PATH, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось загрузить кэш ответов ИИ: {e}")
+            return
+
+        now = time.time()
+        for key, (expires_at, value) in sorted(data.items(), key=lambda item: item[1][0]):
+            if expires_at > now:
+                cls._entries[key] = (expires_at, value)
+
+        cls._evict()
+
+    @classmethod
+    def _get(cls, key: str) -> Optional[str]:
+        entry = cls._entries.get(key)
+        if entry is None:
+            return None
+
+        if entry[0] <= time.time():
+            del cls._entries[key]
+            return None
+
+        cls._entries.move_to_end(key)
+        return entry[1]
+
+    @classmethod
+    def _set(cls, key: str, value: str) -> None:
+        cls._entries[key] = (time.time() + cls.TTL, value)
+        cls._entries.move_to_end(key)
+        cls._evict()
+
+    @classmethod
+    def _evict(cls) -> None:
+        while len(cls._entries) > cls.MAX_ENTRIES:
+            cls._entries.popitem(last=False)
@@ -0,0 +1,427 @@
+import re
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.logger import logger
+from app.metrics import Metrics
+
+class JsonExtractor:
+    """
+    Извлечение JSON из ответа модели: ограждения ``` и текст вокруг
+    отбрасываются, сбалансированные объекты находятся за один проход,
+    типичные дефекты (висячие запятые, одинарные кавычки, литералы Python,
+    оборванный конец) исправляются
+    """
+
+    CLEAN = "clean"
+    EXTRACTED = "extracted"
+    REPAIRED = "repaired"
+    FAILED = "failed"
+
+    TRUNCATION_RETRIES = 4
+
+    _LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+    @classmethod
+    def loads(cls, text: str) -> Tuple[Optional[Dict[str, Any]], str]:
+
+        """Первый JSON-объект в тексте и способ, которым его удалось получить"""
+
+        try:
+            data = json.loads(text, strict=False)
+            if isinstance(data, dict):
+                return data, cls.CLEAN
+
+        except ValueError:
+            pass
+
+        for candidate, complete in cls.candidates(text):
+            if complete:
+                try:
+                    data = json.loads(candidate, strict=False)
+                    if isinstance(data, dict):
+                        return data, cls.EXTRACTED
+
+                except ValueError:
+                    pass
+
+            data = cls._load_repaired(candidate, complete)
+            if data is not None:
+                return data, cls.REPAIRED
+
+        return None, cls.FAILED
+
+    @classmethod
+    def _load_repaired(cls, candidate: str, complete: bool) -> Optional[Dict[str, Any]]:
+
+        """У оборванного объекта при неудаче отрезается последний незаконченный элемент"""
+
+        for _ in range(cls.TRUNCATION_RETRIES):
+            try:
+                data = json.loads(cls.repair(candidate, truncated=not complete), strict=False)
+                return data if isinstance(data, dict) else None
+
+            except ValueError:
+                cut = candidate.rfind(",")
+                if complete or cut <= 0:
+                    return None
+                candidate = candidate[:cut]
+
+        return None
+
+    @staticmethod
+    def candidates(text: str) -> Iterator[Tuple[str, bool]]:
+
+        """
+        Объекты верхнего уровня (срез, завершен ли) за один проход: учитываются
+        строки в двойных и одинарных кавычках, поэтому скобки в тексте значений
+        не сбивают баланс. Оборванный последний объект отдается как незавершенный
+        """
+
+        depth = 0
+        start = 0
+        quote = ""
+        escape = False
+        index = text.find("{")
+        length = len(text)
+
+        while 0 <= index < length:
+            ch = text[index]
+
+            if quote:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == quote:
+                    quote = ""
+
+            elif ch == "{":
+                if depth == 0:
+                    start = index
+                depth += 1
+
+            elif ch == '"' or (ch == "'" and not text[index - 1].isalnum()):
+                quote = ch
+
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    yield text[start:index + 1], True
+
+                    # Текст между объектами пропускается без посимвольного просмотра
+                    index = text.find("{", index + 1)
+                    continue
+
+            index += 1
+
+        if depth > 0:
+            yield text[start:], False
+
+    @classmethod
+    def repair(cls, candidate: str, truncated: bool = False) -> str:
+
+        """
+        Один проход с исправлением дефектов; незакрытые строки и скобки закрываются
+        в конце. У оборванного ответа (truncated) недописанные элементы отбрасываются,
+        а не достраиваются: иначе обрывок стал бы настоящим действием над задачами
+        """
+
+        out: List[str] = []
+        stack: List[str] = []
+        starts: List[int] = []
+        quote = ""
+        escape = False
+        index = 0
+        length = len(candidate)
+
+        while index < length:
+            ch = candidate[index]
+
+            if quote:
+                if escape:
+                    escape = False
+
+                    # \' допустимо только в строке с одинарными кавычками; в JSON это просто '
+                    if ch == "'" and quote == "'":
+                        out[-1] = "'"
+                    else:
+                        out.append(ch)
+                elif ch == "\\":
+                    escape = True
+                    out.append(ch)
+                elif ch == quote:
+                    quote = ""
+                    out.append('"')
+                elif ch == '"':
+                    out.append('\\"')
+                elif ch == "\n":
+                    out.append("\\n")
+                else:
+                    out.append(ch)
+
+            elif ch in "\"'":
+                quote = ch
+                out.append('"')
+
+            elif ch in "{[":
+                stack.append("}" if ch == "{" else "]")
+                out.append(ch)
+                starts.append(len(out))
+
+            elif ch in "}]":
+                cls._drop_trailing_comma(out)
+                if stack:
+                    stack.pop()
+                    starts.pop()
+                out.append(ch)
+
+            elif ch == ",":
+                if starts:
+                    starts[-1] = len(out)
+                out.append(ch)
+
+            elif ch.isalpha() or ch == "_":
+                end = index
+                while end < length and (candidate[end].isalnum() or candidate[end] == "_"):
+                    end += 1
+                word = candidate[index:end]
+
+                # Ключ без кавычек: {name: ...}
+                after = end
+                while after < length and candidate[after].isspace():
+                    after += 1
+                if after < length and candidate[after] == ":":
+                    out.append(f'"{word}"')
+                else:
+                    out.append(cls._LITERALS.get(word, word))
+
+                index = end
+                continue
+
+            else:
+                out.append(ch)
+
+            index += 1
+
+        if truncated and stack and not cls._is_reply(out, stack, starts):
+            cls._drop_cut_elements(out, stack, starts)
+            quote = ""
+
+        if quote:
+            if escape:
+                out.pop()
+            out.append('"')
+
+        cls._drop_trailing_comma(out)
+        if cls._last_char(out) == ":":
+            out.append("null")
+
+        for closer in reversed(stack):
+            cls._drop_trailing_comma(out)
+            out.append(closer)
+
+        return "".join(out)
+
+    @staticmethod
+    def _is_reply(out: List[str], stack: List[str], starts: List[int]) -> bool:
+
+        """Обрыв пришелся на reply верхнего уровня: недописанный текст ответа сохраняется"""
+
+        if len(stack) != 1 or stack[0] != "}":
+            return False
+
+        member = "".join(out[starts[0]:]).lstrip(", \t\r\n")
+        return member.startswith('"reply"')
+
+    @staticmethod
+    def _drop_cut_elements(out: List[str], stack: List[str], starts: List[int]) -> None:
+
+        """
+        Отбрасывает недописанный элемент самого внутреннего контейнера, а в каждом
+        незакрытом массиве — последний элемент, в котором случился обрыв
+        """
+
+        del out[starts[-1]:]
+
+        for level in range(len(stack) - 2, -1, -1):
+            if stack[level] == "]":
+                del out[starts[level]:]
+                del stack[level + 1:]
+                del starts[level + 1:]
+
+    @staticmethod
+    def _last_char(out: List[str]) -> str:
+        for piece in reversed(out):
+            if not piece.isspace():
+                return piece[-1]
+        return ""
+
+    @staticmethod
+    def _drop_trailing_comma(out: List[str]) -> None:
+        position = len(out) - 1
+        while position >= 0 and out[position].isspace():
+            position -= 1
+
+        if position >= 0 and out[position] == ",":
+            del out[position]
+
+# --- СХЕМА ОТВЕТА С ИЗМЕНЕНИЯМИ ЗАДАЧ ---
+DEADLINE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+@dataclass
+class NewTask:
+    name: str
+    description: str
+    deadline: str
+
+@dataclass
+class TaskChange:
+    old_name: str
+    name: Optional[str] = None
+    description: Optional[str] = None
+    deadline: Optional[str] = None
+
+@dataclass
+class ProfileChange:
+    name: Optional[str] = None
+    timezone: Optional[int] = None
+
+@dataclass
+class TaskDiff:
+    """Проверенный ответ ИИ: изменения задач и профиля плюс текст для пользователя"""
+
+    reply: str = ""
+    added: List[NewTask] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    updated: List[TaskChange] = field(default_factory=list)
+    profile: ProfileChange = field(default_factory=ProfileChange)
+
+    status: str = JsonExtractor.CLEAN
+    errors: List[str] = field(default_factory=list)
+
+    def without(self, applied: "TaskDiff") -> "TaskDiff":
+
+        """Разделы, которых не было в уже примененной части (поля, пришедшие в потоке после reply)"""
+
+        return TaskDiff(
+            reply=self.reply,
+            added=[] if applied.added else self.added,
+            deleted=[] if applied.deleted else self.deleted,
+            updated=[] if applied.updated else self.updated,
+            profile=ProfileChange() if applied.profile.name or applied.profile.timezone is not None else self.profile,
+            status=self.status,
+        )
+
+    @classmethod
+    def parse(cls, text: str) -> "TaskDiff":
+
+        """Разбор ответа модели; если JSON не найден, весь текст считается ответом без действий"""
+
+        data, status = JsonExtractor.loads(text)
+        Metrics.LLM_JSON.inc(status=status)
+
+        if data is None:
+            if "{" in text:
+                logger.warning(f"Unparsable JSON in AI response: {text[:200]!r}")
+            return cls(reply=text.strip(), status=status)
+
+        diff = cls.from_dict(data)
+        diff.status = status
+        return diff
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TaskDiff":
+
+        """Проверка по схеме: некорректные элементы отбрасываются с записью в errors"""
+
+        diff = cls(reply=data.get("reply") if isinstance(data.get("reply"), str) else "")
+
+        for item in cls._items(data, "added_tasks", diff.errors):
+            name = _text(item.get("name")) if isinstance(item, dict) else None
+            deadline = _deadline(item.get("deadline")) if isinstance(item, dict) else None
+
+            if not name or not deadline:
+                diff.errors.append(f"added_tasks: skipped {item!r}")
+                continue
+
+            diff.added.append(NewTask(name, _text(item.get("description")) or "", deadline))
+
+        for item in cls._items(data, "deleted_tasks", diff.errors):
+            name = _text(item.get("name")) if isinstance(item, dict) else _text(item)
+
+            if not name:
+                diff.errors.append(f"deleted_tasks: skipped {item!r}")
+                continue
+
+            diff.deleted.append(name)
+
+        for item in cls._items(data, "updated_tasks", diff.errors):
+            old_name = _text(item.get("old_name")) if isinstance(item, dict) else None
+            new_data = item.get("new_data") if isinstance(item, dict) else None
+
+            if not old_name or not isinstance(new_data, dict):
+                diff.errors.append(f"updated_tasks: skipped {item!r}")
+                continue
+
+            deadline = _deadline(new_data.get("deadline"))
+            if new_data.get("deadline") and not deadline:
+                diff.errors.append(f"updated_tasks: bad deadline {new_data.get('deadline')!r}")
+
+            diff.updated.append(TaskChange(old_name, _text(new_data.get("name")), _text(new_data.get("description")), deadline))
+
+        profile = data.get("update_profile")
+        if isinstance(profile, dict):
+            diff.profile.name = _text(profile.get("name"))
+
+            raw_tz = profile.get("timezone")
+            if raw_tz is not None:
+                try:
+                    timezone = int(raw_tz)
+                    if not -12 <= timezone <= 14:
+                        raise ValueError(raw_tz)
+                    diff.profile.timezone = timezone
+
+                except (ValueError, TypeError):
+                    diff.errors.append(f"update_profile: bad timezone {raw_tz!r}")
+
+        return diff
+
+    @staticmethod
+    def _items(data: Dict[str, Any], key: str, errors: List[str]) -> List[Any]:
+        value = data.get(key)
+        if value is None:
+            return []
+
+        if isinstance(value, dict):
+            return [value]
+
+        if not isinstance(value, list):
+            errors.append(f"{key}: expected a list, got {type(value).__name__}")
+            return []
+
+        return value
+
+def _text(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, (dict, list)):
+        return None
+
+    value = str(value).strip()
+    return value or None
+
+_TIME_RE = re.compile(r"[T ]\d{2}:\d{2}")
+
+def _deadline(value: Any) -> Optional[str]:
+
+    """Дедлайн в формате ГГГГ-ММ-ДД ЧЧ:ММ:СС; допускаются ISO-варианты (T, без секунд), но не дата без времени"""
+
+    if not isinstance(value, str) or not _TIME_RE.search(value):
+        return None
+
+    try:
+        return datetime.fromisoformat(value.strip()).replace(tzinfo=None).strftime(DEADLINE_FORMAT)
+
+    except ValueError:
+        return None
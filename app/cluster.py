@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import importlib.util
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Mapping, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from app.logger import logger
+from app.reminders import ReminderQueue
+from app.database.cache import ContextCache, TaskPageCache
+from app.database.request import Request as rq
+
+class SQLStorage(BaseStorage):
+    """FSM-хранилище в таблице fsm_states, общее для всех воркеров"""
+
+    def __init__(self) -> None:
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await rq.set_fsm_state(self.key_builder.build(key), state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await rq.get_fsm_record(self.key_builder.build(key))
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        payload = json.dumps(dict(data), ensure_ascii=False) if data else None
+        await rq.set_fsm_data(self.key_builder.build(key), payload)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await rq.get_fsm_record(self.key_builder.build(key))
+        return json.loads(record.data) if record and record.data else {}
+
+    async def close(self) -> None:
+        pass
+
+class LockStore(ABC):
+    """Блокировки с TTL: токен владельца, захват, продление и освобождение"""
+
+    POLL_INTERVAL = 0.05
+    MAX_POLL_INTERVAL = 0.5
+    RENEW_FRACTION = 1 / 3
+
+    def __init__(self) -> None:
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    @abstractmethod
+    async def acquire(self, name: str, token: str, ttl: float) -> bool:
+
+        """Захватывает блокировку или продлевает её, если она уже принадлежит token"""
+
+    @abstractmethod
+    async def release(self, name: str, token: str) -> None:
+        ...
+
+    @asynccontextmanager
+    async def hold(self, name: str, ttl: float = 60.0, timeout: Optional[float] = None) -> AsyncIterator[None]:
+
+        """
+        Ждет блокировку (с нарастающей паузой) и держит её на время блока.
+        Пока блок выполняется, блокировка продлевается каждые ttl/3, поэтому
+        TTL ограничивает только время жизни блокировки упавшего процесса
+        """
+
+        token = f"{self.owner}:{uuid.uuid4().hex[:8]}"
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = self.POLL_INTERVAL
+
+        while not await self.acquire(name, token, ttl):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Lock {name} is busy")
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.MAX_POLL_INTERVAL)
+
+        renewal = asyncio.create_task(self._renew(name, token, ttl))
+        try:
+            yield
+
+        finally:
+            renewal.cancel()
+            await self.release(name, token)
+
+    async def _renew(self, name: str, token: str, ttl: float) -> None:
+        while True:
+            await asyncio.sleep(ttl * self.RENEW_FRACTION)
+
+            try:
+                if not await self.acquire(name, token, ttl):
+                    logger.warning(f"Lock {name} was taken over by another owner while held")
+                    return
+
+            except Exception as e:
+                logger.error(f"Lock {name}: renewal failed: {e}")
+
+class MemoryLockStore(LockStore):
+    """Блокировки в памяти процесса (режим одного процесса)"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._locks: Dict[str, Tuple[str, float]] = {}
+
+    async def acquire(self, name: str, token: str, ttl: float) -> bool:
+        now = time.monotonic()
+        current = self._locks.get(name)
+
+        if current and current[0] != token and current[1] > now:
+            return False
+
+        self._locks[name] = (token, now + ttl)
+        return True
+
+    async def release(self, name: str, token: str) -> None:
+        current = self._locks.get(name)
+        if current and current[0] == token:
+            del self._locks[name]
+
+class SQLLockStore(LockStore):
+    """Блокировки в таблице locks (SQLite или PostgreSQL)"""
+
+    async def acquire(self, name: str, token: str, ttl: float) -> bool:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return await rq.acquire_lock(name, token, now + timedelta(seconds=ttl), now)
+
+    async def release(self, name: str, token: str) -> None:
+        await rq.release_lock(name, token)
+
+class RedisLockStore(LockStore):
+    """Блокировки в Redis: SET NX PX и атомарные проверки владельца скриптами"""
+
+    PREFIX = "lock:"
+
+    ACQUIRE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+        return 1
+    end
+    return 0
+    """
+
+    RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, redis: Any) -> None:
+        super().__init__()
+        self.redis = redis
+
+    async def acquire(self, name: str, token: str, ttl: float) -> bool:
+        result = await self.redis.eval(self.ACQUIRE_SCRIPT, 1, self.PREFIX + name, token, int(ttl * 1000))
+        return bool(result)
+
+    async def release(self, name: str, token: str) -> None:
+        await self.redis.eval(self.RELEASE_SCRIPT, 1, self.PREFIX + name, token)
+
+class LeaderElection:
+    """Выбор ведущего экземпляра через общую блокировку с регулярным продлением"""
+
+    NAME = "scheduler_leader"
+    TTL = 30.0
+    RENEW_INTERVAL = 10.0
+
+    def __init__(
+        self,
+        locks: LockStore,
+        on_elected: Callable[[], Awaitable[None]],
+        on_lost: Callable[[], Awaitable[None]],
+    ) -> None:
+        self.locks = locks
+        self.on_elected = on_elected
+        self.on_lost = on_lost
+        self.is_leader = False
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+        if self.is_leader:
+            await self._step_down()
+            await self.locks.release(self.NAME, self.locks.owner)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                elected = await self.locks.acquire(self.NAME, self.locks.owner, self.TTL)
+
+            except Exception as e:
+
+                # Не смогли продлить — считаем, что блокировка может истечь, и уступаем
+                logger.error(f"Leader election: lock renewal failed: {e}")
+                elected = False
+
+            if elected and not self.is_leader:
+                self.is_leader = True
+                logger.info(f"Leader election: {self.locks.owner} became the scheduler leader")
+
+                try:
+                    await self.on_elected()
+
+                except Exception as e:
+
+                    # Лидер без запущенного планировщика хуже его отсутствия: уступаем, попытка повторится
+                    logger.error(f"Leader election: on_elected failed, stepping down: {e}")
+                    await self._resign()
+
+            elif not elected and self.is_leader:
+                await self._step_down()
+
+            await asyncio.sleep(self.RENEW_INTERVAL)
+
+    async def _resign(self) -> None:
+        try:
+            await self._step_down()
+            await self.locks.release(self.NAME, self.locks.owner)
+
+        except Exception as e:
+            logger.error(f"Leader election: stepping down failed: {e}")
+
+    async def _step_down(self) -> None:
+        self.is_leader = False
+        logger.warning(f"Leader election: {self.locks.owner} is no longer the scheduler leader")
+        await self.on_lost()
+
+class Cluster:
+    """Общие хранилища процесса: FSM, блокировки пользователей, режим нескольких воркеров"""
+
+    REDIS_URL = os.getenv("REDIS_URL")
+
+    # Блокировка хода продлевается, пока ход идет; TTL нужен только на случай падения воркера
+    TURN_LOCK_TTL = 30.0
+
+    shared = False
+    locks: LockStore = MemoryLockStore()
+
+    @classmethod
+    def configure(cls, shared: bool) -> BaseStorage:
+
+        """
+        Выбирает хранилища и возвращает FSM-хранилище для Dispatcher.
+        В общем режиме кэш контекста не переиспользуется между ходами:
+        задачи пользователя мог изменить другой воркер. Очередь напоминаний
+        процесса тоже не ведется: наступившие дедлайны читаются из БД, а
+        страницы /tasks не кэшируются
+        """
+
+        cls.shared = shared
+        ReminderQueue.enabled = not shared
+        TaskPageCache.enabled = not shared
+
+        if not shared:
+            cls.locks = MemoryLockStore()
+            return MemoryStorage()
+
+        ContextCache.TTL = 0
+        ReminderQueue.seed([])
+        TaskPageCache.clear()
+
+        if cls.REDIS_URL:
+            if importlib.util.find_spec("redis") is None:
+                raise RuntimeError("REDIS_URL is set but the 'redis' package is not installed")
+
+            from aiogram.fsm.storage.redis import RedisStorage
+
+            storage = RedisStorage.from_url(cls.REDIS_URL)
+            cls.locks = RedisLockStore(storage.redis)
+            logger.info("Cluster: FSM states and locks are stored in Redis")
+            return storage
+
+        cls.locks = SQLLockStore()
+        logger.info("Cluster: FSM states and locks are stored in the database")
+        return SQLStorage()
@@ -0,0 +1,242 @@
+import time
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from app.task_index import TaskNameIndex
+
+@dataclass
+class UserContext:
+    """Контекст пользователя для одного хода чата"""
+
+    user: Any
+    tasks: List[Any]
+    history: Deque[Any]
+    summary: Optional[str] = None
+    summary_upto: int = 0
+    evicted: int = 0
+    loaded_at: float = field(default_factory=time.monotonic)
+    size: int = 0
+    _task_index: Optional[TaskNameIndex] = field(default=None, repr=False)
+
+    def task_index(self) -> TaskNameIndex:
+
+        """Индекс названий задач; перестраивается, когда список задач заменен"""
+
+        if self._task_index is None or self._task_index.tasks is not self.tasks:
+            self._task_index = TaskNameIndex(self.tasks)
+        return self._task_index
+
+class ContextCache:
+    """LRU/TTL кэш контекста пользователей (профиль, задачи, окно истории)"""
+
+    TTL = 15 * 60
+    MAX_USERS = 2000
+    MAX_BYTES = 32 * 1024 * 1024
+    HISTORY_WINDOW = 10
+    LOCK_STRIPES = 64
+
+    _entries: "OrderedDict[int, UserContext]" = OrderedDict()
+    _tg_ids: Dict[int, int] = {}
+    _total_bytes = 0
+    _locks = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
+
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def lock(cls, tg_id: int) -> asyncio.Lock:
+
+        """Блокировка загрузки, чтобы параллельные сообщения не читали БД дважды"""
+
+        return cls._locks[tg_id % cls.LOCK_STRIPES]
+
+    @classmethod
+    def get(cls, tg_id: int) -> Optional[UserContext]:
+        ctx = cls._entries.get(tg_id)
+
+        if ctx is None:
+            cls.misses += 1
+            return None
+
+        if time.monotonic() - ctx.loaded_at > cls.TTL:
+            cls._drop(tg_id)
+            cls.misses += 1
+            return None
+
+        cls._entries.move_to_end(tg_id)
+        cls.hits += 1
+        return ctx
+
+    @classmethod
+    def put(cls, user: Any, tasks: Iterable[Any], history: Iterable[Any], summary: Optional[Any] = None) -> UserContext:
+        cls._drop(user.tg_id)
+
+        ctx = UserContext(user=user, tasks=list(tasks), history=deque(history, maxlen=cls.HISTORY_WINDOW))
+        if summary is not None:
+            ctx.summary = summary.content
+            ctx.summary_upto = summary.last_message_id
+        ctx.size = cls._estimate(ctx)
+
+        cls._entries[user.tg_id] = ctx
+        cls._tg_ids[user.id] = user.tg_id
+        cls._total_bytes += ctx.size
+        cls._evict()
+
+        return ctx
+
+    @classmethod
+    def set_tasks(cls, user_id: int, tasks: Iterable[Any]) -> None:
+        ctx = cls._by_user(user_id)
+        if ctx:
+            ctx.tasks = list(tasks)
+            cls._resize(ctx)
+
+    @classmethod
+    def append_history(cls, user_id: int, *rows: Any) -> None:
+        ctx = cls._by_user(user_id)
+        if ctx:
+            ctx.evicted += max(0, len(ctx.history) + len(rows) - cls.HISTORY_WINDOW)
+            ctx.history.extend(rows)
+            cls._resize(ctx)
+
+    @classmethod
+    def set_summary(cls, user_id: int, content: str, last_message_id: int) -> None:
+        ctx = cls._by_user(user_id)
+        if ctx:
+            ctx.summary = content
+            ctx.summary_upto = last_message_id
+            ctx.evicted = 0
+            cls._resize(ctx)
+
+    @classmethod
+    def update_user(cls, user_id: int, name: Optional[str] = None, timezone: Optional[int] = None) -> None:
+        ctx = cls._by_user(user_id)
+        if not ctx:
+            return
+
+        if name:
+            ctx.user.name = name
+
+        if timezone is not None:
+            ctx.user.timezone = timezone
+
+    @classmethod
+    def invalidate(cls, user_id: int) -> None:
+        tg_id = cls._tg_ids.get(user_id)
+        if tg_id is not None:
+            cls._drop(tg_id)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._entries.clear()
+        cls._tg_ids.clear()
+        cls._total_bytes = 0
+
+    @classmethod
+    def size(cls) -> int:
+        return len(cls._entries)
+
+    @classmethod
+    def _by_user(cls, user_id: int) -> Optional[UserContext]:
+        tg_id = cls._tg_ids.get(user_id)
+        return cls._entries.get(tg_id) if tg_id is not None else None
+
+    @classmethod
+    def _drop(cls, tg_id: int) -> None:
+        ctx = cls._entries.pop(tg_id, None)
+        if ctx:
+            cls._tg_ids.pop(ctx.user.id, None)
+            cls._total_bytes -= ctx.size
+
+    @classmethod
+    def _resize(cls, ctx: UserContext) -> None:
+        size = cls._estimate(ctx)
+        cls._total_bytes += size - ctx.size
+        ctx.size = size
+        cls._evict()
+
+    @classmethod
+    def _evict(cls) -> None:
+        while cls._entries and (len(cls._entries) > cls.MAX_USERS or cls._total_bytes > cls.MAX_BYTES):
+            tg_id = next(iter(cls._entries))
+            cls._drop(tg_id)
+
+    @staticmethod
+    def _estimate(ctx: UserContext) -> int:
+
+        """Грубая оценка занимаемой памяти по длине строк"""
+
+        size = 512
+        size += sum(256 + len(t.name or '') + len(t.description or '') for t in ctx.tasks)
+        size += sum(256 + len(m.content or '') for m in ctx.history)
+        size += len(ctx.summary or '')
+        return size
+
+class TaskPageCache:
+    """
+    Готовые страницы /tasks по пользователям. Страница живет, пока задачи
+    пользователя не изменились: любая запись задач сбрасывает его страницы.
+    Сбрасывают их только записи этого процесса, поэтому в режиме нескольких
+    воркеров кэш выключен
+    """
+
+    enabled = True
+
+    MAX_USERS = 5000
+    MAX_PAGES = 32
+
+    _entries: "OrderedDict[int, Dict[Any, Any]]" = OrderedDict()
+    _epoch = 0
+
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def epoch(cls) -> int:
+
+        """Отметка до чтения из БД: страница, прочитанная до чьей-то записи задач, не кэшируется"""
+
+        return cls._epoch
+
+    @classmethod
+    def get(cls, user_id: int, key: Any) -> Optional[Any]:
+        if not cls.enabled:
+            return None
+
+        pages = cls._entries.get(user_id)
+        page = pages.get(key) if pages else None
+
+        if page is None:
+            cls.misses += 1
+            return None
+
+        cls._entries.move_to_end(user_id)
+        cls.hits += 1
+        return page
+
+    @classmethod
+    def put(cls, user_id: int, key: Any, page: Any, epoch: int) -> None:
+        if not cls.enabled or epoch != cls._epoch:
+            return
+
+        pages = cls._entries.setdefault(user_id, {})
+        if len(pages) >= cls.MAX_PAGES:
+            pages.clear()
+
+        pages[key] = page
+        cls._entries.move_to_end(user_id)
+
+        while len(cls._entries) > cls.MAX_USERS:
+            cls._entries.popitem(last=False)
+
+    @classmethod
+    def invalidate(cls, user_id: int) -> None:
+        cls._epoch += 1
+        cls._entries.pop(user_id, None)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._epoch += 1
+        cls._entries.clear()
@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+from typing import Callable, List
+
+from sqlalchemy import Connection, DateTime, Integer, String, Column, MetaData, Table, func, inspect, select, text
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.logger import logger
+from app.database.models import Base, HistoryArchive, FSMRecord, Lock, Outbox, DigestDraft, DigestSend, engine
+
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(255)),
+    Column('applied_at', DateTime, server_default=func.now()),
+)
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+def _baseline(conn: Connection) -> None:
+
+    """Создает недостающие таблицы и колонки (базы, созданные до появления миграций)"""
+
+    Base.metadata.create_all(conn)
+    inspector = inspect(conn)
+
+    for table in Base.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+def _create_indexes(*names: str) -> Callable[[Connection], None]:
+
+    """Шаг миграции, создающий объявленные в моделях индексы по именам"""
+
+    def upgrade(conn: Connection) -> None:
+        indexes = {index.name: index for table in Base.metadata.sorted_tables for index in table.indexes}
+        for name in names:
+            conn.execute(CreateIndex(indexes[name], if_not_exists=True))
+
+    return upgrade
+
+def _create_tables(*tables) -> Callable[[Connection], None]:
+
+    """Шаг миграции, создающий новые таблицы из моделей"""
+
+    def upgrade(conn: Connection) -> None:
+        for table in tables:
+            table.create(conn, checkfirst=True)
+
+    return upgrade
+
+class Migrations:
+    """Версионированные миграции схемы; применяются по порядку при старте"""
+
+    STEPS: List[Migration] = [
+        Migration(1, "baseline schema", _baseline),
+        Migration(2, "indexes for hot queries", _create_indexes(
+            'ix_users_timezone',
+            'ix_tasks_reminder_due',
+            'ix_tasks_user_deadline',
+            'ix_tasks_user_lower_name',
+            'ix_history_user_timestamp',
+        )),
+        Migration(3, "history archive", _create_tables(HistoryArchive.__table__)),
+        Migration(4, "shared FSM states and locks", _create_tables(FSMRecord.__table__, Lock.__table__)),
+        Migration(5, "reminder outbox", _create_tables(Outbox.__table__)),
+        Migration(6, "precomputed digests", _create_tables(DigestDraft.__table__)),
+        Migration(7, "digest send markers", _create_tables(DigestSend.__table__)),
+        Migration(8, "index for tasks without a UTC deadline", _create_indexes('ix_tasks_missing_deadline_utc')),
+    ]
+
+    @classmethod
+    async def run(cls, engine: AsyncEngine) -> int:
+
+        """Применяет недостающие миграции; возвращает текущую версию схемы"""
+
+        async with engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('schema_version'))"))
+
+            await conn.run_sync(schema_version.create, checkfirst=True)
+            current = await conn.scalar(select(func.max(schema_version.c.version))) or 0
+
+            for step in cls.STEPS:
+                if step.version <= current:
+                    continue
+
+                await conn.run_sync(step.upgrade)
+                await conn.execute(schema_version.insert().values(version=step.version, description=step.description))
+                logger.info(f"Schema migrated to version {step.version}: {step.description}")
+                current = step.version
+
+        return current
+
+async def async_main():
+
+    """Инициализация базы данных: применение миграций схемы"""
+
+    await Migrations.run(engine)
@@ -1,9 +1,13 @@
-from datetime import datetime
-from sqlalchemy import BigInteger, ForeignKey, String, DateTime, func
+from datetime import date, datetime
+from sqlalchemy import BigInteger, ForeignKey, String, Text, Date, DateTime, Index, LargeBinary, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker
 
-engine = create_async_engine(url='sqlite+aiosqlite:///db.sqlite3', echo=False)
+from app.metrics import Metrics
+from app.database.settings import DatabaseSettings
+
+engine = DatabaseSettings.create_engine()
+Metrics.watch_engine(engine)
 
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
@@ -17,7 +21,7 @@ class User(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     tg_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True)
     name: Mapped[str] = mapped_column(String(50), nullable=True)
-    timezone: Mapped[int] = mapped_column(default=0)
+    timezone: Mapped[int] = mapped_column(default=0, index=True)
 
     tasks = relationship('Task', back_populates='user', cascade='all, delete-orphan')
     history = relationship('MessageHistory', back_populates='user', cascade='all, delete-orphan')
@@ -27,11 +31,16 @@ class User(Base):
 
 class Task(Base):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        Index('ix_tasks_reminder_due', 'is_reminded', 'deadline_utc'),
+        Index('ix_tasks_user_deadline', 'user_id', 'deadline'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(50))
     description: Mapped[str] = mapped_column(String(255), nullable=True)
     deadline: Mapped[datetime] = mapped_column(DateTime)
+    deadline_utc: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     is_reminded: Mapped[bool] = mapped_column(default=False, index=True)
 
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), index=True)
@@ -41,13 +50,25 @@ class Task(Base):
     def __repr__(self) -> str:
         return f"<Task(id={self.id}, name='{self.name}', deadline='{self.deadline}')>"
 
+Index('ix_tasks_user_lower_name', Task.user_id, func.lower(Task.name))
+
+# Частичный индекс задач без deadline_utc: при старте они находятся без прохода по таблице, а сам индекс обычно пуст
+Index(
+    'ix_tasks_missing_deadline_utc', Task.id,
+    sqlite_where=Task.deadline_utc.is_(None), postgresql_where=Task.deadline_utc.is_(None)
+)
+
 class MessageHistory(Base):
     __tablename__ = 'history'
+    __table_args__ = (
+        Index('ix_history_user_timestamp', 'user_id', 'timestamp', 'id'),
+    )
+    __mapper_args__ = {'eager_defaults': True}
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), index=True)
     role: Mapped[str] = mapped_column(String(20))
-    content: Mapped[str] = mapped_column(String(1000))
+    content: Mapped[str] = mapped_column(Text)
     
     timestamp: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
@@ -56,9 +77,100 @@ class MessageHistory(Base):
     def __repr__(self) -> str:
         return f"<History(user_id={self.user_id}, role='{self.role}')>"
 
-async def async_main():
-    
-    """Инициализация таблиц базы данных"""
+class HistorySummary(Base):
+    __tablename__ = 'history_summaries'
+
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    content: Mapped[str] = mapped_column(Text)
+    last_message_id: Mapped[int] = mapped_column(default=0)
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self) -> str:
+        return f"<HistorySummary(user_id={self.user_id}, last_message_id={self.last_message_id})>"
+
+class HistoryArchive(Base):
+    __tablename__ = 'history_archive'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    first_message_id: Mapped[int]
+    last_message_id: Mapped[int]
+    message_count: Mapped[int]
+    raw_bytes: Mapped[int]
+    payload: Mapped[bytes] = mapped_column(LargeBinary)
+
+    archived_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+    def __repr__(self) -> str:
+        return f"<HistoryArchive(user_id={self.user_id}, messages={self.message_count}, bytes={len(self.payload)})>"
+
+class FSMRecord(Base):
+    __tablename__ = 'fsm_states'
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    state: Mapped[str] = mapped_column(String(255), nullable=True)
+    data: Mapped[str] = mapped_column(Text, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<FSMRecord(key='{self.key}', state='{self.state}')>"
+
+class Lock(Base):
+    __tablename__ = 'locks'
 
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+    name: Mapped[str] = mapped_column(String(255), primary_key=True)
+    owner: Mapped[str] = mapped_column(String(64))
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+
+    def __repr__(self) -> str:
+        return f"<Lock(name='{self.name}', owner='{self.owner}', expires_at='{self.expires_at}')>"
+
+class Outbox(Base):
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        Index('ix_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    kind: Mapped[str] = mapped_column(String(20))
+    text: Mapped[str] = mapped_column(Text)
+    task_ids: Mapped[str] = mapped_column(String(255), nullable=True)
+
+    status: Mapped[str] = mapped_column(String(10), default='pending')
+    attempts: Mapped[int] = mapped_column(default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime)
+    last_error: Mapped[str] = mapped_column(String(255), nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    sent_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<Outbox(id={self.id}, user_id={self.user_id}, kind='{self.kind}', status='{self.status}')>"
+
+class DigestDraft(Base):
+    """Заранее сгенерированный утренний дайджест пользователя на конкретный день"""
+
+    __tablename__ = 'digest_drafts'
+
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    local_date: Mapped[date] = mapped_column(Date)
+    tasks_hash: Mapped[str] = mapped_column(String(40))
+    text: Mapped[str] = mapped_column(Text)
+    generated_at: Mapped[datetime] = mapped_column(DateTime)
+
+    def __repr__(self) -> str:
+        return f"<DigestDraft(user_id={self.user_id}, local_date={self.local_date}, hash='{self.tasks_hash}')>"
+
+class DigestSend(Base):
+    """Отметка об отправленном дайджесте: повторный запуск рассылки за тот же день пропускает пользователя"""
+
+    __tablename__ = 'digest_sends'
+
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    local_date: Mapped[date] = mapped_column(Date)
+    sent_at: Mapped[datetime] = mapped_column(DateTime)
+
+    def __repr__(self) -> str:
+        return f"<DigestSend(user_id={self.user_id}, local_date={self.local_date})>"
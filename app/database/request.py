@@ -1,20 +1,72 @@
 from datetime import datetime, time
-from sqlalchemy import select, delete, update, and_, func
-from app.database.models import async_session, User, Task, MessageHistory
+from sqlalchemy import select, insert, delete, update, and_, or_, func
+from sqlalchemy.dialects import postgresql, sqlite
+from app.metrics import Metrics
+from app.scheduler import DigestBuckets
+from app.reminders import ReminderQueue
+from app.database.cache import ContextCache, TaskPageCache
+from app.database.writer import writer
+from app.database.models import async_session, User, Task, MessageHistory, HistorySummary, HistoryArchive, FSMRecord, Lock, Outbox, DigestDraft, DigestSend
 
+@Metrics.instrument_requests
 class Request:
     # --- РАБОТА С ПОЛЬЗОВАТЕЛЯМИ ---
     @staticmethod
     async def get_user(tg_id):
         async with async_session() as session:
             return await session.scalar(select(User).where(User.tg_id == tg_id))
+
+    @staticmethod
+    async def get_user_id(tg_id):
+        ctx = ContextCache.get(tg_id)
+        if ctx:
+            return ctx.user.id
+
+        async with async_session() as session:
+            return await session.scalar(select(User.id).where(User.tg_id == tg_id))
     
+    @staticmethod
+    async def get_context(tg_id):
+        ctx = ContextCache.get(tg_id)
+        if ctx:
+            return ctx
+
+        async with ContextCache.lock(tg_id):
+            ctx = ContextCache.get(tg_id)
+            if ctx:
+                return ctx
+
+            async with async_session() as session:
+                user = await session.scalar(select(User).where(User.tg_id == tg_id))
+                if not user:
+                    return None
+
+                tasks = await session.scalars(select(Task).where(Task.user_id == user.id))
+                history = await session.scalars(
+                    select(MessageHistory).where(MessageHistory.user_id == user.id)
+                    .order_by(MessageHistory.timestamp.desc(), MessageHistory.id.desc())
+                    .limit(ContextCache.HISTORY_WINDOW)
+                )
+
+                summary = await session.get(HistorySummary, user.id)
+                unsummarized = await session.scalar(
+                    select(func.count(MessageHistory.id)).where(
+                        MessageHistory.user_id == user.id,
+                        MessageHistory.id > (summary.last_message_id if summary else 0)
+                    )
+                )
+
+                ctx = ContextCache.put(user, tasks.all(), history.all()[::-1], summary)
+                ctx.evicted = max(0, unsummarized - len(ctx.history))
+                return ctx
+
     @staticmethod
     async def add_user(tg_id, name, timezone):
-        async with async_session() as session:
-            new_user = User(tg_id=tg_id, name=name, timezone=timezone)
+        async with writer.transaction() as session:
+            new_user = User(tg_id=tg_id, name=Request._fit(User.name, name), timezone=timezone)
             session.add(new_user)
-            await session.commit()
+
+        DigestBuckets.add(timezone)
 
     @staticmethod
     async def get_all_users():
@@ -22,6 +74,18 @@ class Request:
             result = await session.scalars(select(User))
             return result.all()
 
+    @staticmethod
+    async def get_users_by_timezone(timezone):
+        async with async_session() as session:
+            result = await session.scalars(select(User).where(User.timezone == timezone))
+            return result.all()
+
+    @staticmethod
+    async def get_timezones():
+        async with async_session() as session:
+            result = await session.scalars(select(User.timezone).distinct())
+            return result.all()
+
     # --- РАБОТА С ЗАДАЧАМИ ---
     @staticmethod
     async def get_tasks(user_id):
@@ -30,38 +94,79 @@ class Request:
             return result.all()
 
     @staticmethod
-    async def add_task(user_id, name, description, deadline_str):
+    async def get_task_page(user_id, limit, after=None, before=None):
+
+        """Страница (id, name, deadline) без ORM-объектов; keyset по (deadline, id) после after или перед before"""
+
+        statement = select(Task.id, Task.name, Task.deadline).where(Task.user_id == user_id)
+
+        if after is not None:
+            deadline, task_id = after
+            statement = statement.where(
+                Task.deadline >= deadline, or_(Task.deadline > deadline, Task.id > task_id)
+            )
+            statement = statement.order_by(Task.deadline, Task.id)
+
+        elif before is not None:
+            deadline, task_id = before
+            statement = statement.where(
+                Task.deadline <= deadline, or_(Task.deadline < deadline, Task.id < task_id)
+            )
+            statement = statement.order_by(Task.deadline.desc(), Task.id.desc())
+
+        else:
+            statement = statement.order_by(Task.deadline, Task.id)
+
         async with async_session() as session:
+            rows = (await session.execute(statement.limit(limit))).all()
+
+        return rows[::-1] if before is not None else rows
+
+    @staticmethod
+    async def add_task(user_id, name, description, deadline_str):
+        async with writer.transaction() as session:
             deadline = datetime.fromisoformat(deadline_str)
-            new_task = Task(name=name, description=description, deadline=deadline, user_id=user_id)
+            tz_offset = await session.scalar(select(User.timezone).where(User.id == user_id))
+            new_task = Task(
+                name=Request._fit(Task.name, name), description=Request._fit(Task.description, description),
+                deadline=deadline, user_id=user_id,
+                deadline_utc=ReminderQueue.to_utc(deadline, tz_offset)
+            )
             session.add(new_task)
-            await session.commit()
+
+        ReminderQueue.push(new_task.id, new_task.deadline_utc)
+        ContextCache.invalidate(user_id)
+        TaskPageCache.invalidate(user_id)
 
     @staticmethod
-    async def delete_task(user_id, task_name):
-        async with async_session() as session:
-            statement = delete(Task).where(Task.user_id == user_id, Task.name == task_name)
-            await session.execute(statement)
-            await session.commit()
+    async def delete_task(user_id, task_id):
+        async with writer.transaction() as session:
+            statement = delete(Task).where(Task.id == task_id, Task.user_id == user_id).returning(Task.id)
+            deleted_ids = (await session.scalars(statement)).all()
+
+        for task_id in deleted_ids:
+            ReminderQueue.discard(task_id)
+        ContextCache.invalidate(user_id)
+        TaskPageCache.invalidate(user_id)
 
     @staticmethod
-    async def update_task(user_id, old_name, new_name=None, new_description=None, new_deadline_str=None):
-        async with async_session() as session:
-            update_data = {}
-            if new_name: update_data['name'] = new_name
-            if new_description: update_data['description'] = new_description
+    async def update_task(user_id, task_id, new_name=None, new_description=None, new_deadline_str=None):
+        async with writer.transaction() as session:
+            tz_offset = None
             if new_deadline_str:
-                update_data['deadline'] = datetime.fromisoformat(new_deadline_str)
-                update_data['is_reminded'] = False
+                tz_offset = await session.scalar(select(User.timezone).where(User.id == user_id))
 
+            update_data = Request._task_update_values(tz_offset, new_name, new_description, new_deadline_str)
             if not update_data: return
             
-            statement = update(Task).where(
-                Task.user_id == user_id, 
-                func.lower(Task.name) == func.lower(old_name) 
-            ).values(**update_data)
-            await session.execute(statement)
-            await session.commit()
+            statement = update(Task).where(Task.id == task_id, Task.user_id == user_id).values(**update_data).returning(Task.id)
+            updated_ids = (await session.scalars(statement)).all()
+
+        if 'deadline_utc' in update_data:
+            for task_id in updated_ids:
+                ReminderQueue.push(task_id, update_data['deadline_utc'])
+        ContextCache.invalidate(user_id)
+        TaskPageCache.invalidate(user_id)
 
     @staticmethod
     async def get_tasks_for_day(user_id, date_to_check):
@@ -75,53 +180,460 @@ class Request:
             )
             return result.all()
 
+    @staticmethod
+    async def get_day_tasks_by_timezone(timezone, date_to_check):
+
+        """Задачи на день всех пользователей часового пояса одним запросом: {user_id: [Task]}"""
+
+        async with async_session() as session:
+            start_of_day = datetime.combine(date_to_check, time.min)
+            end_of_day = datetime.combine(date_to_check, time.max)
+            result = await session.scalars(
+                select(Task)
+                .join(User, User.id == Task.user_id)
+                .where(User.timezone == timezone, Task.deadline >= start_of_day, Task.deadline <= end_of_day)
+                .order_by(Task.user_id, Task.deadline)
+            )
+
+            tasks_by_user = {}
+            for task in result.all():
+                tasks_by_user.setdefault(task.user_id, []).append(task)
+            return tasks_by_user
+
+    # --- ЗАГОТОВКИ ДАЙДЖЕСТОВ ---
+    @staticmethod
+    async def get_digest_drafts_by_timezone(timezone, local_date):
+        async with async_session() as session:
+            result = await session.scalars(
+                select(DigestDraft)
+                .join(User, User.id == DigestDraft.user_id)
+                .where(User.timezone == timezone, DigestDraft.local_date == local_date)
+            )
+            return {draft.user_id: draft for draft in result.all()}
+
+    @staticmethod
+    async def save_digest_drafts(local_date, drafts, now_utc):
+
+        """Сохраняет заготовки {user_id: (tasks_hash, text)}; запись пользователя за прошлый день заменяется"""
+
+        async with writer.transaction() as session:
+            for user_id, (tasks_hash, text) in drafts.items():
+                values = {'user_id': user_id, 'local_date': local_date, 'tasks_hash': tasks_hash, 'text': text, 'generated_at': now_utc}
+                await session.execute(Request._upsert(session, DigestDraft, values, ['user_id']))
+
+    @staticmethod
+    async def get_digest_sent_user_ids(timezone, local_date):
+        async with async_session() as session:
+            result = await session.scalars(
+                select(DigestSend.user_id)
+                .join(User, User.id == DigestSend.user_id)
+                .where(User.timezone == timezone, DigestSend.local_date == local_date)
+            )
+            return set(result.all())
+
+    @staticmethod
+    async def mark_digest_sent(user_id, local_date, now_utc):
+
+        """Отмечает дайджест пользователя за local_date отправленным; отметка за прошлый день заменяется"""
+
+        async with writer.transaction() as session:
+            values = {'user_id': user_id, 'local_date': local_date, 'sent_at': now_utc}
+            await session.execute(Request._upsert(session, DigestSend, values, ['user_id']))
+
     # --- НАПОМИНАНИЯ ---
     @staticmethod
     async def get_pending_reminders():
         async with async_session() as session:
             result = await session.execute(
-                select(Task, User).join(User).where(Task.is_reminded == False)
+                select(Task.id, Task.deadline_utc)
+                .where(Task.is_reminded == False, Task.deadline_utc.is_not(None))
+                .order_by(Task.deadline_utc)
             )
             return result.all()
 
     @staticmethod
-    async def mark_as_reminded(task_id):
+    async def get_due_reminder_ids(now_utc):
         async with async_session() as session:
-            await session.execute(
-                update(Task).where(Task.id == task_id).values(is_reminded=True)
+            result = await session.scalars(
+                select(Task.id).where(Task.is_reminded == False, Task.deadline_utc <= now_utc)
+                .order_by(Task.deadline_utc)
             )
-            await session.commit()
+            return result.all()
+
+    @staticmethod
+    async def get_reminders_by_ids(task_ids):
+        async with async_session() as session:
+            result = await session.execute(
+                select(Task, User).join(User).where(Task.id.in_(task_ids), Task.is_reminded == False)
+            )
+            return result.all()
+
+    @staticmethod
+    async def fill_missing_deadlines_utc():
+        async with writer.transaction() as session:
+            result = await session.execute(
+                select(Task, User.timezone).join(User).where(Task.deadline_utc.is_(None))
+            )
+
+            for task, tz_offset in result.all():
+                task.deadline_utc = ReminderQueue.to_utc(task.deadline, tz_offset)
 
     # --- ИСТОРИЯ ЧАТА ---
     @staticmethod
     async def add_history(user_id, role, content):
-        async with async_session() as session:
-            session.add(MessageHistory(user_id=user_id, role=role, content=content))
-            await session.commit()
+        async with writer.transaction() as session:
+            row = MessageHistory(user_id=user_id, role=role, content=content)
+            session.add(row)
+
+        ContextCache.append_history(user_id, row)
 
     @staticmethod
     async def get_history(user_id, limit=10):
         async with async_session() as session:
             result = await session.scalars(
                 select(MessageHistory).where(MessageHistory.user_id == user_id)
-                .order_by(MessageHistory.timestamp.desc()).limit(limit)
+                .order_by(MessageHistory.timestamp.desc(), MessageHistory.id.desc()).limit(limit)
             )
             messages = result.all()
             return messages[::-1]
         
     @staticmethod
-    async def update_user_profile(tg_id, name=None, timezone=None):
+    async def get_history_range(user_id, after_id, before_id, limit=50):
         async with async_session() as session:
+            result = await session.scalars(
+                select(MessageHistory).where(
+                    MessageHistory.user_id == user_id,
+                    MessageHistory.id > after_id,
+                    MessageHistory.id < before_id
+                ).order_by(MessageHistory.id.desc()).limit(limit)
+            )
+            return result.all()[::-1]
+
+    @staticmethod
+    async def get_summary_upto(user_id):
+        async with async_session() as session:
+            upto = await session.scalar(select(HistorySummary.last_message_id).where(HistorySummary.user_id == user_id))
+            return upto or 0
+
+    @staticmethod
+    async def save_summary(user_id, content, last_message_id):
+        async with writer.transaction() as session:
+            summary = await session.get(HistorySummary, user_id)
+
+            if summary:
+                summary.content = content
+                summary.last_message_id = last_message_id
+            else:
+                session.add(HistorySummary(user_id=user_id, content=content, last_message_id=last_message_id))
+
+        ContextCache.set_summary(user_id, content, last_message_id)
+
+    @staticmethod
+    async def update_user_profile(tg_id, name=None, timezone=None):
+        async with writer.transaction() as session:
             user = await session.scalar(select(User).where(User.tg_id == tg_id))
 
-            if user:
-                if name:
-                    user.name = name
-                
-                if timezone is not None:
-                    user.timezone = timezone
-                
-                await session.commit()
-                return True
+            if not user:
+                return False
+
+            if name:
+                user.name = Request._fit(User.name, name)
             
-            return False
\ No newline at end of file
+            moved_tasks = await Request._set_timezone(session, user, timezone)
+
+        for task in moved_tasks:
+            ReminderQueue.push(task.id, task.deadline_utc)
+
+        ContextCache.update_user(user.id, name=name, timezone=timezone)
+        DigestBuckets.add(timezone)
+        return True
+
+    @staticmethod
+    async def _set_timezone(session, user, timezone):
+        if timezone is None or timezone == user.timezone:
+            return []
+
+        user.timezone = timezone
+        tasks = await session.scalars(select(Task).where(Task.user_id == user.id))
+        moved_tasks = []
+
+        for task in tasks:
+            task.deadline_utc = ReminderQueue.to_utc(task.deadline, timezone)
+            if not task.is_reminded:
+                moved_tasks.append(task)
+
+        return moved_tasks
+
+    # --- АРХИВ ИСТОРИИ ---
+    @staticmethod
+    async def get_history_owners(min_rows):
+        async with async_session() as session:
+            result = await session.scalars(
+                select(MessageHistory.user_id).group_by(MessageHistory.user_id)
+                .having(func.count(MessageHistory.id) > min_rows)
+            )
+            return result.all()
+
+    @staticmethod
+    async def get_history_boundary(user_id, keep):
+
+        """id самого старого из keep последних сообщений пользователя (None, если сообщений меньше)"""
+
+        async with async_session() as session:
+            return await session.scalar(
+                select(MessageHistory.id).where(MessageHistory.user_id == user_id)
+                .order_by(MessageHistory.id.desc()).offset(keep - 1).limit(1)
+            )
+
+    @staticmethod
+    async def get_prunable_history(user_id, cap_id, age_id, cutoff, limit):
+        conditions = []
+        if cap_id is not None:
+            conditions.append(MessageHistory.id < cap_id)
+        if age_id is not None:
+            conditions.append(and_(MessageHistory.id < age_id, MessageHistory.timestamp < cutoff))
+        if not conditions:
+            return []
+
+        async with async_session() as session:
+            result = await session.scalars(
+                select(MessageHistory).where(MessageHistory.user_id == user_id, or_(*conditions))
+                .order_by(MessageHistory.id).limit(limit)
+            )
+            return result.all()
+
+    @staticmethod
+    async def archive_history(user_id, message_ids, payload, raw_bytes):
+        async with writer.transaction() as session:
+            session.add(HistoryArchive(
+                user_id=user_id,
+                first_message_id=min(message_ids),
+                last_message_id=max(message_ids),
+                message_count=len(message_ids),
+                raw_bytes=raw_bytes,
+                payload=payload,
+            ))
+            await session.execute(
+                delete(MessageHistory).where(MessageHistory.user_id == user_id, MessageHistory.id.in_(message_ids))
+            )
+
+    # --- ИСХОДЯЩИЕ СООБЩЕНИЯ (OUTBOX) ---
+    @staticmethod
+    async def enqueue_outbox(user_id, chat_id, kind, text, task_ids, now_utc):
+
+        """Сохраняет готовое сообщение и одним запросом отмечает его задачи напомненными"""
+
+        async with writer.transaction() as session:
+            row = Outbox(
+                user_id=user_id, chat_id=chat_id, kind=kind, text=text,
+                task_ids=','.join(map(str, task_ids)), next_attempt_at=now_utc
+            )
+            session.add(row)
+
+            marked_ids = []
+            if task_ids:
+                result = await session.scalars(
+                    update(Task).where(
+                        Task.id.in_(task_ids),
+                        Task.is_reminded == False,
+                        Task.deadline_utc <= now_utc
+                    ).values(is_reminded=True).returning(Task.id)
+                )
+                marked_ids = result.all()
+
+        for task_id in marked_ids:
+            ReminderQueue.discard(task_id)
+        ContextCache.invalidate(user_id)
+
+        return row.id
+
+    @staticmethod
+    async def get_due_outbox(now_utc, limit):
+        async with async_session() as session:
+            result = await session.scalars(
+                select(Outbox).where(Outbox.status == 'pending', Outbox.next_attempt_at <= now_utc)
+                .order_by(Outbox.next_attempt_at).limit(limit)
+            )
+            return result.all()
+
+    @staticmethod
+    async def claim_outbox(outbox_id):
+
+        """
+        Помечает сообщение отправляемым до обращения к Telegram; False — его уже
+        забрал другой запуск. Сообщение, оставшееся в 'sending' после сбоя, повторно не отправляется
+        """
+
+        async with writer.transaction() as session:
+            statement = (
+                update(Outbox).where(Outbox.id == outbox_id, Outbox.status == 'pending')
+                .values(status='sending').returning(Outbox.id)
+            )
+            return await session.scalar(statement) is not None
+
+    @staticmethod
+    async def mark_outbox_sent(outbox_id, user_id, text, now_utc):
+
+        """Доставка подтверждена: статус и запись в историю чата в одной транзакции"""
+
+        async with writer.transaction() as session:
+            await session.execute(
+                update(Outbox).where(Outbox.id == outbox_id).values(status='sent', sent_at=now_utc, last_error=None)
+            )
+            row = MessageHistory(user_id=user_id, role='assistant', content=text)
+            session.add(row)
+
+        ContextCache.append_history(user_id, row)
+
+    @staticmethod
+    async def mark_outbox_retry(outbox_id, attempts, next_attempt_at, error, failed=False):
+        async with writer.transaction() as session:
+            await session.execute(
+                update(Outbox).where(Outbox.id == outbox_id).values(
+                    status='failed' if failed else 'pending',
+                    attempts=attempts,
+                    next_attempt_at=next_attempt_at,
+                    last_error=Request._fit(Outbox.last_error, error)
+                )
+            )
+
+    # --- ОБЩИЕ СОСТОЯНИЯ FSM И БЛОКИРОВКИ ---
+    @staticmethod
+    async def get_fsm_record(key):
+        async with async_session() as session:
+            return await session.get(FSMRecord, key)
+
+    @staticmethod
+    async def set_fsm_state(key, state):
+        async with writer.transaction() as session:
+            await session.execute(Request._upsert(session, FSMRecord, {'key': key, 'state': state}, ['key']))
+
+    @staticmethod
+    async def set_fsm_data(key, data):
+        async with writer.transaction() as session:
+            await session.execute(Request._upsert(session, FSMRecord, {'key': key, 'data': data}, ['key']))
+
+    @staticmethod
+    async def acquire_lock(name, owner, expires_at, now):
+
+        """Захват или продление блокировки: удается владельцу или после истечения срока"""
+
+        async with writer.transaction() as session:
+            statement = Request._upsert(
+                session, Lock, {'name': name, 'owner': owner, 'expires_at': expires_at}, ['name'],
+                where=or_(Lock.owner == owner, Lock.expires_at < now)
+            ).returning(Lock.name)
+            return await session.scalar(statement) is not None
+
+    @staticmethod
+    async def release_lock(name, owner):
+        async with writer.transaction() as session:
+            await session.execute(delete(Lock).where(Lock.name == name, Lock.owner == owner))
+
+    @staticmethod
+    def _upsert(session, model, values, index_elements, where=None):
+        dialect = postgresql if session.bind.dialect.name == 'postgresql' else sqlite
+        statement = dialect.insert(model).values(**values)
+        changes = {name: value for name, value in values.items() if name not in index_elements}
+
+        return statement.on_conflict_do_update(index_elements=index_elements, set_=changes, where=where)
+
+    # --- ПАКЕТНОЕ ПРИМЕНЕНИЕ ИЗМЕНЕНИЙ ОТ ИИ ---
+    @staticmethod
+    async def apply_ai_changes(user_id, user_text, reply, added=(), deleted=(), updated=(), name=None, timezone=None):
+        async with writer.transaction() as session:
+            user = await session.get(User, user_id)
+
+            history_rows = []
+            if user_text is not None:
+                history_rows.append(MessageHistory(user_id=user_id, role='user', content=user_text))
+                session.add(history_rows[-1])
+
+            added_rows = []
+            if added:
+                rows = []
+                for task in added:
+                    deadline = datetime.fromisoformat(task['deadline'])
+                    rows.append({
+                        'user_id': user_id,
+                        'name': Request._fit(Task.name, task['name']),
+                        'description': Request._fit(Task.description, task['description']),
+                        'deadline': deadline,
+                        'deadline_utc': ReminderQueue.to_utc(deadline, user.timezone),
+                    })
+                result = await session.execute(insert(Task).returning(Task.id, Task.deadline_utc), rows)
+                added_rows = result.all()
+
+            deleted_ids = []
+            if deleted:
+                result = await session.scalars(
+                    delete(Task).where(Task.id.in_(list(deleted)), Task.user_id == user_id).returning(Task.id)
+                )
+                deleted_ids = result.all()
+
+            updated_rows = []
+            for item in updated:
+                update_data = Request._task_update_values(
+                    user.timezone, item.get('name'), item.get('description'), item.get('deadline')
+                )
+                if not update_data:
+                    continue
+
+                result = await session.scalars(
+                    update(Task).where(Task.id == item['task_id'], Task.user_id == user_id)
+                    .values(**update_data).returning(Task.id)
+                )
+                if 'deadline_utc' in update_data:
+                    updated_rows.extend((task_id, update_data['deadline_utc']) for task_id in result.all())
+
+            if name:
+                user.name = Request._fit(User.name, name)
+            moved_tasks = await Request._set_timezone(session, user, timezone)
+
+            if reply is not None:
+                history_rows.append(MessageHistory(user_id=user_id, role='assistant', content=reply))
+                session.add(history_rows[-1])
+
+            tasks = None
+            if added_rows or deleted_ids or updated or moved_tasks:
+                tasks = (await session.scalars(select(Task).where(Task.user_id == user_id))).all()
+
+        if tasks is not None:
+            ContextCache.set_tasks(user_id, tasks)
+            TaskPageCache.invalidate(user_id)
+        ContextCache.append_history(user_id, *history_rows)
+        ContextCache.update_user(user_id, name=name, timezone=timezone)
+
+        for task_id, deadline_utc in added_rows + updated_rows:
+            ReminderQueue.push(task_id, deadline_utc)
+
+        for task_id in deleted_ids:
+            ReminderQueue.discard(task_id)
+
+        for task in moved_tasks:
+            ReminderQueue.push(task.id, task.deadline_utc)
+
+        DigestBuckets.add(timezone)
+
+    @staticmethod
+    def _task_update_values(tz_offset, new_name=None, new_description=None, new_deadline_str=None):
+        update_data = {}
+        if new_name: update_data['name'] = Request._fit(Task.name, new_name)
+        if new_description: update_data['description'] = Request._fit(Task.description, new_description)
+        if new_deadline_str:
+            update_data['deadline'] = datetime.fromisoformat(new_deadline_str)
+            update_data['deadline_utc'] = ReminderQueue.to_utc(update_data['deadline'], tz_offset)
+            update_data['is_reminded'] = False
+
+        return update_data
+
+    @staticmethod
+    def _fit(column, value):
+
+        """Обрезает строку под длину колонки: PostgreSQL, в отличие от SQLite, отклоняет длинные значения"""
+
+        length = getattr(column.type, 'length', None)
+        if value is None or length is None:
+            return value
+
+        return value[:length]
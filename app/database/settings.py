@@ -0,0 +1,54 @@
+import os
+from typing import Any, Dict, Optional
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.database.sqlite import SQLiteTuning
+
+class DatabaseSettings:
+    """Параметры подключения к БД: SQLite (по умолчанию) или PostgreSQL через asyncpg"""
+
+    URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///db.sqlite3")
+    ECHO = os.getenv("DB_ECHO", "0") == "1"
+
+    POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+    STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+    @classmethod
+    def engine_kwargs(cls, url: Optional[str] = None) -> Dict[str, Any]:
+
+        """Аргументы create_async_engine для выбранного бэкенда"""
+
+        url = make_url(url or cls.URL)
+        kwargs: Dict[str, Any] = {"echo": cls.ECHO, "pool_pre_ping": cls.PRE_PING}
+
+        if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+            return kwargs
+
+        kwargs.update(
+            pool_size=cls.POOL_SIZE,
+            max_overflow=cls.MAX_OVERFLOW,
+            pool_timeout=cls.POOL_TIMEOUT,
+            pool_recycle=cls.POOL_RECYCLE,
+        )
+
+        if url.get_driver_name() == "asyncpg":
+            kwargs["connect_args"] = {
+                "statement_cache_size": cls.STATEMENT_CACHE_SIZE,
+                "prepared_statement_cache_size": cls.STATEMENT_CACHE_SIZE,
+                "server_settings": {"timezone": "UTC"},
+            }
+
+        return kwargs
+
+    @classmethod
+    def create_engine(cls, url: Optional[str] = None) -> AsyncEngine:
+        engine = create_async_engine(url or cls.URL, **cls.engine_kwargs(url))
+        SQLiteTuning.install(engine)
+
+        return engine
@@ -0,0 +1,53 @@
+from typing import Any, Dict
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+class SQLiteTuning:
+    """PRAGMA-настройки SQLite, применяемые к каждому соединению"""
+
+    PRAGMAS: Dict[str, Any] = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -20000,
+        "mmap_size": 256 * 1024 * 1024,
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+    }
+
+    # Опция выполнения движка, с которой соединения открывают транзакцию на запись сразу
+    BEGIN_OPTION = "sqlite_begin"
+
+    @classmethod
+    def install(cls, engine: AsyncEngine) -> None:
+
+        """Подключает обработчики событий движка (только для SQLite)"""
+
+        if engine.dialect.name != "sqlite":
+            return
+
+        event.listen(engine.sync_engine, "connect", cls._on_connect)
+        event.listen(engine.sync_engine, "begin", cls._on_begin)
+
+    @classmethod
+    def _on_connect(cls, dbapi_connection, connection_record) -> None:
+
+        """Отключает неявные транзакции драйвера, чтобы работали SAVEPOINT, и ставит PRAGMA"""
+
+        dbapi_connection.isolation_level = None
+
+        cursor = dbapi_connection.cursor()
+        for name, value in cls.PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    @staticmethod
+    def _on_begin(conn) -> None:
+
+        """
+        Соединения писателя начинают транзакцию с IMMEDIATE: у отложенной BEGIN
+        чтение с последующей записью падает с SQLITE_BUSY_SNAPSHOT, если другой
+        процесс успел закоммитить, и busy_timeout такую ошибку не повторяет
+        """
+
+        immediate = conn.get_execution_options().get(SQLiteTuning.BEGIN_OPTION) == "IMMEDIATE"
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if immediate else "BEGIN")
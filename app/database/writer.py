@@ -0,0 +1,166 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.logger import logger
+from app.database.models import engine
+from app.database.sqlite import SQLiteTuning
+
+class _Slot:
+    """Заявка на запись: сессия выдается писателем, коммит общий на пачку"""
+
+    def __init__(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.granted: "asyncio.Future[AsyncSession]" = loop.create_future()
+        self.released: "asyncio.Future[Optional[BaseException]]" = loop.create_future()
+        self.committed: "asyncio.Future[None]" = loop.create_future()
+
+def _resolve(future: asyncio.Future, result=None, error: Optional[BaseException] = None) -> None:
+    if future.done():
+        return
+
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+class Writer:
+    """Единственный писатель: заявки выполняются по очереди и фиксируются групповым коммитом"""
+
+    MAX_BATCH = 64
+
+    def __init__(self, session_factory: async_sessionmaker) -> None:
+        self.session_factory = session_factory
+        self.batches = 0
+        self.writes = 0
+
+        self._queue: Optional["asyncio.Queue[Optional[_Slot]]"] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        if self.running:
+            return
+
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Database writer started")
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        logger.info(f"Database writer stopped: {self.writes} writes in {self.batches} commits")
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[AsyncSession]:
+
+        """
+        Сессия для записи; выход из блока ждет общего коммита пачки. Писатель ждет
+        released, поэтому заявка освобождается при любом исходе, включая отмену
+        вызывающего до или сразу после выдачи сессии
+        """
+
+        if not self.running:
+            async with self.session_factory() as session:
+                yield session
+                await session.commit()
+            return
+
+        slot = _Slot()
+        self._queue.put_nowait(slot)
+
+        try:
+            session = await slot.granted
+            yield session
+
+        except BaseException as e:
+            _resolve(slot.released, e)
+            raise
+
+        _resolve(slot.released, None)
+        await slot.committed
+
+    async def _run(self) -> None:
+        stopping = False
+
+        while not stopping:
+            slot = await self._queue.get()
+            if slot is None:
+                break
+
+            batch: List[_Slot] = [slot]
+            while len(batch) < self.MAX_BATCH and not self._queue.empty():
+                slot = self._queue.get_nowait()
+                if slot is None:
+                    stopping = True
+                    break
+                batch.append(slot)
+
+            try:
+                await self._commit_batch(batch)
+
+            except Exception as e:
+
+                # Сбой вне отдельной заявки (сессия, savepoint): ошибку получает вся пачка, писатель продолжает работу
+                logger.error(f"Write batch of {len(batch)} failed: {e}")
+                for slot in batch:
+                    if slot.granted.done():
+                        _resolve(slot.committed, error=e)
+                    else:
+                        _resolve(slot.granted, error=e)
+
+    async def _commit_batch(self, batch: List[_Slot]) -> None:
+        done: List[_Slot] = []
+
+        async with self.session_factory() as session:
+            for slot in batch:
+                if slot.granted.done():
+                    continue
+
+                nested = await session.begin_nested()
+                slot.granted.set_result(session)
+                error = await slot.released
+
+                try:
+                    if error is None:
+                        await nested.commit()
+                        done.append(slot)
+                    else:
+                        await nested.rollback()
+
+                except Exception as e:
+                    await nested.rollback()
+                    _resolve(slot.committed, error=e)
+
+            try:
+                await session.commit()
+
+            except Exception as e:
+                logger.error(f"Group commit of {len(done)} writes failed: {e}")
+                for slot in done:
+                    _resolve(slot.committed, error=e)
+                return
+
+        self.batches += 1
+        self.writes += len(done)
+
+        for slot in done:
+            _resolve(slot.committed)
+
+# Транзакции писателя на SQLite начинаются с BEGIN IMMEDIATE (см. SQLiteTuning._on_begin)
+writer = Writer(async_sessionmaker(
+    engine.execution_options(**{SQLiteTuning.BEGIN_OPTION: "IMMEDIATE"}), expire_on_commit=False
+))
@@ -0,0 +1,119 @@
+import os
+import math
+import hashlib
+from itertools import islice
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Sequence, Tuple
+
+from app.ai import AI as ai
+from app.logger import logger
+from app.scheduler import DigestBuckets
+from app.database.request import Request as rq
+from config import MORNING_REPORT_HOUR, MORNING_REPORT_MINUTE
+
+class DigestDrafts:
+    """
+    Заготовки утренних дайджестов. В окне WINDOW_MINUTES до отправки
+    периодическая задача генерирует тексты и сохраняет их вместе с хешем
+    задач на день; к моменту отправки остается взять готовый текст.
+    Заготовка пересчитывается, только если задачи пользователя изменились
+    """
+
+    WINDOW_MINUTES = int(os.getenv("DIGEST_PREGEN_WINDOW_MINUTES", "60"))
+    INTERVAL_MINUTES = int(os.getenv("DIGEST_PREGEN_INTERVAL_MINUTES", "5"))
+
+    @staticmethod
+    def fingerprint(name: str, tasks: Sequence[Any]) -> str:
+
+        """Хеш всего, от чего зависит текст дайджеста: имени и задач на день"""
+
+        return hashlib.sha1(f"{name}\n{ai.format_day_tasks(list(tasks))}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def next_send(tz_offset: int, now_utc: datetime) -> Tuple[date, float]:
+
+        """Локальная дата ближайшей отправки и сколько минут до нее осталось"""
+
+        local_now = now_utc + timedelta(hours=tz_offset)
+        send_at = local_now.replace(hour=MORNING_REPORT_HOUR, minute=MORNING_REPORT_MINUTE, second=0, microsecond=0)
+        if send_at <= local_now:
+            send_at += timedelta(days=1)
+
+        return send_at.date(), (send_at - local_now).total_seconds() / 60
+
+    @classmethod
+    async def prepare(cls) -> None:
+
+        """Фоновая задача: догенерирует заготовки для корзин, чье время отправки попало в окно"""
+
+        now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        for tz_offset in DigestBuckets.offsets():
+            local_date, minutes_left = cls.next_send(tz_offset, now_utc)
+            if minutes_left > cls.WINDOW_MINUTES:
+                continue
+
+            # Работа делится поровну между оставшимися запусками, чтобы не создавать пик в начале окна
+            runs_left = max(1, int(minutes_left // cls.INTERVAL_MINUTES))
+            try:
+                await cls.prepare_bucket(tz_offset, local_date, runs_left, now_utc)
+
+            except Exception as e:
+                logger.error(f"Digest drafts for UTC{tz_offset:+d} failed: {e}")
+
+    @classmethod
+    async def prepare_bucket(cls, tz_offset: int, local_date: date, runs_left: int = 1, now_utc: datetime = None) -> int:
+
+        """Генерирует отсутствующие и устаревшие заготовки пояса (долю 1/runs_left); возвращает их число"""
+
+        users = await rq.get_users_by_timezone(tz_offset)
+        tasks_by_user = await rq.get_day_tasks_by_timezone(tz_offset, local_date)
+        drafts = await rq.get_digest_drafts_by_timezone(tz_offset, local_date)
+
+        stale: Dict[int, Tuple[str, List[Any]]] = {}
+        for user in users:
+            tasks = tasks_by_user.get(user.id, [])
+            draft = drafts.get(user.id)
+            if draft is None or draft.tasks_hash != cls.fingerprint(user.name, tasks):
+                stale[user.id] = (user.name, tasks)
+
+        if not stale:
+            return 0
+
+        chosen = dict(islice(stale.items(), math.ceil(len(stale) / runs_left)))
+        reports = await ai.generate_morning_reports(chosen)
+
+        await rq.save_digest_drafts(
+            local_date,
+            {user_id: (cls.fingerprint(*chosen[user_id]), text) for user_id, text in reports.items()},
+            now_utc or datetime.now(timezone.utc).replace(tzinfo=None)
+        )
+        logger.info(f"Digest drafts UTC{tz_offset:+d} for {local_date}: {len(reports)} generated, {len(stale) - len(chosen)} left")
+
+        return len(reports)
+
+    @classmethod
+    async def reports_for(cls, tz_offset: int, users: Sequence[Any], local_date: date) -> Dict[int, str]:
+
+        """Тексты к отправке: актуальные заготовки берутся как есть, остальные генерируются сейчас"""
+
+        tasks_by_user = await rq.get_day_tasks_by_timezone(tz_offset, local_date)
+        drafts = await rq.get_digest_drafts_by_timezone(tz_offset, local_date)
+
+        reports: Dict[int, str] = {}
+        missing: Dict[int, Tuple[str, List[Any]]] = {}
+
+        for user in users:
+            tasks = tasks_by_user.get(user.id, [])
+            draft = drafts.get(user.id)
+
+            if draft is not None and draft.tasks_hash == cls.fingerprint(user.name, tasks):
+                reports[user.id] = draft.text
+            else:
+                missing[user.id] = (user.name, tasks)
+
+        if missing:
+            reports.update(await ai.generate_morning_reports(missing))
+
+        logger.info(f"Digest UTC{tz_offset:+d}: {len(users) - len(missing)} from drafts, {len(missing)} generated on send")
+        return reports
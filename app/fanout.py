@@ -0,0 +1,122 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, TypeVar
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.logger import logger
+from app.metrics import Metrics
+
+T = TypeVar('T')
+
+@dataclass
+class RunStats:
+    """Итоги одного запуска фоновой рассылки"""
+
+    job: str
+    sent: int = 0
+    failed: int = 0
+    wall_time: float = 0.0
+
+class RateLimiter:
+    """Ограничитель частоты: не больше rate событий в секунду на ключ"""
+
+    MAX_KEYS = 10_000
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate
+        self._slots: Dict[Hashable, float] = {}
+
+    async def acquire(self, key: Hashable = None) -> None:
+
+        """Ждет своего слота; слоты выдаются без блокировки, т.к. цикл событий однопоточный"""
+
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._slots.get(key, 0.0))
+        self._slots[key] = slot + self.interval
+
+        if len(self._slots) > self.MAX_KEYS:
+            self._slots = {k: v for k, v in self._slots.items() if v > now}
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class FanOut:
+    """Пул воркеров для фоновых рассылок с учетом лимитов Telegram"""
+
+    CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "8"))
+    GLOBAL_RATE = float(os.getenv("FANOUT_GLOBAL_RATE", "25"))
+    PER_CHAT_RATE = float(os.getenv("FANOUT_CHAT_RATE", "1"))
+
+    _global_limiter = RateLimiter(GLOBAL_RATE)
+    _chat_limiter = RateLimiter(PER_CHAT_RATE)
+
+    @classmethod
+    def configure(cls, concurrency: Optional[int] = None, global_rate: Optional[float] = None, per_chat_rate: Optional[float] = None) -> None:
+
+        """Переопределяет размер пула и лимиты отправки, заданные через FANOUT_* в окружении"""
+
+        if concurrency:
+            cls.CONCURRENCY = concurrency
+
+        if global_rate:
+            cls.GLOBAL_RATE = global_rate
+            cls._global_limiter = RateLimiter(global_rate)
+
+        if per_chat_rate:
+            cls.PER_CHAT_RATE = per_chat_rate
+            cls._chat_limiter = RateLimiter(per_chat_rate)
+
+    @classmethod
+    async def send_message(cls, bot: Bot, chat_id: int, text: str, **kwargs: Any) -> Any:
+
+        """Отправка сообщения с соблюдением глобального и поканального лимита"""
+
+        await cls._global_limiter.acquire()
+        await cls._chat_limiter.acquire(chat_id)
+
+        try:
+            return await bot.send_message(chat_id, text, **kwargs)
+
+        except TelegramRetryAfter as e:
+            logger.warning(f"Telegram flood control for chat {chat_id}, retry in {e.retry_after}s")
+            await asyncio.sleep(e.retry_after)
+            return await bot.send_message(chat_id, text, **kwargs)
+
+    @classmethod
+    async def run(
+        cls,
+        job: str,
+        items: Iterable[T],
+        worker: Callable[[T], Awaitable[Any]],
+        label: Callable[[T], Any] = repr,
+        concurrency: Optional[int] = None
+    ) -> RunStats:
+
+        """Параллельно обрабатывает элементы; ошибка одного элемента не влияет на остальные"""
+
+        stats = RunStats(job=job)
+        semaphore = asyncio.Semaphore(concurrency or cls.CONCURRENCY)
+        started = time.monotonic()
+
+        async def _process(item: T) -> None:
+            async with semaphore:
+                try:
+                    await worker(item)
+                    stats.sent += 1
+                    Metrics.SENT.inc(job=job, result="sent")
+
+                except Exception as e:
+                    stats.failed += 1
+                    Metrics.SENT.inc(job=job, result="failed")
+                    logger.error(f"{job}: failed for {label(item)}: {e}")
+
+        await asyncio.gather(*(_process(item) for item in items))
+
+        stats.wall_time = time.monotonic() - started
+        logger.info(f"{job}: sent={stats.sent} failed={stats.failed} wall_time={stats.wall_time:.2f}s")
+
+        return stats
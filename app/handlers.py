@@ -1,17 +1,33 @@
+import time
+from typing import Any, List, Optional
 from aiogram import Router, F
 from aiogram.enums import ParseMode
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.filters import Command, CommandStart
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
 
 from app.ai import AI as ai
-from app.logger import logger
+from app.ai_json import TaskDiff
+from app.task_index import NameMatch, TaskNameIndex
+from app.task_pages import TaskCursor, TaskPages
+from app.cluster import Cluster
+from app.metrics import Metrics, HandlerMetrics
+from app.logger import logger, LogContext
+from app.intents import FastPath
+from app.mailbox import Mailbox
+from app.summary import HistoryCompactor
 from config import ERROR_STICKER_ID
 from app.keyboards import Keyboards as kb
 from app.database.request import Request as rq
 
 router = Router()
+router.message.middleware(HandlerMetrics())
+router.callback_query.middleware(HandlerMetrics())
+
+EDIT_INTERVAL = 1.5
+MESSAGE_LIMIT = 4096
 
 class Reg(StatesGroup):
 
@@ -20,33 +36,153 @@ class Reg(StatesGroup):
   name = State()
   timezone = State()
 
-async def process_ai_actions(user_id: int, ai_data: dict) -> None:
-
-  """Обрабатывает изменения в БД (задачи и профиль), присланные ИИ"""
-
-  for task in ai_data.get('added_tasks', []):
-      await rq.add_task(
-        user_id=user_id,
-        name=task.get('name', 'Без названия'),
-        description=task.get('description', ''),
-        deadline_str=task.get('deadline')
-      )
-
-  for task_name in ai_data.get('deleted_tasks', []):
-    await rq.delete_task(user_id, task_name)
-
-  for item in ai_data.get('updated_tasks', []):
-    old_name = item.get('old_name')
-    new_data = item.get('new_data', {})
-      
-    if old_name:
-      await rq.update_task(
-        user_id=user_id,
-        old_name=old_name,
-        new_name=new_data.get('name'),
-        new_description=new_data.get('description'),
-        new_deadline_str=new_data.get('deadline')
-      )
+def describe_unresolved(match: NameMatch) -> str:
+
+  """Пояснение для пользователя, почему задача из ответа ИИ не изменена"""
+
+  if len(match.candidates) > 1:
+    options = ", ".join(f"«{task.name}» ({task.deadline.strftime('%d.%m %H:%M')})" for task in match.candidates)
+    return f"❓ Не понял, какую задачу вы имели в виду под «{match.query}»: {options}. Уточните, пожалуйста."
+
+  if match.candidates:
+    task = match.candidates[0]
+    return (
+      f"❓ Задачу «{match.query}» не нашел. Возможно, вы имели в виду «{task.name}» "
+      f"({task.deadline.strftime('%d.%m %H:%M')})? Назовите ее точнее, и я ее изменю."
+    )
+
+  return f"❓ Задачу «{match.query}» не нашел в списке."
+
+async def process_ai_actions(
+  user_id: int,
+  user_text: Optional[str],
+  diff: TaskDiff,
+  reply: Optional[str],
+  index: TaskNameIndex,
+  notes: Optional[List[str]] = None
+) -> Optional[str]:
+
+  """
+  Применяет изменения задач и профиля от ИИ вместе с историей одной транзакцией.
+  Названия задач сводятся к id через индекс; что не удалось однозначно найти,
+  попадает в notes и дописывается к ответу. Возвращает итоговый ответ
+  """
+
+  if diff.errors:
+    logger.warning(f"User {user_id} | AI response {diff.status}, dropped: {'; '.join(diff.errors)}")
+
+  notes = notes if notes is not None else []
+  deleted_ids: List[int] = []
+  updated = []
+
+  for name in diff.deleted:
+    match = index.resolve(name)
+    if match.task is None:
+      notes.append(describe_unresolved(match))
+    elif match.task.id not in deleted_ids:
+      deleted_ids.append(match.task.id)
+
+  for change in diff.updated:
+    match = index.resolve(change.old_name)
+    if match.task is None:
+      notes.append(describe_unresolved(match))
+      continue
+
+    updated.append({'task_id': match.task.id, 'name': change.name, 'description': change.description, 'deadline': change.deadline})
+
+  if reply is not None and notes:
+    reply = "\n\n".join([reply, *notes])
+
+  await rq.apply_ai_changes(
+    user_id=user_id,
+    user_text=user_text,
+    reply=reply,
+    added=[{'name': task.name, 'description': task.description, 'deadline': task.deadline} for task in diff.added],
+    deleted=deleted_ids,
+    updated=updated,
+    name=diff.profile.name,
+    timezone=diff.profile.timezone
+  )
+
+  if diff.profile.name or diff.profile.timezone is not None:
+    logger.info(f"User {user_id} updated profile via AI")
+
+  return reply
+
+async def edit_reply(placeholder: Message, text: str, parse_mode: Optional[str] = None) -> None:
+
+  """Редактирует сообщение-плейсхолдер, не падая на ошибках разметки"""
+
+  try:
+    await placeholder.edit_text(text[:MESSAGE_LIMIT], parse_mode=parse_mode)
+
+  except TelegramBadRequest as e:
+    if parse_mode:
+      await placeholder.edit_text(text[:MESSAGE_LIMIT])
+
+    elif "not modified" not in str(e):
+      logger.warning(f"Не удалось обновить сообщение {placeholder.message_id}: {e}")
+
+async def stream_ai_chat(
+  message: Message,
+  text: str,
+  user: Any,
+  tasks: List[Any],
+  history: List[Any],
+  summary: Optional[str],
+  index: TaskNameIndex
+) -> None:
+
+  """Потоковый ответ ИИ: плейсхолдер редактируется по мере генерации"""
+
+  placeholder = await message.answer("⏳")
+  notes: List[str] = []
+  early_actions = None
+  payload = None
+  shown = ""
+  last_edit = 0.0
+
+  try:
+    async for payload in ai.stream_tasks_from_ai(text, user.timezone, tasks, history, summary):
+      if early_actions is None and payload.actions is not None:
+        early_actions = payload.actions
+        await process_ai_actions(user.id, text, early_actions, None, index, notes)
+
+      partial = payload.reply
+      now = time.monotonic()
+
+      if partial and partial != shown and now - last_edit >= EDIT_INTERVAL:
+        shown = partial
+        last_edit = now
+        await edit_reply(placeholder, partial + " ▌")
+
+  except Exception as e:
+    Metrics.HANDLER_ERRORS.inc(handler="chat_turn")
+    logger.error(f'Обрыв потокового ответа для пользователя {user.id}: {e}', exc_info=True)
+
+    if early_actions is None:
+      await edit_reply(placeholder, 'Упс! Что-то пошло не так. Попробуй еще раз чуть позже.')
+      return
+
+    # Изменения задач и реплика пользователя уже сохранены: ход закрывается частичным ответом
+    partial = (payload.reply if payload else None) or shown
+    reply = "\n\n".join([partial or "Изменения задач сохранены, но ответ прервался.", *notes])
+    await rq.add_history(user.id, 'assistant', reply)
+    await edit_reply(placeholder, reply + "\n\n⚠️ Ответ оборвался, попробуйте переспросить.")
+    return
+
+  diff = payload.finish() if payload else TaskDiff()
+  reply = diff.reply or "Запрос обработан."
+
+  logger.info(f"User {user.id} | A:{len(diff.added)} D:{len(diff.deleted)} U:{len(diff.updated)} (stream)")
+
+  if early_actions is None:
+    reply = await process_ai_actions(user.id, text, diff, reply, index, notes)
+
+  else:
+    reply = await process_ai_actions(user.id, None, diff.without(early_actions), reply, index, notes)
+
+  await edit_reply(placeholder, reply, parse_mode=ParseMode.MARKDOWN)
 
 @router.message(CommandStart())
 async def cmd_start(message: Message, state: FSMContext) -> None:
@@ -82,22 +218,35 @@ async def cmd_settings(message: Message) -> None:
 @router.message(Command('tasks'))
 async def cmd_tasks(message: Message) -> None:
   
-  """Быстрый просмотр всех задач (без ИИ)"""
+  """Быстрый просмотр задач постранично (без ИИ)"""
 
-  user = await rq.get_user(message.from_user.id)
-  if not user: 
+  user_id = await rq.get_user_id(message.from_user.id)
+  if not user_id: 
     return
-  
-  tasks = await rq.get_tasks(user.id)
-  if not tasks:
-    await message.answer("У вас пока нет активных задач.")
+
+  text, markup = await TaskPages.page(user_id)
+  await message.answer(text, parse_mode=ParseMode.MARKDOWN, reply_markup=markup)
+
+@router.callback_query(F.data.startswith(TaskCursor.PREFIX))
+async def cb_tasks_page(callback: CallbackQuery) -> None:
+
+  """Листание списка задач кнопками «Назад» / «Далее»"""
+
+  user_id = await rq.get_user_id(callback.from_user.id)
+  if not user_id:
+    await callback.answer()
     return
-  
-  text = "📋 **Ваши текущие задачи:**\n\n"
-  for i, t in enumerate(tasks, 1):
-    text += f"{i}. {t.name}\n   ⏰ {t.deadline.strftime('%d.%m %H:%M')}\n"
 
-  await message.answer(text, parse_mode=ParseMode.MARKDOWN)
+  text, markup = await TaskPages.page(user_id, TaskCursor.unpack(callback.data))
+
+  try:
+    await callback.message.edit_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=markup)
+
+  except TelegramBadRequest as e:
+    if "not modified" not in str(e):
+      logger.warning(f"Не удалось показать страницу задач {callback.message.message_id}: {e}")
+
+  await callback.answer()
 
 @router.message(Reg.name)
 async def reg_name_input(message: Message, state: FSMContext) -> None:
@@ -149,54 +298,75 @@ async def cb_change_tz(callback: CallbackQuery, state: FSMContext) -> None:
   await callback.message.answer("Выберите новый часовой пояс:", reply_markup=kb.inline_timezone())
   await callback.answer()
 
-@router.message(F.text)
-async def handle_ai_chat(message: Message) -> None:
-  
-  """Обработка всех текстовых сообщений через ИИ"""
+async def run_chat_turn(messages: List[Message]) -> None:
 
-  user = await rq.get_user(message.from_user.id)
+  """Один ход диалога с ИИ для пачки подряд идущих сообщений пользователя"""
 
-  if not user:
-    await message.answer('Пожалуйста, сначала зарегистрируйтесь: /start')
+  # Воркер почтового ящика живет дольше одного апдейта, поэтому пользователь привязывается здесь
+  with LogContext.bind(user_id=messages[-1].from_user.id), Metrics.HANDLER_SECONDS.time(handler="chat_turn"):
+    async with Cluster.locks.hold(f"chat:{messages[-1].from_user.id}", ttl=Cluster.TURN_LOCK_TTL):
+      await chat_turn(messages)
+
+async def chat_turn(messages: List[Message]) -> None:
+  message = messages[-1]
+  text = "\n".join(m.text for m in messages)
+  ctx = await rq.get_context(message.from_user.id)
+
+  if not ctx:
     return
   
+  user = ctx.user
   await message.bot.send_chat_action(chat_id=message.chat.id, action='typing')
 
   try:
-    current_tasks = await rq.get_tasks(user.id)
-    chat_history = await rq.get_history(user.id, limit=10)
+    fast = FastPath.match(text, user.timezone, ctx.tasks)
 
-    ai_data = await ai.extract_tasks_from_ai(message.text, user.timezone, current_tasks, chat_history)
-    
-    added = ai_data.get('added_tasks', [])
-    deleted = ai_data.get('deleted_tasks', [])
-    updated = ai_data.get('updated_tasks', [])
-    profile = ai_data.get('update_profile')
-    reply = ai_data.get('reply') or "Запрос обработан."
+    if fast:
+      reply = await process_ai_actions(user.id, text, fast.diff, fast.diff.reply, ctx.task_index())
+      await message.answer(reply, parse_mode=ParseMode.MARKDOWN)
+      return
 
-    logger.info(f"User {user.id} | A:{len(added)} D:{len(deleted)} U:{len(updated)}")
+    started = time.monotonic()
 
-    await rq.add_history(user.id, "user", message.text)
+    if ai.STREAM_REPLIES:
+      await stream_ai_chat(message, text, user, list(ctx.tasks), list(ctx.history), ctx.summary, ctx.task_index())
+      FastPath.record_llm_latency(time.monotonic() - started)
+      HistoryCompactor.maybe_refresh(ctx)
+      return
 
-    await process_ai_actions(user.id, ai_data)
+    diff = await ai.extract_tasks_from_ai(text, user.timezone, list(ctx.tasks), list(ctx.history), ctx.summary)
+    FastPath.record_llm_latency(time.monotonic() - started)
+    
+    reply = diff.reply or "Запрос обработан."
 
-    if profile:
-      new_name = profile.get('name')
-      raw_tz = profile.get('timezone')
+    logger.info(f"User {user.id} | A:{len(diff.added)} D:{len(diff.deleted)} U:{len(diff.updated)}")
 
-      if new_name or raw_tz is not None:
-        try:
-          new_tz = int(raw_tz) if raw_tz is not None else None
-          await rq.update_user_profile(user.tg_id, name=new_name, timezone=new_tz)
-          logger.info(f"User {user.id} updated profile via AI")
-        
-        except (ValueError, TypeError):
-          logger.warning(f"ИИ прислал некорректный формат часового пояса: {raw_tz}")
+    reply = await process_ai_actions(user.id, text, diff, reply, ctx.task_index())
+    HistoryCompactor.maybe_refresh(ctx)
 
-    await rq.add_history(user.id, "assistant", reply)
     await message.answer(reply, parse_mode=ParseMode.MARKDOWN)
   
   except Exception as e:
+    Metrics.HANDLER_ERRORS.inc(handler="chat_turn")
     logger.error(f'Ошибка в ai_chat для пользователя {message.from_user.id}: {e}', exc_info=True)
     await message.answer_sticker(sticker=ERROR_STICKER_ID)
     await message.answer('Упс! Что-то пошло не так. Попробуй еще раз чуть позже.')
+
+@router.message(F.text)
+async def handle_ai_chat(message: Message) -> None:
+  
+  """Обработка всех текстовых сообщений через ИИ (по одному ходу на пользователя)"""
+
+  # Здесь нужна только проверка регистрации. В одиночном режиме загруженный контекст
+  # остается в кэше для chat_turn; в общем кэш отключен, и полная загрузка повторилась бы
+  tg_id = message.from_user.id
+  registered = await rq.get_user_id(tg_id) if Cluster.shared else await rq.get_context(tg_id)
+
+  if registered is None:
+    await message.answer('Пожалуйста, сначала зарегистрируйтесь: /start')
+    return
+
+  accepted = await Mailbox.submit(tg_id, message, run_chat_turn)
+
+  if not accepted:
+    await message.answer('⏳ Я еще обрабатываю ваши предыдущие сообщения, отправьте это чуть позже.')
@@ -0,0 +1,204 @@
+import re
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from app.logger import logger
+from app.ai_json import DEADLINE_FORMAT, TaskChange, TaskDiff
+from app.task_index import TaskNameIndex
+
+@dataclass
+class IntentMatch:
+    """Результат локального распознавания: тот же формат, что и ответ ИИ"""
+
+    intent: str
+    confidence: float
+    diff: TaskDiff
+
+class DateTimeParser:
+    """Разбор простых русских выражений даты и времени"""
+
+    DAY_WORDS = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+
+    _DAY_RE = re.compile(r"\b(?P<word>сегодня|послезавтра|завтра)\b|\b(?P<d>\d{1,2})\.(?P<m>\d{1,2})(?:\.(?P<y>\d{4}))?\b")
+    _TIME_RE = re.compile(r"(?:\bв\s+)?\b(?P<h>\d{1,2})(?:[:.](?P<min>\d{2})|\s*(?:час(?:а|ов)?|ч)\b)")
+    _BARE_HOUR_RE = re.compile(r"\bв\s+(?P<h>\d{1,2})\b")
+
+    @classmethod
+    def parse(cls, text: str, today: date) -> Tuple[Optional[date], Optional[Tuple[int, int]], str]:
+
+        """Возвращает (дата, (час, минута), остаток текста без распознанных частей)"""
+
+        rest = text
+        day: Optional[date] = None
+        clock: Optional[Tuple[int, int]] = None
+
+        match = cls._DAY_RE.search(rest)
+        if match:
+            if match.group("word"):
+                day = today + timedelta(days=cls.DAY_WORDS[match.group("word")])
+            else:
+                try:
+                    day = date(int(match.group("y") or today.year), int(match.group("m")), int(match.group("d")))
+                except ValueError:
+                    return None, None, text
+            rest = rest[:match.start()] + rest[match.end():]
+
+        match = cls._TIME_RE.search(rest) or cls._BARE_HOUR_RE.search(rest)
+        if match:
+            hour = int(match.group("h"))
+            minute = int(match.groupdict().get("min") or 0)
+            if hour > 23 or minute > 59:
+                return None, None, text
+            clock = (hour, minute)
+            rest = rest[:match.start()] + rest[match.end():]
+
+        return day, clock, " ".join(rest.split())
+
+class FastPath:
+    """Локальная обработка однозначных команд без обращения к ИИ"""
+
+    MIN_CONFIDENCE = 0.8
+
+    _LIST_RE = re.compile(
+        r"^(?:покажи(?:\s+мне)?|какие(?:\s+у\s+меня)?|что(?:\s+у\s+меня)?|мои|список)?\s*"
+        r"(?:мои\s+)?(?P<what>задачи|задач|дела|дел|планы|план)?\s*"
+        r"(?:на\s+)?(?P<day>сегодня|завтра|послезавтра)?\s*\??$"
+    )
+    _DELETE_RE = re.compile(r"^(?:удали|удалить|убери|вычеркни|отмени)\s+(?:задачу\s+)?(?P<name>.+?)[.!]?$")
+    _MOVE_RE = re.compile(r"^(?:перенеси|перенести|передвинь|сдвинь)\s+(?:задачу\s+)?(?P<body>.+?)[.!]?$")
+    _MOVE_SPLIT_RE = re.compile(r"\s+на\s+")
+
+    hits = 0
+    misses = 0
+    saved_seconds = 0.0
+    llm_latency = 5.0
+
+    @classmethod
+    def match(cls, text: str, tz_offset: int, tasks: Sequence[Any]) -> Optional[IntentMatch]:
+
+        """Пробует распознать команду; None — нужно идти к ИИ"""
+
+        started = time.monotonic()
+        normalized = " ".join(text.lower().split())
+        now = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=tz_offset)
+
+        result = None
+        for matcher in (cls._match_list, cls._match_delete, cls._match_move):
+            result = matcher(normalized, now, tasks)
+            if result:
+                break
+
+        if not result or result.confidence < cls.MIN_CONFIDENCE:
+            cls.misses += 1
+            return None
+
+        cls.hits += 1
+        cls.saved_seconds += max(0.0, cls.llm_latency - (time.monotonic() - started))
+        logger.info(
+            f"Fast path '{result.intent}' hit: rate {cls.hit_rate():.0%} "
+            f"({cls.hits}/{cls.hits + cls.misses}), saved ~{cls.saved_seconds:.0f}s of LLM time"
+        )
+        return result
+
+    @classmethod
+    def record_llm_latency(cls, seconds: float) -> None:
+
+        """Скользящее среднее задержки ИИ для оценки сэкономленного времени"""
+
+        cls.llm_latency = 0.8 * cls.llm_latency + 0.2 * seconds
+
+    @classmethod
+    def hit_rate(cls) -> float:
+        total = cls.hits + cls.misses
+        return cls.hits / total if total else 0.0
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "hit_rate": cls.hit_rate(),
+            "saved_seconds": cls.saved_seconds,
+        }
+
+    @classmethod
+    def _match_list(cls, text: str, now: datetime, tasks: Sequence[Any]) -> Optional[IntentMatch]:
+        match = cls._LIST_RE.match(text)
+        if not match or not (match.group("what") or match.group("day")):
+            return None
+
+        day_word = match.group("day")
+        if day_word:
+            day = now.date() + timedelta(days=DateTimeParser.DAY_WORDS[day_word])
+            selected = sorted((t for t in tasks if t.deadline.date() == day), key=lambda t: t.deadline)
+            title = f"📋 **Задачи на {day_word}:**"
+            empty = f"На {day_word} задач нет 🎉"
+            line = lambda t: f"{t.name} — {t.deadline.strftime('%H:%M')}"
+        else:
+            selected = sorted(tasks, key=lambda t: t.deadline)
+            title = "📋 **Ваши текущие задачи:**"
+            empty = "У вас пока нет активных задач."
+            line = lambda t: f"{t.name} — {t.deadline.strftime('%d.%m %H:%M')}"
+
+        if selected:
+            reply = title + "\n\n" + "\n".join(f"{i}. {line(t)}" for i, t in enumerate(selected, 1))
+        else:
+            reply = empty
+
+        return IntentMatch("list", 1.0, cls._payload(reply))
+
+    @classmethod
+    def _match_delete(cls, text: str, now: datetime, tasks: Sequence[Any]) -> Optional[IntentMatch]:
+        match = cls._DELETE_RE.match(text)
+        if not match:
+            return None
+
+        task, confidence = cls._resolve(match.group("name"), tasks)
+        if not task:
+            return None
+
+        return IntentMatch("delete", confidence, cls._payload(
+            f"🗑 Задача «{task.name}» удалена.",
+            deleted=[task.name]
+        ))
+
+    @classmethod
+    def _match_move(cls, text: str, now: datetime, tasks: Sequence[Any]) -> Optional[IntentMatch]:
+        match = cls._MOVE_RE.match(text)
+        if not match:
+            return None
+
+        body = match.group("body")
+        for split in cls._MOVE_SPLIT_RE.finditer(body):
+            day, clock, rest = DateTimeParser.parse(body[split.end():], now.date())
+            if rest or (day is None and clock is None):
+                continue
+
+            task, confidence = cls._resolve(body[:split.start()], tasks)
+            if task:
+                break
+        else:
+            return None
+
+        deadline = datetime.combine(day or task.deadline.date(), task.deadline.time())
+        if clock:
+            deadline = deadline.replace(hour=clock[0], minute=clock[1], second=0, microsecond=0)
+
+        return IntentMatch("move", confidence, cls._payload(
+            f"🕒 Задача «{task.name}» перенесена на {deadline.strftime('%d.%m %H:%M')}.",
+            updated=[TaskChange(task.name, deadline=deadline.strftime(DEADLINE_FORMAT))]
+        ))
+
+    @classmethod
+    def _resolve(cls, name: str, tasks: Sequence[Any]) -> Tuple[Optional[Any], float]:
+
+        """Ищет задачу по названию через индекс названий; неоднозначность — отказ от быстрого пути"""
+
+        match = TaskNameIndex(tasks).resolve(name)
+        return match.task, match.score if match.task else 0.0
+
+    @staticmethod
+    def _payload(reply: str, deleted: Sequence[str] = (), updated: Sequence[TaskChange] = ()) -> TaskDiff:
+        return TaskDiff(reply=reply, deleted=list(deleted), updated=list(updated))
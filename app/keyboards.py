@@ -1,3 +1,5 @@
+from typing import Optional
+
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
@@ -29,4 +31,19 @@ class Keyboards:
     builder.row(InlineKeyboardButton(text="👤 Изменить имя", callback_data="change_name"))
     builder.row(InlineKeyboardButton(text="🕒 Изменить часовой пояс", callback_data="change_tz"))
 
-    return builder.as_markup()
\ No newline at end of file
+    return builder.as_markup()
+
+  @staticmethod
+  def task_pages(prev_data: Optional[str], next_data: Optional[str]) -> Optional[InlineKeyboardMarkup]:
+
+    """Кнопки листания списка задач; без кнопок, если список помещается на одну страницу"""
+
+    buttons = []
+
+    if prev_data:
+      buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=prev_data))
+
+    if next_data:
+      buttons.append(InlineKeyboardButton(text="Далее ➡️", callback_data=next_data))
+
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
@@ -1,48 +1,269 @@
+import os
 import sys
+import copy
+import json
+import time
+import queue
+import atexit
 import logging
-from typing import Optional
-from logging.handlers import RotatingFileHandler
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+from aiogram import BaseMiddleware
+
+class LogContext:
+    """Поля корреляции текущего запроса (update_id, user_id), видимые во всех записях лога"""
+
+    _fields: contextvars.ContextVar = contextvars.ContextVar("log_context", default={})
+
+    @classmethod
+    def get(cls) -> Dict[str, Any]:
+        return cls._fields.get()
+
+    @classmethod
+    @contextmanager
+    def bind(cls, **fields: Any) -> Iterator[None]:
+        token = cls._fields.set({**cls._fields.get(), **{k: v for k, v in fields.items() if v is not None}})
+        try:
+            yield
+        finally:
+            cls._fields.reset(token)
+
+class LogContextMiddleware(BaseMiddleware):
+    """Outer-middleware диспетчера: привязывает update_id и пользователя к логам апдейта"""
+
+    async def __call__(self, handler: Callable[..., Awaitable[Any]], event: Any, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        with LogContext.bind(update_id=getattr(event, "update_id", None), user_id=user.id if user else None):
+            return await handler(event, data)
+
+class ContextFilter(logging.Filter):
+    """Копирует поля LogContext в запись; работает в потоке вызова, до очереди"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.ctx = LogContext.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю rate INFO/DEBUG-записей каждой строки кода; WARNING и выше — всегда"""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+        self._seen: Dict[Tuple[str, int], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+
+        site = (record.pathname, record.lineno)
+        seen = self._seen.get(site, 0) + 1
+        self._seen[site] = seen
+
+        # Детерминированная выборка: первая запись места пишется всегда, далее каждая 1/rate-я
+        return int(seen * self.rate) != int((seen - 1) * self.rate) or seen == 1
+
+class TextFormatter(logging.Formatter):
+    """Обычный текстовый формат; поля корреляции дописываются в конец строки"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        ctx = getattr(record, "ctx", None)
+        if not ctx:
+            return line
+
+        fields = " ".join(f"{key}={value}" for key, value in ctx.items())
+        head, _, tail = line.partition("\n")
+        return f"{head} [{fields}]" + (f"\n{tail}" if tail else "")
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **getattr(record, "ctx", {}),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler, который не блокирует цикл событий: при переполнении очереди
+    INFO/DEBUG-записи отбрасываются, а WARNING и выше пишутся синхронно
+    в конечные обработчики
+    """
+
+    REPORT_INTERVAL = 60.0
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]", fallback: Sequence[logging.Handler] = ()) -> None:
+        super().__init__(log_queue)
+        self.fallback = list(fallback)
+        self.dropped = 0
+        self._reported_at = float("-inf")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+
+        # Сообщение и трейсбек вычисляются здесь: аргументы и exc_info нельзя передавать в другой поток
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+
+        except queue.Full:
+            if record.levelno >= logging.WARNING and self.fallback:
+                self.write_through(record)
+            else:
+                self._drop(record)
+
+    def _drop(self, record: logging.LogRecord) -> None:
+        self.dropped += 1
+        now = time.monotonic()
+
+        # Не чаще раза в REPORT_INTERVAL, мимо очереди: она как раз переполнена
+        if self.fallback and now - self._reported_at >= self.REPORT_INTERVAL:
+            self._reported_at = now
+            self.write_through(logging.makeLogRecord({
+                "name": record.name,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"Log queue is full, {self.dropped} INFO/DEBUG records dropped so far",
+            }))
+
+    def write_through(self, record: logging.LogRecord) -> None:
+
+        # Обработчики общие с потоком QueueListener; от одновременной записи их защищает собственная блокировка
+        for handler in self.fallback:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+class DrainingQueueListener(QueueListener):
+    """
+    QueueListener, остановка которого не падает на полной очереди: маркер конца
+    ставится с ожиданием, пока поток дописывает накопившиеся записи
+    """
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
 
 class LogManager:
     LOG_FORMAT = "%(asctime)s - [%(levelname)s] - %(name)s - %(message)s"
     DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
-    LOG_FILE = "bot.log"
+    # Воркер вебхука пишет в свой файл: ротация одного файла из нескольких процессов обрезает и перемешивает его
+    WORKER_ENV = "LOG_WORKER"
+    WORKER = os.getenv(WORKER_ENV)
+    LOG_FILE = f"bot.worker-{WORKER}.log" if WORKER else "bot.log"
 
     MAX_BYTES = 5 * 1024 * 1024
     BACKUP_COUNT = 5
 
+    LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    JSON = os.getenv("LOG_JSON", "0") == "1"
+    QUEUED = os.getenv("LOG_QUEUE", "1") != "0"
+    QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1"))
+
+    _listeners: List[QueueListener] = []
+    _queue_handlers: List[BoundedQueueHandler] = []
+
     @classmethod
-    def setup_logger(cls, name: str = "TimeM_Bot") -> logging.Logger:
-        
-        """Настраивает и возвращает объект логгера"""
+    def build_handlers(cls, log_file: Optional[str] = None, json_output: Optional[bool] = None) -> List[logging.Handler]:
 
-        logger = logging.getLogger(name)
-        logger.setLevel(logging.INFO)
+        """Конечные обработчики: консоль и файл с ротацией"""
 
-        if logger.hasHandlers():
-            return logger
-        
-        formatter = logging.Formatter(fmt=cls.LOG_FORMAT, datefmt=cls.DATE_FORMAT)
+        use_json = cls.JSON if json_output is None else json_output
+        formatter = JsonFormatter() if use_json else TextFormatter(fmt=cls.LOG_FORMAT, datefmt=cls.DATE_FORMAT)
 
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
 
         file_handler = RotatingFileHandler(
-            cls.LOG_FILE,
+            log_file or cls.LOG_FILE,
             maxBytes=cls.MAX_BYTES,
             backupCount=cls.BACKUP_COUNT,
             encoding="utf-8"
         )
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
 
-        for lib_name in ["aiogram", "apscheduler"]:
-            lib_logger = logging.getLogger(lib_name)
-            lib_logger.addHandler(console_handler)
-            lib_logger.addHandler(file_handler)
-            lib_logger.propagate = False
+        return [console_handler, file_handler]
+
+    @classmethod
+    def setup_logger(
+        cls,
+        name: str = "TimeM_Bot",
+        queued: Optional[bool] = None,
+        log_file: Optional[str] = None,
+        json_output: Optional[bool] = None,
+        libraries: Tuple[str, ...] = ("aiogram", "apscheduler")
+    ) -> logging.Logger:
+
+        """
+        Настраивает и возвращает объект логгера. В режиме очереди вызов логгера
+        только кладет запись в очередь, а запись в консоль и файл (включая
+        ротацию) выполняет фоновый поток QueueListener
+        """
+
+        logger = logging.getLogger(name)
+        logger.setLevel(cls.LEVEL)
+
+        if logger.hasHandlers():
+            return logger
+
+        handlers = cls.build_handlers(log_file, json_output)
+
+        if cls.QUEUED if queued is None else queued:
+            queue_handler = BoundedQueueHandler(queue.Queue(cls.QUEUE_SIZE), fallback=handlers)
+            listener = DrainingQueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+            listener.start()
+            cls._listeners.append(listener)
+            cls._queue_handlers.append(queue_handler)
+            handlers = [queue_handler]
+
+        for handler in handlers:
+            handler.addFilter(ContextFilter())
+            if cls.INFO_SAMPLE_RATE < 1:
+                handler.addFilter(SamplingFilter(cls.INFO_SAMPLE_RATE))
+
+        for target in [logger, *(logging.getLogger(lib_name) for lib_name in libraries)]:
+            for handler in handlers:
+                target.addHandler(handler)
+
+        for lib_name in libraries:
+            logging.getLogger(lib_name).propagate = False
 
         return logger
-    
+
+    @classmethod
+    def dropped(cls) -> int:
+
+        """Сколько записей отброшено из-за переполнения очередей с момента запуска"""
+
+        return sum(handler.dropped for handler in cls._queue_handlers)
+
+    @classmethod
+    def stop(cls) -> None:
+
+        """Дописывает оставшиеся в очереди записи и останавливает фоновые потоки"""
+
+        while cls._listeners:
+            cls._listeners.pop().stop()
+
 logger = LogManager.setup_logger()
+atexit.register(LogManager.stop)
@@ -0,0 +1,103 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+from app.logger import logger
+
+T = TypeVar('T')
+
+class Mailbox(Generic[T]):
+    """Очередь сообщений одного пользователя: один ход за раз, пачки склеиваются"""
+
+    DEBOUNCE = 0.8
+    MAX_WAIT = 3.0
+    MAX_DEPTH = 5
+    PUT_TIMEOUT = 2.0
+    PUT_POLL = 0.1
+    IDLE_TIMEOUT = 60.0
+
+    _boxes: Dict[int, "Mailbox"] = {}
+
+    def __init__(self, key: int, handler: Callable[[List[T]], Awaitable[None]]) -> None:
+        self.key = key
+        self.handler = handler
+        self.queue: "asyncio.Queue[T]" = asyncio.Queue(maxsize=self.MAX_DEPTH)
+        self.worker: Optional["asyncio.Task[None]"] = None
+
+    @classmethod
+    async def submit(cls, key: int, item: T, handler: Callable[[List[T]], Awaitable[None]]) -> bool:
+
+        """
+        Ставит сообщение в очередь пользователя; False — очередь переполнена.
+        Между поиском ящика и постановкой нет await: иначе воркер мог бы за это
+        время завершиться по простою и убрать ящик, и у пользователя оказалось
+        бы два ящика с параллельными ходами
+        """
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + cls.PUT_TIMEOUT
+
+        while True:
+            box = cls._boxes.get(key)
+            if box is None:
+                box = cls._boxes[key] = cls(key, handler)
+
+            if not box.queue.full():
+                box.queue.put_nowait(item)
+
+                if box.worker is None or box.worker.done():
+                    box.worker = asyncio.create_task(box._run())
+                return True
+
+            if loop.time() >= deadline:
+                logger.warning(f"Mailbox {key} is full ({box.queue.qsize()} queued), message rejected")
+                return False
+
+            await asyncio.sleep(cls.PUT_POLL)
+
+    @classmethod
+    def depth(cls, key: int) -> int:
+        box = cls._boxes.get(key)
+        return box.queue.qsize() if box else 0
+
+    @classmethod
+    def total_depth(cls) -> int:
+        return sum(box.queue.qsize() for box in cls._boxes.values())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            try:
+                first = await asyncio.wait_for(self.queue.get(), timeout=self.IDLE_TIMEOUT)
+
+            except asyncio.TimeoutError:
+
+                # Проверка и снятие регистрации без await между ними: submit увидит либо этот ящик, либо пустое место
+                if self.queue.empty():
+                    if self._boxes.get(self.key) is self:
+                        del self._boxes[self.key]
+                    return
+                continue
+
+            batch = [first]
+            hard_deadline = loop.time() + self.MAX_WAIT
+
+            while True:
+                wait = min(self.DEBOUNCE, hard_deadline - loop.time())
+                if wait <= 0:
+                    break
+
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout=wait))
+
+                except asyncio.TimeoutError:
+                    break
+
+            if len(batch) > 1:
+                logger.info(f"Mailbox {self.key}: merged {len(batch)} messages into one turn")
+
+            try:
+                await self.handler(batch)
+
+            except Exception as e:
+                logger.error(f"Mailbox {self.key}: turn failed: {e}", exc_info=True)
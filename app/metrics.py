@@ -0,0 +1,366 @@
+import os
+import time
+import bisect
+import asyncio
+import inspect
+import functools
+import contextvars
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from sqlalchemy import event
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
+
+from app.logger import logger
+
+LabelValues = Tuple[str, ...]
+
+class Metric(ABC):
+    """Базовая метрика с метками; значения хранятся по кортежу значений меток"""
+
+    TYPE = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _format_labels(self, key: LabelValues, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+
+        """Строки значений метрики в текстовом формате Prometheus"""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}", *self.samples()]
+
+class Counter(Metric):
+    """Растущий счетчик; может читаться функцией в момент сбора, если считает другой компонент"""
+
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                return [f"{self.name} {float(self._function())}"]
+
+            except Exception as e:
+                logger.warning(f"Counter {self.name} collection failed: {e}")
+                return []
+
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in self._values.items()]
+
+class Gauge(Metric):
+    """Текущее значение; может вычисляться функцией в момент сбора"""
+
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                return [f"{self.name} {float(self._function())}"]
+
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} collection failed: {e}")
+                return []
+
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in self._values.items()]
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+
+            # Счетчики по корзинам + [сумма, количество]
+            state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[index] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, state in self._values.items():
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._format_labels(key, _le(bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._format_labels(key, _le('+Inf'))} {state[-1]}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {state[-2]}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {state[-1]}")
+        return lines
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _le(bound: Any) -> str:
+    return f'le="{bound}"'
+
+class HandlerMetrics(BaseMiddleware):
+    """Inner-middleware роутера: время и ошибки обработчиков по имени функции"""
+
+    async def __call__(self, handler: Callable[..., Any], event: Any, data: Dict[str, Any]) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await handler(event, data)
+            failed = False
+            return result
+        finally:
+            Metrics.observe_handler(name, started, failed)
+
+class LoopMonitor:
+    """Замер зависаний цикла событий: насколько позже запланированного просыпается sleep(INTERVAL)"""
+
+    INTERVAL = 0.1
+    STALL_WARNING = 0.5
+    KEEP_SAMPLES = 10000
+
+    def __init__(self) -> None:
+        self.samples: Deque[float] = deque(maxlen=self.KEEP_SAMPLES)
+        self.max_lag = 0.0
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> "LoopMonitor":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.INTERVAL
+            await asyncio.sleep(self.INTERVAL)
+            lag = max(0.0, loop.time() - expected)
+
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            Metrics.LOOP_LAG.observe(lag)
+
+            if lag > self.STALL_WARNING:
+                logger.warning(f"Event loop stalled for {lag:.3f}s")
+
+class Metrics:
+    """Метрики бота в формате Prometheus и точки их съема"""
+
+    HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+    LLM_SECONDS = Histogram("llm_request_seconds", "Latency of LLM requests", ["prompt"])
+    LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens by direction", ["prompt", "direction"])
+    LLM_ERRORS = Counter("llm_errors_total", "Failed LLM requests", ["prompt"])
+    LLM_JSON = Counter("llm_json_parse_total", "LLM JSON responses by how they were parsed", ["status"])
+
+    DB_REQUEST_SECONDS = Histogram("db_request_seconds", "Duration of Request methods", ["method"])
+    DB_QUERIES = Counter("db_queries_total", "SQL statements executed", ["method"])
+    DB_QUERY_SECONDS = Counter("db_query_seconds_total", "Time spent in SQL statements", ["method"])
+
+    HANDLER_SECONDS = Histogram("handler_seconds", "Duration of update handlers and chat turns", ["handler"])
+    HANDLER_ERRORS = Counter("handler_errors_total", "Handlers that raised", ["handler"])
+
+    JOB_SECONDS = Histogram("job_seconds", "Scheduler job run time", ["job"])
+    JOB_LAG = Histogram("job_lag_seconds", "Delay between scheduled and actual job start", ["job"])
+    JOB_ERRORS = Counter("job_errors_total", "Scheduler jobs that raised", ["job"])
+
+    SENT = Counter("fanout_items_total", "Background send results", ["job", "result"])
+
+    MAILBOX_DEPTH = Gauge("mailbox_depth", "Messages waiting in user mailboxes")
+    REMINDER_QUEUE = Gauge("reminder_queue_size", "Tasks in the in-memory reminder queue")
+    CONTEXT_CACHE_USERS = Gauge("context_cache_users", "Users in the context cache")
+    WRITER_QUEUE = Gauge("db_writer_queue_depth", "Write transactions waiting for the writer")
+
+    LOG_DROPPED = Counter("log_records_dropped_total", "INFO/DEBUG log records dropped on a full log queue")
+
+    LOOP_LAG = Histogram("event_loop_lag_seconds", "Event loop wake-up delay", buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+
+    _registry: List[Metric] = [
+        LLM_SECONDS, LLM_TOKENS, LLM_ERRORS, LLM_JSON,
+        DB_REQUEST_SECONDS, DB_QUERIES, DB_QUERY_SECONDS,
+        HANDLER_SECONDS, HANDLER_ERRORS,
+        JOB_SECONDS, JOB_LAG, JOB_ERRORS,
+        SENT,
+        MAILBOX_DEPTH, REMINDER_QUEUE, CONTEXT_CACHE_USERS, WRITER_QUEUE,
+        LOG_DROPPED,
+        LOOP_LAG,
+    ]
+
+    _method: contextvars.ContextVar = contextvars.ContextVar("db_method", default="other")
+    _runner: Optional[web.AppRunner] = None
+
+    @classmethod
+    def render(cls) -> str:
+        lines: List[str] = []
+        for metric in cls._registry:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    # --- БАЗА ДАННЫХ ---
+    @classmethod
+    def instrument_requests(cls, target: type) -> type:
+
+        """Оборачивает async-методы класса Request: время метода и метка для учета SQL"""
+
+        for name, attribute in list(vars(target).items()):
+            function = getattr(attribute, "__func__", None)
+            if name.startswith("_") or not isinstance(attribute, staticmethod) or not inspect.iscoroutinefunction(function):
+                continue
+
+            setattr(target, name, staticmethod(cls._timed_method(name, function)))
+
+        return target
+
+    @classmethod
+    def _timed_method(cls, name: str, function: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(function)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            token = cls._method.set(name)
+            started = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                cls.DB_REQUEST_SECONDS.observe(time.perf_counter() - started, method=name)
+                cls._method.reset(token)
+
+        return wrapper
+
+    @classmethod
+    def watch_engine(cls, engine: Any) -> None:
+
+        """Считает SQL-запросы и их время с привязкой к вызвавшему методу Request"""
+
+        # Начало хранится в контексте выполнения: у упавшего запроса after не вызывается,
+        # и общий для соединения стек сдвигал бы замеры всех следующих запросов
+        def before(conn, cursor, statement, parameters, context, executemany) -> None:
+            context._query_started = time.perf_counter()
+
+        def after(conn, cursor, statement, parameters, context, executemany) -> None:
+            elapsed = time.perf_counter() - context._query_started
+            method = cls._method.get()
+            cls.DB_QUERIES.inc(method=method)
+            cls.DB_QUERY_SECONDS.inc(elapsed, method=method)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", before)
+        event.listen(engine.sync_engine, "after_cursor_execute", after)
+
+    # --- ОБРАБОТЧИКИ ---
+    @classmethod
+    def observe_handler(cls, name: str, started: float, failed: bool) -> None:
+        cls.HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name)
+        if failed:
+            cls.HANDLER_ERRORS.inc(handler=name)
+
+    # --- ПЛАНИРОВЩИК ---
+    @classmethod
+    def watch_scheduler(cls, scheduler: Any) -> None:
+
+        """Задержка старта и время выполнения задач APScheduler"""
+
+        started: Dict[str, float] = {}
+
+        def job_name(job_id: str) -> str:
+            job = scheduler.get_job(job_id)
+            return job.name if job else job_id
+
+        def on_event(event: Any) -> None:
+            if event.code == EVENT_JOB_SUBMITTED:
+                started[event.job_id] = time.perf_counter()
+                lag = time.time() - max(run_time.timestamp() for run_time in event.scheduled_run_times)
+                cls.JOB_LAG.observe(max(0.0, lag), job=job_name(event.job_id))
+                return
+
+            name = job_name(event.job_id)
+            if event.job_id in started:
+                cls.JOB_SECONDS.observe(time.perf_counter() - started.pop(event.job_id), job=name)
+            if event.code == EVENT_JOB_ERROR:
+                cls.JOB_ERRORS.inc(job=name)
+
+        scheduler.add_listener(on_event, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+
+    # --- HTTP ---
+    @classmethod
+    async def handle(cls, request: web.Request) -> web.Response:
+        return web.Response(text=cls.render(), content_type="text/plain", charset="utf-8")
+
+    @classmethod
+    async def start_server(cls, port_offset: int = 0) -> None:
+
+        """Поднимает локальный /metrics (METRICS_PORT=0 — выключено)"""
+
+        if not cls.PORT:
+            return
+
+        app = web.Application()
+        app.router.add_get("/metrics", cls.handle)
+
+        cls._runner = web.AppRunner(app, access_log=None)
+        await cls._runner.setup()
+        await web.TCPSite(cls._runner, cls.HOST, cls.PORT + port_offset).start()
+        logger.info(f"Metrics available at http://{cls.HOST}:{cls.PORT + port_offset}/metrics")
+
+    @classmethod
+    async def stop_server(cls) -> None:
+        if cls._runner:
+            await cls._runner.cleanup()
+            cls._runner = None
@@ -0,0 +1,116 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from app.fanout import FanOut, RunStats
+from app.logger import logger
+from app.database.models import Outbox
+from app.database.request import Request as rq
+
+class OutboxDispatcher:
+    """Доставка сохраненных сообщений: повторы с нарастающей паузой, без повторной генерации"""
+
+    BATCH = 200
+    MAX_ATTEMPTS = 8
+    BASE_DELAY = 30.0
+    MAX_DELAY = 3600.0
+
+    # Повторы отметки о доставке; строка в 'sending' не отправится второй раз, даже если они не помогут
+    CONFIRM_ATTEMPTS = 3
+    CONFIRM_DELAY = 1.0
+
+    # Повтор не поможет: бот заблокирован или чата больше нет
+    PERMANENT_ERRORS = (TelegramForbiddenError,)
+    PERMANENT_BAD_REQUESTS = ("chat not found",)
+
+    # Разметку от ИИ Telegram часто не принимает — такое сообщение уходит простым текстом
+    PARSE_ERROR = "can't parse entities"
+
+    _lock = asyncio.Lock()
+
+    @classmethod
+    def backoff(cls, attempts: int) -> float:
+        return min(cls.BASE_DELAY * 2 ** (attempts - 1), cls.MAX_DELAY)
+
+    @classmethod
+    async def deliver(cls, bot: Bot) -> RunStats:
+
+        """Отправляет все созревшие сообщения; параллельные вызовы выполняются по очереди"""
+
+        async with cls._lock:
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            rows = await rq.get_due_outbox(now, cls.BATCH)
+
+            if not rows:
+                return RunStats("outbox")
+
+            async def send(row: Outbox) -> None:
+                if not await rq.claim_outbox(row.id):
+                    return
+
+                try:
+                    await cls._send(bot, row)
+
+                except Exception as e:
+                    await cls._reschedule(row, e)
+                    raise
+
+                await cls._confirm(row)
+
+            return await FanOut.run("outbox", rows, send, label=lambda row: f"outbox {row.id} ({row.kind})")
+
+    @classmethod
+    async def _send(cls, bot: Bot, row: Outbox) -> None:
+        try:
+            await FanOut.send_message(bot, row.chat_id, row.text, parse_mode=ParseMode.MARKDOWN)
+
+        except TelegramBadRequest as e:
+            if cls.PARSE_ERROR not in str(e).lower():
+                raise
+
+            logger.warning(f"Outbox {row.id}: Markdown rejected, sending as plain text")
+            await FanOut.send_message(bot, row.chat_id, row.text, parse_mode=None)
+
+    @classmethod
+    async def _confirm(cls, row: Outbox) -> None:
+
+        """Отмечает доставку; при сбое повторяется только отметка, само сообщение уже ушло"""
+
+        sent_at = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        for attempt in range(1, cls.CONFIRM_ATTEMPTS + 1):
+            try:
+                await rq.mark_outbox_sent(row.id, row.user_id, row.text, sent_at)
+                return
+
+            except Exception as e:
+                if attempt == cls.CONFIRM_ATTEMPTS:
+                    logger.error(f"Outbox {row.id} was delivered but could not be marked sent: {e}")
+                    return
+
+                logger.warning(f"Outbox {row.id}: marking as sent failed ({e}), retry {attempt}/{cls.CONFIRM_ATTEMPTS - 1}")
+                await asyncio.sleep(cls.CONFIRM_DELAY * attempt)
+
+    @classmethod
+    def is_permanent(cls, error: Exception) -> bool:
+        if isinstance(error, cls.PERMANENT_ERRORS):
+            return True
+
+        message = str(error).lower()
+        return isinstance(error, TelegramBadRequest) and any(reason in message for reason in cls.PERMANENT_BAD_REQUESTS)
+
+    @classmethod
+    async def _reschedule(cls, row: Outbox, error: Exception) -> None:
+        attempts = row.attempts + 1
+        failed = cls.is_permanent(error) or attempts >= cls.MAX_ATTEMPTS
+        next_attempt_at = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=cls.backoff(attempts))
+
+        await rq.mark_outbox_retry(row.id, attempts, next_attempt_at, str(error), failed=failed)
+
+        if failed:
+            logger.error(f"Outbox {row.id} for user {row.user_id} dropped after {attempts} attempts: {error}")
+        else:
+            logger.warning(f"Outbox {row.id} for user {row.user_id} will be retried in {cls.backoff(attempts):.0f}s")
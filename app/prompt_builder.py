@@ -0,0 +1,109 @@
+import os
+import re
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+class PromptBuilder:
+    """Сборка промпта чата в пределах бюджета токенов"""
+
+    TOKEN_BUDGET = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "3000"))
+    TASKS_SHARE = 0.6
+    MESSAGE_OVERHEAD = 4
+
+    _TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+    @classmethod
+    def count_tokens(cls, text: str) -> int:
+
+        """Локальная оценка числа токенов (BPE режет кириллицу мельче латиницы)"""
+
+        tokens = 0
+        for piece in cls._TOKEN_RE.findall(text or ""):
+            if piece.isascii():
+                tokens += max(1, math.ceil(len(piece) / 4))
+            else:
+                tokens += max(1, math.ceil(len(piece) / 2.5))
+
+        return tokens
+
+    @staticmethod
+    def rank_tasks(tasks: Sequence[Any], now: datetime) -> List[Any]:
+
+        """Сначала ближайшие предстоящие задачи, затем недавно просроченные"""
+
+        upcoming = sorted((t for t in tasks if t.deadline >= now), key=lambda t: t.deadline)
+        overdue = sorted((t for t in tasks if t.deadline < now), key=lambda t: t.deadline, reverse=True)
+
+        return upcoming + overdue
+
+    @classmethod
+    def build(
+        cls,
+        template: str,
+        time_str: str,
+        now: datetime,
+        prompt: str,
+        tasks: Sequence[Any],
+        history: Sequence[Any],
+        summary: Optional[str] = None,
+        budget: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+
+        """Собирает сообщения: системный промпт, сводка, задачи и свежая история по бюджету"""
+
+        budget = budget or cls.TOKEN_BUDGET
+
+        summary_message = f"Краткое содержание более раннего диалога:\n{summary}" if summary else None
+
+        remaining = budget
+        remaining -= cls.count_tokens(template.format(current_time_str=time_str, tasks_str="")) + cls.MESSAGE_OVERHEAD
+        remaining -= cls.count_tokens(prompt) + cls.MESSAGE_OVERHEAD
+        if summary_message:
+            remaining -= cls.count_tokens(summary_message) + cls.MESSAGE_OVERHEAD
+
+        ranked = cls.rank_tasks(tasks, now)
+        task_lines = [f"- {t.name}" for t in ranked]
+        task_costs = [cls.count_tokens(line) + 1 for line in task_lines]
+
+        shown_tasks = 0
+        tasks_limit = max(0, int(remaining * cls.TASKS_SHARE))
+        spent = 0
+        while shown_tasks < len(task_lines) and spent + task_costs[shown_tasks] <= tasks_limit:
+            spent += task_costs[shown_tasks]
+            shown_tasks += 1
+        remaining -= spent
+
+        kept_history: List[Any] = []
+        for msg in reversed(history):
+            cost = cls.count_tokens(msg.content) + cls.MESSAGE_OVERHEAD
+            if cost > remaining:
+                break
+            kept_history.append(msg)
+            remaining -= cost
+        kept_history.reverse()
+
+        while shown_tasks < len(task_lines) and task_costs[shown_tasks] <= remaining:
+            remaining -= task_costs[shown_tasks]
+            shown_tasks += 1
+
+        if task_lines:
+            tasks_str = "\n".join(task_lines[:shown_tasks])
+            if shown_tasks < len(task_lines):
+                tasks_str += f"\n... и еще {len(task_lines) - shown_tasks} задач с более дальними сроками"
+        else:
+            tasks_str = "Пусто"
+
+        messages = [
+            {"role": "system", "content": template.format(current_time_str=time_str, tasks_str=tasks_str)},
+        ]
+
+        if summary_message:
+            messages.append({"role": "system", "content": summary_message})
+
+        for msg in kept_history:
+            messages.append({"role": msg.role, "content": msg.content})
+
+        messages.append({"role": "user", "content": prompt})
+
+        return messages
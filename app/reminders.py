@@ -0,0 +1,94 @@
+import heapq
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class ReminderQueue:
+    """
+    Очередь напоминаний в памяти, упорядоченная по UTC-дедлайну. В режиме
+    нескольких воркеров источник наступивших дедлайнов — БД, и очередь
+    выключается: иначе pop_due никто не вызывает и она только растет
+    """
+
+    enabled = True
+
+    _heap: List[Tuple[datetime, int]] = []
+    _deadlines: Dict[int, datetime] = {}
+
+    @staticmethod
+    def to_utc(deadline: datetime, tz_offset: int) -> datetime:
+
+        """Переводит локальный дедлайн пользователя в наивное UTC-время"""
+
+        return deadline - timedelta(hours=tz_offset or 0)
+
+    @classmethod
+    def seed(cls, items: Iterable[Tuple[int, Optional[datetime]]]) -> None:
+
+        """Заполняет очередь с нуля парами (id задачи, UTC-дедлайн)"""
+
+        cls._deadlines = {task_id: deadline for task_id, deadline in items if deadline is not None}
+        cls._heap = [(deadline, task_id) for task_id, deadline in cls._deadlines.items()]
+        heapq.heapify(cls._heap)
+
+    @classmethod
+    def push(cls, task_id: int, deadline_utc: Optional[datetime]) -> None:
+
+        """Добавляет задачу или переносит её на новый дедлайн"""
+
+        if not cls.enabled:
+            return
+
+        if deadline_utc is None:
+            cls.discard(task_id)
+            return
+
+        cls._deadlines[task_id] = deadline_utc
+        heapq.heappush(cls._heap, (deadline_utc, task_id))
+        cls._compact()
+
+    @classmethod
+    def discard(cls, task_id: int) -> None:
+
+        """Убирает задачу из очереди (запись в куче удаляется лениво)"""
+
+        if not cls.enabled:
+            return
+
+        cls._deadlines.pop(task_id, None)
+
+    @classmethod
+    def pop_due(cls, now_utc: datetime) -> List[Tuple[int, datetime]]:
+
+        """Извлекает пары (id задачи, UTC-дедлайн) всех задач, дедлайн которых уже наступил"""
+
+        due = []
+
+        while cls._heap and cls._heap[0][0] <= now_utc:
+            deadline, task_id = heapq.heappop(cls._heap)
+
+            if cls._deadlines.get(task_id) != deadline:
+                continue
+
+            del cls._deadlines[task_id]
+            due.append((task_id, deadline))
+
+        return due
+
+    @classmethod
+    def restore(cls, items: Iterable[Tuple[int, datetime]]) -> None:
+
+        """Возвращает в очередь извлеченные pop_due задачи, если их не успели перенести заново"""
+
+        for task_id, deadline_utc in items:
+            if task_id not in cls._deadlines:
+                cls.push(task_id, deadline_utc)
+
+    @classmethod
+    def size(cls) -> int:
+        return len(cls._deadlines)
+
+    @classmethod
+    def _compact(cls) -> None:
+        if len(cls._heap) > 2 * len(cls._deadlines) + 64:
+            cls._heap = [(deadline, task_id) for task_id, deadline in cls._deadlines.items()]
+            heapq.heapify(cls._heap)
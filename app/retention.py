@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import zlib
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Sequence
+
+from app.logger import logger
+from app.database.cache import ContextCache
+from app.database.request import Request as rq
+
+@dataclass
+class RetentionStats:
+    """Итог прохода очистки истории"""
+
+    users: int = 0
+    rows: int = 0
+    batches: int = 0
+    raw_bytes: int = 0
+    archived_bytes: int = 0
+    wall_time: float = 0.0
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return self.raw_bytes - self.archived_bytes
+
+class HistoryRetention:
+    """Перенос старой истории чата в сжатый архив пачками"""
+
+    MAX_PER_USER = int(os.getenv("HISTORY_MAX_PER_USER", "200"))
+    MAX_AGE_DAYS = int(os.getenv("HISTORY_MAX_AGE_DAYS", "90"))
+    BATCH = int(os.getenv("HISTORY_ARCHIVE_BATCH", "500"))
+    BATCH_PAUSE = 0.05
+    COMPRESS_LEVEL = 6
+
+    @staticmethod
+    def pack(rows: Sequence[Any]) -> bytes:
+        data = [
+            [row.id, row.role, row.content, row.timestamp.isoformat() if row.timestamp else None]
+            for row in rows
+        ]
+        return zlib.compress(json.dumps(data, ensure_ascii=False).encode(), HistoryRetention.COMPRESS_LEVEL)
+
+    @staticmethod
+    def unpack(payload: bytes) -> List[Dict[str, Any]]:
+        data = json.loads(zlib.decompress(payload))
+        return [{"id": i, "role": role, "content": content, "timestamp": ts} for i, role, content, ts in data]
+
+    @classmethod
+    async def run(cls) -> RetentionStats:
+
+        """Один проход по всем пользователям; последние сообщения окна чата не трогаются"""
+
+        stats = RetentionStats()
+        started = time.perf_counter()
+        keep = ContextCache.HISTORY_WINDOW
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=cls.MAX_AGE_DAYS)
+
+        for user_id in await rq.get_history_owners(keep):
+            try:
+                moved = await cls._prune_user(user_id, keep, cutoff, stats)
+
+            except Exception as e:
+                logger.error(f"History retention failed for user {user_id}: {e}")
+                continue
+
+            if moved:
+                stats.users += 1
+
+        stats.wall_time = time.perf_counter() - started
+        logger.info(
+            f"History retention: archived {stats.rows} messages of {stats.users} users in {stats.batches} batches, "
+            f"{stats.raw_bytes} -> {stats.archived_bytes} bytes (reclaimed {stats.reclaimed_bytes}), "
+            f"{stats.wall_time:.2f}s"
+        )
+        return stats
+
+    @classmethod
+    async def _prune_user(cls, user_id: int, keep: int, cutoff: datetime, stats: RetentionStats) -> int:
+
+        """
+        Сверх лимита архивируется всё; по возрасту — только то, что старше окна
+        и уже вошло в конспект, чтобы не потерять несжатый контекст
+        """
+
+        cap_id = await rq.get_history_boundary(user_id, cls.MAX_PER_USER)
+        window_id = await rq.get_history_boundary(user_id, keep)
+        age_id = None
+        if window_id is not None:
+            age_id = min(window_id, await rq.get_summary_upto(user_id) + 1)
+
+        moved = 0
+        while True:
+            rows = await rq.get_prunable_history(user_id, cap_id, age_id, cutoff, cls.BATCH)
+            if not rows:
+                return moved
+
+            payload = cls.pack(rows)
+            raw_bytes = sum(len(row.content.encode()) for row in rows)
+            await rq.archive_history(user_id, [row.id for row in rows], payload, raw_bytes)
+
+            moved += len(rows)
+            stats.rows += len(rows)
+            stats.batches += 1
+            stats.raw_bytes += raw_bytes
+            stats.archived_bytes += len(payload)
+
+            await asyncio.sleep(cls.BATCH_PAUSE)
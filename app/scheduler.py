@@ -0,0 +1,84 @@
+from datetime import timezone
+from typing import Any, Callable, Optional, Sequence, Set, Tuple
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from app.logger import logger
+from config import MORNING_REPORT_HOUR, MORNING_REPORT_MINUTE
+
+class DigestBuckets:
+    """Группы пользователей по часовому поясу для утреннего дайджеста"""
+
+    JOB_PREFIX = "morning_digest"
+    MISFIRE_GRACE_TIME = 300
+
+    _scheduler: Optional[AsyncIOScheduler] = None
+    _job: Optional[Callable[..., Any]] = None
+    _job_args: Tuple[Any, ...] = ()
+    _offsets: Set[int] = set()
+
+    @staticmethod
+    def fire_time(tz_offset: int) -> Tuple[int, int]:
+
+        """Время отправки дайджеста по UTC (час, минута) для смещения пользователя"""
+
+        total = (MORNING_REPORT_HOUR - tz_offset) * 60 + MORNING_REPORT_MINUTE
+        return divmod(total % (24 * 60), 60)
+
+    @classmethod
+    def offsets(cls) -> Sequence[int]:
+        return sorted(cls._offsets)
+
+    @classmethod
+    def bind(cls, scheduler: AsyncIOScheduler, job: Callable[..., Any], args: Sequence[Any] = ()) -> None:
+
+        """Привязывает корзины к планировщику и регистрирует уже известные пояса"""
+
+        cls._scheduler = scheduler
+        cls._job = job
+        cls._job_args = tuple(args)
+
+        for tz_offset in sorted(cls._offsets):
+            cls._schedule(tz_offset)
+
+    @classmethod
+    def add(cls, tz_offset: Optional[int]) -> None:
+
+        """Добавляет корзину для часового пояса, если её ещё нет"""
+
+        if tz_offset is None or tz_offset in cls._offsets:
+            return
+
+        cls._offsets.add(tz_offset)
+        cls._schedule(tz_offset)
+
+    @classmethod
+    def remove(cls, tz_offset: int) -> None:
+
+        """Удаляет опустевшую корзину вместе с её задачей в планировщике"""
+
+        cls._offsets.discard(tz_offset)
+
+        if cls._scheduler and cls._scheduler.get_job(cls._job_id(tz_offset)):
+            cls._scheduler.remove_job(cls._job_id(tz_offset))
+            logger.info(f"Digest bucket UTC{tz_offset:+d} removed")
+
+    @classmethod
+    def _job_id(cls, tz_offset: int) -> str:
+        return f"{cls.JOB_PREFIX}_{tz_offset}"
+
+    @classmethod
+    def _schedule(cls, tz_offset: int) -> None:
+        if not cls._scheduler or not cls._job:
+            return
+
+        hour, minute = cls.fire_time(tz_offset)
+        cls._scheduler.add_job(
+            cls._job, 'cron',
+            hour=hour, minute=minute, timezone=timezone.utc,
+            args=[*cls._job_args, tz_offset],
+            id=cls._job_id(tz_offset),
+            replace_existing=True,
+            coalesce=True,
+            misfire_grace_time=cls.MISFIRE_GRACE_TIME
+        )
+        logger.info(f"Digest bucket UTC{tz_offset:+d} scheduled at {hour:02d}:{minute:02d} UTC")
@@ -0,0 +1,126 @@
+import json
+from typing import Optional
+
+from app.ai_json import TaskDiff
+
+class PayloadStream:
+    """Инкрементальный разбор JSON-ответа ИИ: действия отдельно от текста ответа"""
+
+    REPLY_KEY = "reply"
+
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.actions: Optional[TaskDiff] = None
+
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._object_start: Optional[int] = None
+        self._last_key: Optional[str] = None
+        self._reply_start: Optional[int] = None
+        self._await_reply = False
+        self._reply_end: Optional[int] = None
+
+    def feed(self, chunk: str) -> None:
+
+        """Добавляет кусок ответа и продвигает однопроходный сканер"""
+
+        self.buffer += chunk
+        buf = self.buffer
+
+        while self._pos < len(buf):
+            ch = buf[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._close_string(self._pos)
+
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = self._pos + 1
+
+                if self._await_reply:
+                    self._reply_start = self._string_start
+                    self._await_reply = False
+
+            elif self._await_reply and not ch.isspace():
+                self._await_reply = False
+
+            elif ch in "{[":
+                if ch == "{" and self._depth == 0 and self._object_start is None:
+                    self._object_start = self._pos
+                self._depth += 1
+
+            elif ch in "}]":
+                self._depth -= 1
+
+            elif ch == ":" and self._depth == 1 and self._last_key == self.REPLY_KEY:
+                self._take_actions()
+
+            elif ch == ",":
+                self._last_key = None
+
+            self._pos += 1
+
+    @property
+    def reply(self) -> str:
+
+        """Уже полученная часть поля reply (декодированная)"""
+
+        if self._reply_start is None:
+            return ""
+
+        end = self._reply_end if self._reply_end is not None else len(self.buffer)
+        return self._decode_partial(self.buffer[self._reply_start:end])
+
+    def finish(self) -> TaskDiff:
+
+        """Полный разбор ответа после окончания потока"""
+
+        return TaskDiff.parse(self.buffer)
+
+    def _close_string(self, end: int) -> None:
+        if self._depth != 1:
+            return
+
+        if self._reply_start is not None and self._reply_end is None and self._string_start == self._reply_start:
+            self._reply_end = end
+            return
+
+        self._last_key = self.buffer[self._string_start:end]
+
+    def _take_actions(self) -> None:
+
+        """Все поля до ключа reply уже пришли целиком: разбираем их заранее"""
+
+        if self.actions is None and self._object_start is not None:
+            head = self.buffer[self._object_start:self._string_start - 1].rstrip().rstrip(",")
+
+            try:
+                data = json.loads(head + "}", strict=False)
+                self.actions = TaskDiff.from_dict(data) if isinstance(data, dict) and data else None
+
+            except ValueError:
+                self.actions = None
+
+        self._await_reply = True
+        self._last_key = None
+
+    @staticmethod
+    def _decode_partial(raw: str) -> str:
+        for cut in range(0, 6):
+            candidate = raw[:len(raw) - cut] if cut else raw
+            try:
+                return json.loads(f'"{candidate}"')
+
+            except ValueError:
+                continue
+
+        return raw
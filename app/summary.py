@@ -0,0 +1,52 @@
+import asyncio
+from typing import Set
+
+from app.ai import AI as ai
+from app.logger import logger
+from app.database.cache import UserContext
+from app.database.request import Request as rq
+
+class HistoryCompactor:
+    """Инкрементальное сжатие вышедшей из окна истории в конспект пользователя"""
+
+    BATCH = 6
+    MAX_MESSAGES = 30
+    MAX_SUMMARY_CHARS = 2000
+
+    _running: Set[int] = set()
+    _tasks: Set["asyncio.Task[None]"] = set()
+
+    @classmethod
+    def maybe_refresh(cls, ctx: UserContext) -> None:
+
+        """Запускает фоновое обновление, когда из окна выпало достаточно сообщений"""
+
+        if ctx.evicted < cls.BATCH or ctx.user.id in cls._running or not ctx.history:
+            return
+
+        task = asyncio.create_task(cls.refresh(ctx))
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+
+    @classmethod
+    async def refresh(cls, ctx: UserContext) -> None:
+
+        """Дописывает в конспект сообщения между прошлым конспектом и началом окна"""
+
+        user_id = ctx.user.id
+        cls._running.add(user_id)
+
+        try:
+            rows = await rq.get_history_range(user_id, ctx.summary_upto, ctx.history[0].id, limit=cls.MAX_MESSAGES)
+            if not rows:
+                return
+
+            summary = await ai.summarize_history(ctx.summary, rows)
+            await rq.save_summary(user_id, summary[:cls.MAX_SUMMARY_CHARS], rows[-1].id)
+            logger.info(f"History summary for user {user_id} updated with {len(rows)} messages")
+
+        except Exception as e:
+            logger.error(f"Failed to update history summary for user {user_id}: {e}")
+
+        finally:
+            cls._running.discard(user_id)
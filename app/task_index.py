@@ -0,0 +1,145 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence
+
+@dataclass
+class NameMatch:
+    """Результат поиска задачи по названию от ИИ"""
+
+    query: str
+    task: Optional[Any] = None
+    score: float = 0.0
+    candidates: List[Any] = field(default_factory=list)
+
+    @property
+    def ambiguous(self) -> bool:
+
+        """Задача не выбрана, но есть кандидаты, которые пользователь должен подтвердить"""
+
+        return self.task is None and bool(self.candidates)
+
+class TaskNameIndex:
+    """
+    Индекс названий задач одного пользователя: нормализованные ключи
+    (регистр, ё/е, латинские двойники кириллицы, кавычки и знаки) и
+    триграммы для подсказок. Удаление и изменение задач необратимы,
+    поэтому задача выбирается сама только при точном совпадении ключа
+    или когда все слова запроса есть в названии (с точностью до окончаний)
+    и лишних слов немного. Более слабые совпадения — лишь кандидаты,
+    которые пользователь должен подтвердить
+    """
+
+    MAX_EXTRA_WORDS = 2
+    SUGGEST_THRESHOLD = 0.3
+    MAX_SUGGESTIONS = 3
+
+    _HOMOGLYPHS = str.maketrans("aceopxyk", "асеорхук")
+    _CYRILLIC_RE = re.compile(r"[а-я]")
+    _WORD_RE = re.compile(r"\w+")
+
+    def __init__(self, tasks: Sequence[Any]) -> None:
+        self.tasks = tasks
+        self._exact: Dict[str, List[Any]] = {}
+        self._words: List[List[str]] = []
+        self._grams: List[FrozenSet[str]] = []
+
+        for task in tasks:
+            key = self.normalize(task.name)
+            self._exact.setdefault(key, []).append(task)
+            self._words.append(key.split())
+            self._grams.append(self.trigrams(key))
+
+    @classmethod
+    def normalize(cls, name: str) -> str:
+
+        """Ключ сравнения: слова в нижнем регистре без знаков, ё -> е, латиница-двойник -> кириллица"""
+
+        words = cls._WORD_RE.findall((name or "").casefold().replace("ё", "е").replace("_", " "))
+        return " ".join(word.translate(cls._HOMOGLYPHS) if cls._CYRILLIC_RE.search(word) else word for word in words)
+
+    @staticmethod
+    def trigrams(key: str) -> FrozenSet[str]:
+
+        """Триграммы как в pg_trgm: каждое слово дополняется двумя пробелами слева и одним справа"""
+
+        grams = set()
+        for word in key.split():
+            padded = f"  {word} "
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return frozenset(grams)
+
+    def resolve(self, name: str) -> NameMatch:
+        key = self.normalize(name)
+        if not key:
+            return NameMatch(name)
+
+        exact = self._exact.get(key, [])
+        if len(exact) == 1:
+            return NameMatch(name, exact[0], 1.0)
+        if exact:
+            return NameMatch(name, None, 1.0, list(exact))
+
+        query = key.split()
+        covering = [
+            (len(query) / len(words), index) for index, words in enumerate(self._words)
+            if len(words) - len(query) <= self.MAX_EXTRA_WORDS and self._covers(query, words)
+        ]
+
+        if len(covering) == 1:
+            score, index = covering[0]
+            return NameMatch(name, self.tasks[index], score)
+        if covering:
+            return NameMatch(name, None, max(score for score, _ in covering), [self.tasks[index] for _, index in covering])
+
+        grams = self.trigrams(key)
+        scored = sorted(
+            ((self._similarity(grams, task_grams), index) for index, task_grams in enumerate(self._grams)),
+            reverse=True
+        )
+        suggestions = [self.tasks[index] for score, index in scored[:self.MAX_SUGGESTIONS] if score >= self.SUGGEST_THRESHOLD]
+
+        return NameMatch(name, None, scored[0][0] if scored else 0.0, suggestions)
+
+    @classmethod
+    def _covers(cls, query: List[str], words: List[str]) -> bool:
+
+        """Каждому слову запроса нашлось свое слово в названии"""
+
+        free = list(words)
+        for word in query:
+            for position, candidate in enumerate(free):
+                if cls._same_word(word, candidate):
+                    del free[position]
+                    break
+            else:
+                return False
+        return True
+
+    @staticmethod
+    def _same_word(a: str, b: str) -> bool:
+
+        """Одно слово с точностью до окончания: общая основа без последних двух букв более длинного"""
+
+        if a == b:
+            return True
+
+        if min(len(a), len(b)) < 3:
+            return False
+
+        common = 0
+        for x, y in zip(a, b):
+            if x != y:
+                break
+            common += 1
+
+        return common >= max(3, max(len(a), len(b)) - 2)
+
+    @staticmethod
+    def _similarity(query: FrozenSet[str], grams: FrozenSet[str]) -> float:
+
+        """Сходство множеств триграмм; используется только для подсказок"""
+
+        if not query or not grams:
+            return 0.0
+
+        return len(query & grams) / len(query | grams)
@@ -0,0 +1,116 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional, Sequence, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+
+from app.keyboards import Keyboards as kb
+from app.database.cache import TaskPageCache
+from app.database.request import Request as rq
+
+@dataclass(frozen=True)
+class TaskCursor:
+    """
+    Позиция в списке задач для callback-кнопки: направление, номер задачи-якоря
+    в списке и ключ keyset-пагинации (deadline, id) этой задачи
+    """
+
+    direction: str
+    position: int
+    deadline: datetime
+    task_id: int
+
+    PREFIX = "tasks:"
+    NEXT = "n"
+    PREV = "p"
+
+    _DEADLINE_FORMAT = "%Y%m%d%H%M%S%f"
+
+    def pack(self) -> str:
+        return f"{self.PREFIX}{self.direction}:{self.position}:{self.deadline.strftime(self._DEADLINE_FORMAT)}:{self.task_id}"
+
+    @classmethod
+    def unpack(cls, data: str) -> Optional["TaskCursor"]:
+
+        """Курсор из callback_data; испорченные данные означают первую страницу"""
+
+        try:
+            direction, position, deadline, task_id = data[len(cls.PREFIX):].split(":")
+            if direction not in (cls.NEXT, cls.PREV):
+                return None
+            return cls(direction, int(position), datetime.strptime(deadline, cls._DEADLINE_FORMAT), int(task_id))
+
+        except ValueError:
+            return None
+
+class TaskPages:
+    """
+    Постраничный /tasks: из БД читаются только нужные столбцы одной страницы,
+    текст собирается заранее подготовленным форматом, готовые страницы
+    хранятся в TaskPageCache до изменения задач пользователя
+    """
+
+    PAGE_SIZE = int(os.getenv("TASKS_PAGE_SIZE", "20"))
+
+    HEADER = "📋 **Ваши текущие задачи:**\n\n"
+    EMPTY = "У вас пока нет активных задач."
+
+    _line = "{}. {}\n   ⏰ {:%d.%m %H:%M}\n".format
+
+    @classmethod
+    async def page(cls, user_id: int, cursor: Optional[TaskCursor] = None) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+
+        """Текст и кнопки страницы; без курсора — первая страница"""
+
+        # Номера строк зависят от position, поэтому она входит в ключ: устаревшая кнопка не испортит страницу
+        key = None if cursor is None else (cursor.direction, cursor.position, cursor.deadline, cursor.task_id)
+        cached = TaskPageCache.get(user_id, key)
+        if cached is not None:
+            return cached
+
+        epoch = TaskPageCache.epoch()
+        page = await cls._load(user_id, cursor)
+
+        # Якорь мог исчезнуть вместе с соседними задачами: тогда показывается начало списка
+        if page is None:
+            page = await cls._load(user_id, None)
+            key = None
+
+        TaskPageCache.put(user_id, key, page, epoch)
+        return page
+
+    @classmethod
+    async def _load(cls, user_id: int, cursor: Optional[TaskCursor]) -> Optional[Tuple[str, Optional[InlineKeyboardMarkup]]]:
+        limit = cls.PAGE_SIZE + 1
+        anchor = None if cursor is None else (cursor.deadline, cursor.task_id)
+
+        if cursor is not None and cursor.direction == TaskCursor.PREV:
+            rows = await rq.get_task_page(user_id, limit, before=anchor)
+            has_prev, has_next = len(rows) > cls.PAGE_SIZE, True
+            rows = rows[-cls.PAGE_SIZE:]
+            start = max(0, cursor.position - len(rows)) if has_prev else 0
+
+        else:
+            rows = await rq.get_task_page(user_id, limit, after=anchor)
+            has_prev, has_next = cursor is not None, len(rows) > cls.PAGE_SIZE
+            rows = rows[:cls.PAGE_SIZE]
+            start = 0 if cursor is None else cursor.position + 1
+
+        if not rows:
+            return None if cursor is not None else (cls.EMPTY, None)
+
+        return cls.render(rows, start), kb.task_pages(
+            cls._cursor(TaskCursor.PREV, start, rows[0]) if has_prev else None,
+            cls._cursor(TaskCursor.NEXT, start + len(rows) - 1, rows[-1]) if has_next else None,
+        )
+
+    @classmethod
+    def render(cls, rows: Sequence[Any], start: int = 0) -> str:
+        line = cls._line
+        return cls.HEADER + "".join([line(number, name, deadline) for number, (_, name, deadline) in enumerate(rows, start + 1)])
+
+    @staticmethod
+    def _cursor(direction: str, position: int, row: Any) -> str:
+        task_id, _, deadline = row
+        return TaskCursor(direction, position, deadline, task_id).pack()
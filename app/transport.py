@@ -0,0 +1,186 @@
+import os
+import time
+import random
+import asyncio
+import importlib.util
+from typing import Awaitable, Callable, Optional, Tuple, TypeVar
+
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError
+
+from app.logger import logger
+
+T = TypeVar('T')
+
+class CircuitOpenError(RuntimeError):
+    """Провайдер временно отключен предохранителем"""
+
+class CircuitBreaker:
+    """
+    Предохранитель: после серии сбоев отклоняет запросы до истечения паузы,
+    затем пропускает одну пробу, по итогу которой закрывается или снова открывается
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+
+        return "open"
+
+    def before_call(self) -> bool:
+
+        """Пропускает или отклоняет запрос; возвращает True, если запрос стал пробой"""
+
+        state = self.state
+        if state == "open" or (state == "half-open" and self.probing):
+            raise CircuitOpenError("OpenRouter временно недоступен, запрос отклонен без обращения к API")
+
+        self.probing = state == "half-open"
+        return self.probing
+
+    def end_probe(self) -> None:
+        self.probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+
+        if self.state == "half-open" or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit breaker opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
+class Transport:
+    """Настраиваемый HTTP-транспорт для OpenAI-совместимого API"""
+
+    POOL_SIZE = int(os.getenv("AI_POOL_SIZE", "20"))
+    KEEPALIVE_CONNECTIONS = int(os.getenv("AI_KEEPALIVE_CONNECTIONS", "10"))
+    KEEPALIVE_EXPIRY = float(os.getenv("AI_KEEPALIVE_EXPIRY", "30"))
+    HTTP2 = os.getenv("AI_HTTP2", "0") == "1"
+
+    CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", "5"))
+    READ_TIMEOUT = float(os.getenv("AI_READ_TIMEOUT", "30"))
+    DEADLINE = float(os.getenv("AI_DEADLINE", "45"))
+
+    MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 8.0
+    RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+    FAILURE_THRESHOLD = 5
+    RESET_TIMEOUT = 30.0
+
+    breaker = CircuitBreaker(FAILURE_THRESHOLD, RESET_TIMEOUT)
+
+    @classmethod
+    def build_client(cls, base_url: str, api_key: str) -> AsyncOpenAI:
+
+        """Создает клиента с пулом соединений и таймаутами; повторы выполняет call()"""
+
+        http2 = cls.HTTP2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+            http2 = False
+
+        http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=cls.POOL_SIZE,
+                max_keepalive_connections=cls.KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=cls.KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(cls.READ_TIMEOUT, connect=cls.CONNECT_TIMEOUT)
+        )
+
+        return AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=http_client, max_retries=0)
+
+    @classmethod
+    async def call(cls, request: Callable[[], Awaitable[T]], deadline: Optional[float] = None) -> T:
+
+        """
+        Выполняет запрос с повторами с джиттером и предохранителем. Дедлайн общий
+        на все попытки и паузы между ними: каждая попытка получает остаток бюджета,
+        а повтор, который не успевает начаться до его исчерпания, не выполняется
+        """
+
+        probe = cls.breaker.before_call()
+        budget = deadline or cls.DEADLINE
+        started = time.monotonic()
+        attempt = 0
+
+        try:
+            while True:
+                remaining = budget - (time.monotonic() - started)
+
+                try:
+                    result = await asyncio.wait_for(request(), timeout=max(remaining, 0.0))
+
+                except Exception as e:
+                    retryable, retry_after = cls._classify(e)
+
+                    if not retryable:
+                        raise
+
+                    cls.breaker.record_failure()
+                    delay = retry_after if retry_after is not None else cls._backoff(attempt)
+
+                    if attempt >= cls.MAX_RETRIES or cls.breaker.state == "open":
+                        raise
+
+                    if delay >= budget - (time.monotonic() - started):
+                        logger.warning(f"OpenRouter call failed ({e.__class__.__name__}), deadline of {budget:.0f}s exhausted")
+                        raise
+
+                    attempt += 1
+                    logger.warning(f"OpenRouter call failed ({e.__class__.__name__}), retry {attempt}/{cls.MAX_RETRIES} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+                else:
+                    cls.breaker.record_success()
+                    return result
+
+        finally:
+            # Проба, завершившаяся без вердикта (ошибка запроса или отмена), не должна держать предохранитель
+            if probe:
+                cls.breaker.end_probe()
+
+    @classmethod
+    def _backoff(cls, attempt: int) -> float:
+
+        """Экспоненциальная задержка с полным джиттером"""
+
+        return random.uniform(0, min(cls.BACKOFF_MAX, cls.BACKOFF_BASE * 2 ** attempt))
+
+    @classmethod
+    def _classify(cls, error: Exception) -> Tuple[bool, Optional[float]]:
+        if isinstance(error, APIStatusError):
+            if error.status_code not in cls.RETRY_STATUSES:
+                return False, None
+
+            retry_after = error.response.headers.get("retry-after")
+            try:
+                return True, min(float(retry_after), cls.BACKOFF_MAX) if retry_after else None
+
+            except ValueError:
+                return True, None
+
+        if isinstance(error, (APIConnectionError, asyncio.TimeoutError)):
+            return True, None
+
+        return False, None
@@ -0,0 +1,87 @@
+import os
+import signal
+import asyncio
+import multiprocessing
+from typing import Callable, List
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from app.logger import logger, LogManager
+
+class WebhookServer:
+    """Прием обновлений Telegram через вебхук в нескольких процессах-воркерах"""
+
+    BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+    PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+    SECRET = os.getenv("WEBHOOK_SECRET") or None
+    HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WORKERS = int(os.getenv("WEB_WORKERS", "2"))
+
+    @classmethod
+    async def register(cls, bot: Bot) -> None:
+
+        """Сообщает Telegram адрес вебхука (один раз, из родительского процесса)"""
+
+        if not cls.BASE_URL:
+            raise RuntimeError("WEBHOOK_BASE_URL must be set in webhook mode")
+
+        await bot.set_webhook(f"{cls.BASE_URL.rstrip('/')}{cls.PATH}", secret_token=cls.SECRET)
+        logger.info(f"Webhook registered at {cls.BASE_URL.rstrip('/')}{cls.PATH}")
+
+    @classmethod
+    async def serve(cls, dp: Dispatcher, bot: Bot) -> None:
+
+        """Обслуживает вебхук до SIGTERM/SIGINT; порт делится между воркерами через SO_REUSEPORT"""
+
+        app = web.Application()
+        SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=cls.SECRET).register(app, path=cls.PATH)
+        setup_application(app, dp, bot=bot)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, cls.HOST, cls.PORT, reuse_port=cls.WORKERS > 1)
+        await site.start()
+        logger.info(f"Webhook worker {os.getpid()} listening on {cls.HOST}:{cls.PORT}{cls.PATH}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+
+        try:
+            await stop.wait()
+
+        finally:
+            await runner.cleanup()
+
+    @classmethod
+    def spawn(cls, target: Callable[[int], None]) -> None:
+
+        """Запускает WORKERS процессов и ждет их завершения"""
+
+        context = multiprocessing.get_context("spawn")
+        workers: List[multiprocessing.Process] = []
+
+        # Процессы spawn настраивают логгер при импорте, поэтому номер воркера передается через окружение
+        for index in range(cls.WORKERS):
+            os.environ[LogManager.WORKER_ENV] = str(index)
+            process = context.Process(target=target, args=(index,), name=f"webhook-worker-{index}")
+            process.start()
+            workers.append(process)
+
+        os.environ.pop(LogManager.WORKER_ENV, None)
+
+        logger.info(f"Started {len(workers)} webhook workers")
+
+        try:
+            for process in workers:
+                process.join()
+
+        except KeyboardInterrupt:
+            for process in workers:
+                process.terminate()
+            for process in workers:
+                process.join()
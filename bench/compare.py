@@ -0,0 +1,58 @@
+"""Сравнение двух JSON-отчетов bench.load (например, до и после изменения).
+
+Запуск: python -m bench.compare bench/reports/chat-old.json bench/reports/chat-new.json
+"""
+
+import sys
+import json
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+METRICS: List[Tuple[str, str, bool]] = [
+    ("throughput", "ops/sec", True),
+    ("latency.p50", "s", False),
+    ("latency.p95", "s", False),
+    ("latency.p99", "s", False),
+    ("wall_time", "s", False),
+    ("db_queries.total", "queries", False),
+    ("db_queries_per_op", "queries/op", False),
+]
+
+def _get(report: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = report
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]) -> List[str]:
+    lines = [f"{before['scenario']}: {before.get('revision')} -> {after.get('revision')}"]
+
+    for path, unit, higher_is_better in METRICS:
+        old, new = _get(before, path), _get(after, path)
+        if old is None or new is None:
+            continue
+
+        change = (new - old) / old * 100 if old else 0.0
+        better = (change > 0) == higher_is_better
+        mark = "" if abs(change) < 1 else (" (better)" if better else " (worse)")
+        lines.append(f"  {path:<20} {old:>12.4f} -> {new:>12.4f} {unit:<10} {change:+7.1f}%{mark}")
+
+    return lines
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+
+    if before.get("scenario") != after.get("scenario"):
+        sys.exit(f"Reports are for different scenarios: {before.get('scenario')} vs {after.get('scenario')}")
+
+    print("\n".join(compare(before, after)))
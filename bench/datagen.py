@@ -0,0 +1,96 @@
+"""Генератор синтетических пользователей, задач и истории для нагрузочных тестов."""
+
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.database.models import User, Task, MessageHistory
+
+NAMES = ["Анна", "Иван", "Мария", "Олег", "Дарья", "Павел", "Ольга", "Никита"]
+TASKS = ["Позвонить маме", "Сдать отчет", "Купить продукты", "Тренировка", "Встреча с командой", "Оплатить счета"]
+PHRASES = ["Привет", "Напомни завтра про отчет", "Что у меня на сегодня?", "Перенеси тренировку на вечер", "Спасибо!"]
+
+@dataclass
+class Dataset:
+    """Сгенерированные данные: tg_id и смещения часовых поясов пользователей"""
+
+    tg_ids: List[int]
+    timezones: List[int]
+    tasks: int
+    history: int
+
+async def _insert(engine: AsyncEngine, model: Any, rows: List[Dict[str, Any]], chunk: int = 5000) -> None:
+    async with engine.begin() as conn:
+        for start in range(0, len(rows), chunk):
+            await conn.execute(insert(model), rows[start:start + chunk])
+
+async def generate(
+    engine: AsyncEngine,
+    users: int,
+    tasks_per_user: int = 5,
+    history_per_user: int = 10,
+    timezones: Sequence[int] = (3,),
+    due_ratio: float = 0.0,
+    today_ratio: float = 0.5,
+    seed: int = 42,
+) -> Dataset:
+
+    """
+    Заполняет базу. due_ratio — доля задач с уже наступившим дедлайном
+    (очередь напоминаний), today_ratio — доля задач на сегодня (утренний дайджест)
+    """
+
+    rng = random.Random(seed)
+    now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    user_rows = [
+        {"id": i, "tg_id": 10_000_000 + i, "name": rng.choice(NAMES), "timezone": timezones[i % len(timezones)]}
+        for i in range(1, users + 1)
+    ]
+    await _insert(engine, User, user_rows)
+
+    task_rows = []
+    for user in user_rows:
+        local_now = now_utc + timedelta(hours=user["timezone"])
+
+        for _ in range(tasks_per_user):
+            roll = rng.random()
+            if roll < due_ratio:
+                deadline = local_now - timedelta(minutes=rng.randint(1, 120))
+            elif roll < due_ratio + today_ratio:
+                deadline = local_now.replace(hour=rng.randint(9, 22), minute=rng.choice((0, 15, 30, 45)))
+            else:
+                deadline = local_now + timedelta(days=rng.randint(1, 30), hours=rng.randint(0, 23))
+
+            deadline = deadline.replace(second=0, microsecond=0)
+            task_rows.append({
+                "user_id": user["id"],
+                "name": f"{rng.choice(TASKS)} #{rng.randint(1, 999)}",
+                "description": None,
+                "deadline": deadline,
+                "deadline_utc": deadline - timedelta(hours=user["timezone"]),
+                "is_reminded": False,
+            })
+    await _insert(engine, Task, task_rows)
+
+    history_rows = []
+    for user in user_rows:
+        for i in range(history_per_user):
+            history_rows.append({
+                "user_id": user["id"],
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": rng.choice(PHRASES),
+                "timestamp": now_utc - timedelta(minutes=history_per_user - i),
+            })
+    await _insert(engine, MessageHistory, history_rows)
+
+    return Dataset(
+        tg_ids=[user["tg_id"] for user in user_rows],
+        timezones=sorted(set(timezones)),
+        tasks=len(task_rows),
+        history=len(history_rows),
+    )
@@ -0,0 +1,139 @@
+"""Проверка планов запросов Request: каждый запрос с условием должен идти по индексу.
+
+Вызывает методы Request на временной базе SQLite, перехватывает выполненные
+SELECT/UPDATE/DELETE и прогоняет их через EXPLAIN QUERY PLAN. Полный проход
+по таблице (SCAN без индекса) в запросе с WHERE или GROUP BY считается ошибкой.
+Upsert'ы (INSERT ... ON CONFLICT) не проверяются: конфликт всегда ищется по
+первичному или уникальному ключу.
+
+Запуск: python -m bench.explain_indexes
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Tuple
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp.name, 'explain.sqlite3')}"
+
+from sqlalchemy import event
+
+from app.database.models import engine
+from app.database.migrations import async_main
+from app.database.request import Request
+
+Statement = Tuple[str, str, tuple]
+
+def _capture(statements: List[Statement], label: List[str]):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb in ("SELECT", "UPDATE", "DELETE") and not executemany:
+            statements.append((label[0], statement, tuple(parameters or ())))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+async def _seed(users: int, tasks_per_user: int) -> None:
+    today = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    for tg_id in range(1, users + 1):
+        await Request.add_user(tg_id, f"user {tg_id}", tg_id % 5)
+        user = await Request.get_user(tg_id)
+        await Request.apply_ai_changes(
+            user.id, "seed", "ok",
+            added=[
+                {
+                    "name": f"task {i}",
+                    "description": None,
+                    "deadline": (today + timedelta(hours=i)).strftime("%Y-%m-%d %H:%M"),
+                }
+                for i in range(tasks_per_user)
+            ],
+        )
+
+async def _exercise(label: List[str]) -> None:
+    calls = [
+        ("get_user", Request.get_user(7)),
+        ("get_user_id", Request.get_user_id(7)),
+        ("get_users_by_timezone", Request.get_users_by_timezone(2)),
+        ("get_timezones", Request.get_timezones()),
+        ("get_tasks", Request.get_tasks(7)),
+        ("get_task_page", Request.get_task_page(7, 21)),
+        ("get_task_page_after", Request.get_task_page(7, 21, after=(datetime(2000, 1, 1), 121))),
+        ("get_task_page_before", Request.get_task_page(7, 21, before=(datetime(2100, 1, 1), 140))),
+        ("get_tasks_for_day", Request.get_tasks_for_day(7, date.today())),
+        ("get_day_tasks_by_timezone", Request.get_day_tasks_by_timezone(2, date.today())),
+        ("get_digest_drafts_by_timezone", Request.get_digest_drafts_by_timezone(2, date.today())),
+        ("get_digest_sent_user_ids", Request.get_digest_sent_user_ids(2, date.today())),
+        ("mark_digest_sent", Request.mark_digest_sent(7, date.today(), datetime(2100, 1, 1))),
+        ("get_pending_reminders", Request.get_pending_reminders()),
+        ("get_due_reminder_ids", Request.get_due_reminder_ids(datetime(2100, 1, 1))),
+        ("get_reminders_by_ids", Request.get_reminders_by_ids([1, 2, 3])),
+        ("update_task", Request.update_task(7, 124, new_deadline_str="2030-01-01 10:00")),
+        ("delete_task", Request.delete_task(7, 125)),
+        ("enqueue_outbox", Request.enqueue_outbox(5, 5, "reminder", "text", [81, 82], datetime(2100, 1, 1))),
+        ("get_due_outbox", Request.get_due_outbox(datetime(2100, 1, 1), 10)),
+        ("claim_outbox", Request.claim_outbox(1)),
+        ("mark_outbox_sent", Request.mark_outbox_sent(1, 5, "text", datetime(2100, 1, 1))),
+        ("mark_outbox_retry", Request.mark_outbox_retry(1, 1, datetime(2100, 1, 1), "error")),
+        ("get_history", Request.get_history(7)),
+        ("get_history_range", Request.get_history_range(7, 0, 10**9)),
+        ("save_summary", Request.save_summary(7, "summary", 3)),
+        ("get_history_owners", Request.get_history_owners(1)),
+        ("get_history_boundary", Request.get_history_boundary(7, 2)),
+        ("get_prunable_history", Request.get_prunable_history(7, 10**9, 10**9, datetime(2100, 1, 1), 50)),
+        ("set_fsm_state", Request.set_fsm_state("fsm:7", "Reg:name")),
+        ("get_fsm_record", Request.get_fsm_record("fsm:7")),
+        ("acquire_lock", Request.acquire_lock("scheduler", "worker-1", datetime(2100, 1, 1), datetime(2000, 1, 1))),
+        ("release_lock", Request.release_lock("scheduler", "worker-1")),
+        ("update_user_profile", Request.update_user_profile(7, name="renamed", timezone=4)),
+        ("apply_ai_changes", Request.apply_ai_changes(
+            8, "hi", "ok", deleted=[142], updated=[{"task_id": 143, "name": "task two"}]
+        )),
+        ("get_context", Request.get_context(9)),
+        ("fill_missing_deadlines_utc", Request.fill_missing_deadlines_utc()),
+    ]
+
+    for name, call in calls:
+        label[0] = name
+        await call
+
+def _uses_index(plan: List[str]) -> bool:
+    for detail in plan:
+        if detail.startswith("SCAN ") and " USING " not in detail and "CONSTANT ROW" not in detail:
+            return False
+    return True
+
+async def main() -> int:
+    await async_main()
+    await _seed(users=50, tasks_per_user=20)
+
+    statements: List[Statement] = []
+    label = ["seed"]
+    _capture(statements, label)
+    await _exercise(label)
+
+    failures = 0
+    async with engine.connect() as conn:
+        for name, sql, params in statements:
+            rows = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = [row[-1] for row in rows]
+
+            normalized = " ".join(sql.split()).upper()
+            filtered = " WHERE " in normalized or " GROUP BY " in normalized
+            ok = not filtered or _uses_index(plan)
+            failures += not ok
+
+            print(f"[{'ok' if ok else 'FAIL'}] {name}: {' '.join(sql.split())[:110]}")
+            for detail in plan:
+                print(f"         {detail}")
+
+    await engine.dispose()
+
+    print(f"\n{len(statements)} statements, {failures} without an index")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
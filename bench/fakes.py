@@ -0,0 +1,203 @@
+"""Локальные заглушки Telegram Bot API и OpenAI-совместимого API для нагрузочных тестов.
+
+Обе заглушки — настоящие HTTP-серверы на aiohttp: бот и клиент OpenAI ходят
+к ним через обычный сетевой стек, поэтому в замеры попадают сериализация,
+пул соединений, ретраи и лимиты отправки.
+"""
+
+import re
+import json
+import time
+import random
+import asyncio
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+@dataclass
+class Behaviour:
+    """Задержка и доля ошибок заглушки"""
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+
+    async def delay(self) -> None:
+        pause = self.latency + random.uniform(0, self.jitter)
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+    def fails(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+class FakeServer(ABC):
+    """Общий запуск и остановка aiohttp-заглушки на свободном порту"""
+
+    def __init__(self, behaviour: Behaviour) -> None:
+        self.behaviour = behaviour
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.port = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @abstractmethod
+    def routes(self, app: web.Application) -> None:
+
+        """Регистрирует обработчики заглушки в приложении aiohttp"""
+
+    async def start(self) -> "FakeServer":
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        self.routes(app)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": dict(self.calls), "errors": dict(self.errors)}
+
+class FakeTelegram(FakeServer):
+    """Заглушка Bot API: отвечает на методы отправки и запоминает время ответов по чатам"""
+
+    def __init__(self, behaviour: Behaviour) -> None:
+        super().__init__(behaviour)
+        self.message_id = 0
+        self.on_message: Optional[Callable[[int, str, str], None]] = None
+        self.delivered: List[float] = []
+        self.markups: Dict[int, Any] = {}
+
+    def routes(self, app: web.Application) -> None:
+        app.router.add_post("/bot{token}/{method}", self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = dict(await request.post())
+
+        await self.behaviour.delay()
+
+        if self.behaviour.fails():
+            self.errors[method] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1", "parameters": {"retry_after": 1}}
+            )
+
+        if method in ("sendMessage", "editMessageText", "sendSticker"):
+            chat_id = int(params.get("chat_id", 0))
+            text = params.get("text", "")
+            self.delivered.append(time.perf_counter())
+            self.markups[chat_id] = json.loads(params["reply_markup"]) if params.get("reply_markup") else None
+
+            if self.on_message:
+                self.on_message(chat_id, method, text)
+
+            return web.json_response({"ok": True, "result": self._message(chat_id, text, params.get("message_id"))})
+
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}})
+
+        return web.json_response({"ok": True, "result": True})
+
+    def _message(self, chat_id: int, text: str, message_id: Optional[str]) -> Dict[str, Any]:
+        if message_id is None:
+            self.message_id += 1
+
+        return {
+            "message_id": int(message_id) if message_id else self.message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "bench"},
+            "text": text,
+        }
+
+class FakeOpenRouter(FakeServer):
+    """Заглушка /chat/completions: JSON-ответы для чата и пакетных дайджестов, текст для дайджестов и напоминаний"""
+
+    ADD_TASK_RATE = 0.3
+    STREAM_CHUNK = 24
+    BATCH_ENTRIES_RE = re.compile(r'^\[\{"id".*\}\]$', re.MULTILINE)
+
+    def routes(self, app: web.Application) -> None:
+        app.router.add_post("/v1/chat/completions", self.handle)
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        kind = "json" if body.get("response_format", {}).get("type") == "json_object" else "text"
+        entries = self.BATCH_ENTRIES_RE.search(body["messages"][-1]["content"]) if kind == "json" else None
+        if entries:
+            kind = "batch"
+        self.calls[kind] += 1
+
+        await self.behaviour.delay()
+
+        if self.behaviour.fails():
+            self.errors[kind] += 1
+            return web.json_response({"error": {"message": "upstream overloaded"}}, status=503)
+
+        content = self._batch(entries.group(0)) if entries else self._content(kind)
+
+        if body.get("stream"):
+            return await self._stream(request, content)
+
+        return web.json_response({
+            "id": "bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "bench"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def _content(self, kind: str) -> str:
+        if kind == "text":
+            return "Доброе утро! Вот что у тебя запланировано на сегодня. Удачного дня!"
+
+        added = []
+        if random.random() < self.ADD_TASK_RATE:
+            added.append({
+                "name": f"задача {random.randint(1, 10**6)}",
+                "description": "из нагрузочного теста",
+                "deadline": time.strftime("%Y-%m-%d %H:%M", time.gmtime(time.time() + 86400)),
+            })
+
+        payload = {"added_tasks": added, "deleted_tasks": [], "updated_tasks": [], "reply": "Готово, записал."}
+        return json.dumps(payload, ensure_ascii=False)
+
+    def _batch(self, entries: str) -> str:
+        reports = [
+            {"id": entry["id"], "text": f"Доброе утро, {entry['name']}! Сегодня:\n{entry['tasks']}"}
+            for entry in json.loads(entries)
+        ]
+        return json.dumps({"reports": reports}, ensure_ascii=False)
+
+    async def _stream(self, request: web.Request, content: str) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        for start in range(0, len(content), self.STREAM_CHUNK):
+            chunk = {
+                "id": "bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": "bench",
+                "choices": [{"index": 0, "delta": {"content": content[start:start + self.STREAM_CHUNK]}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
@@ -0,0 +1,256 @@
+"""Доля успешно разобранных ответов модели: прежний парсер против app.ai_json.
+
+Корпус bench/corpus/model_outputs.jsonl — ответы модели с ожидаемым числом
+действий. Фаззинг берет чистые ответы корпуса и вносит типичные дефекты
+(ограждения, текст вокруг, висячие запятые, одинарные кавычки, обрыв).
+Ответ считается разобранным, если число добавленных, удаленных и измененных
+задач, наличие смены профиля и непустого reply совпали с ожидаемыми. Для
+фаззинга это не все: каждое полученное действие обязано совпасть с действием
+исходного ответа. Обрыв внутри массивов действий (truncate_actions) может
+потерять недописанные элементы, но не должен превратить их обрывки в действия
+(задача с датой без времени, удаление «Встреча с Ив»). Такие случаи считаются
+небезопасными, и скрипт завершается с кодом 1, если они есть у нового парсера.
+
+Запуск: python -m bench.json_repair --fuzz 2000
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from app.logger import logger
+from app.ai_json import TaskDiff
+
+CORPUS = "bench/corpus/model_outputs.jsonl"
+
+def legacy_parse(text: str) -> Dict[str, Any]:
+
+    """Прежний AI._parse_json: json.loads, затем жадный поиск {.*}"""
+
+    try:
+        return json.loads(text)
+
+    except json.JSONDecodeError:
+        match = re.search(r'(\{.*\})', text, re.DOTALL)
+
+        if match:
+            try:
+                return json.loads(match.group(1))
+
+            except Exception:
+                pass
+
+    return {"added_tasks": [], "deleted_tasks": [], "updated_tasks": [], "reply": text}
+
+def legacy_outcome(text: str) -> Dict[str, Any]:
+    data = legacy_parse(text)
+    profile = data.get("update_profile") or {}
+    return {
+        "added": len(data.get("added_tasks") or []),
+        "deleted": len(data.get("deleted_tasks") or []),
+        "updated": len(data.get("updated_tasks") or []),
+        "profile": bool(profile.get("name") or profile.get("timezone") is not None),
+        "reply": bool(data.get("reply")),
+    }
+
+def legacy_actions(text: str) -> FrozenSet[Tuple[Any, ...]]:
+    data = legacy_parse(text)
+    actions = set()
+
+    for item in data.get("added_tasks") or []:
+        if isinstance(item, dict):
+            actions.add(("added", item.get("name"), item.get("deadline")))
+
+    for item in data.get("deleted_tasks") or []:
+        actions.add(("deleted", item.get("name") if isinstance(item, dict) else item))
+
+    for item in data.get("updated_tasks") or []:
+        if isinstance(item, dict):
+            new_data = item.get("new_data") if isinstance(item.get("new_data"), dict) else {}
+            actions.add(("updated", item.get("old_name"), new_data.get("name"), new_data.get("deadline")))
+
+    profile = data.get("update_profile") if isinstance(data.get("update_profile"), dict) else {}
+    if profile.get("name"):
+        actions.add(("name", profile.get("name")))
+    if profile.get("timezone") is not None:
+        actions.add(("timezone", profile.get("timezone")))
+
+    return frozenset(actions)
+
+def new_actions(text: str) -> FrozenSet[Tuple[Any, ...]]:
+    diff = TaskDiff.parse(text)
+    actions = {("added", task.name, task.deadline) for task in diff.added}
+    actions.update(("deleted", name) for name in diff.deleted)
+    actions.update(("updated", change.old_name, change.name, change.deadline) for change in diff.updated)
+
+    if diff.profile.name:
+        actions.add(("name", diff.profile.name))
+    if diff.profile.timezone is not None:
+        actions.add(("timezone", diff.profile.timezone))
+
+    return frozenset(actions)
+
+def new_outcome(text: str) -> Dict[str, Any]:
+    diff = TaskDiff.parse(text)
+    return {
+        "added": len(diff.added),
+        "deleted": len(diff.deleted),
+        "updated": len(diff.updated),
+        "profile": bool(diff.profile.name or diff.profile.timezone is not None),
+        "reply": bool(diff.reply),
+    }
+
+# --- МУТАЦИИ ДЛЯ ФАЗЗИНГА ---
+def fence(text: str, rng: random.Random) -> str:
+    return f"```{rng.choice(['json', ''])}\n{text}\n```"
+
+def prose(text: str, rng: random.Random) -> str:
+    return f"{rng.choice(['Вот ответ:', 'Конечно! {результат}', 'Готово.'])}\n{text}\n{rng.choice(['', 'Обращайся!', 'P.S. {x}'])}"
+
+def trailing_commas(text: str, rng: random.Random) -> str:
+    return re.sub(r'([}\]"\d])(\s*)([}\]])', lambda m: f"{m.group(1)},{m.group(2)}{m.group(3)}", text)
+
+def single_quotes(text: str, rng: random.Random) -> str:
+    return text.replace("'", "\\'").replace('\\"', "\u0000").replace('"', "'").replace("\u0000", '"')
+
+def python_literals(text: str, rng: random.Random) -> str:
+    return text.replace("null", "None").replace("true", "True").replace("false", "False")
+
+def truncate_reply(text: str, rng: random.Random) -> str:
+    position = text.rfind('"reply"')
+    if position < 0:
+        return text
+    value = text.find('"', position + len('"reply"') + 1)
+    end = text.rfind('"')
+    return text[:rng.randint(value + 2, max(value + 2, end - 1))]
+
+def truncate_actions(text: str, rng: random.Random) -> str:
+
+    """Обрыв внутри массивов действий или профиля, до ключа reply"""
+
+    start = min((text.find(key) for key in ('"added_tasks"', '"deleted_tasks"', '"updated_tasks"') if key in text), default=-1)
+    end = text.find('"reply"')
+    if start < 0 or end <= start:
+        return text
+    return text[:rng.randint(start + 1, end - 1)]
+
+MUTATIONS: Dict[str, Callable[[str, random.Random], str]] = {
+    "fence": fence,
+    "prose": prose,
+    "trailing_commas": trailing_commas,
+    "single_quotes": single_quotes,
+    "python_literals": python_literals,
+    "truncate_reply": truncate_reply,
+    "truncate_actions": truncate_actions,
+}
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+Case = Tuple[str, str, Dict[str, Any], Optional[FrozenSet[Tuple[Any, ...]]]]
+
+def fuzz_cases(corpus: List[Dict[str, Any]], count: int, seed: int) -> List[Case]:
+
+    """Случайные цепочки из 1-3 мутаций поверх чистых ответов корпуса"""
+
+    rng = random.Random(seed)
+    sources = [case for case in corpus if case["case"].startswith("clean")]
+    cases = []
+
+    for _ in range(count):
+        source = rng.choice(sources)
+        names = rng.sample(sorted(MUTATIONS), rng.randint(1, 3))
+        text = source["text"]
+        for name in names:
+            text = MUTATIONS[name](text, rng)
+
+        # После обрыва reply может оказаться пустым — проверяем только действия;
+        # после обрыва в массивах часть действий теряется — проверяется только их безопасность
+        expect = dict(source["expect"], reply=source["expect"]["reply"] and not any(n.startswith("truncate") for n in names))
+        if "truncate_actions" in names:
+            expect = {"reply": False}
+        cases.append(("+".join(sorted(names)), text, expect, new_actions(source["text"])))
+
+    return cases
+
+def matches(outcome: Dict[str, Any], expect: Dict[str, Any]) -> bool:
+    return all(outcome[key] == value for key, value in expect.items() if key != "reply" or value)
+
+def evaluate(cases: List[Case], unsafe: Optional[Counter] = None) -> Dict[str, Dict[str, List[int]]]:
+
+    """Успехи по случаям; действия, которых не было в исходном ответе, считаются в unsafe"""
+
+    results: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: {"legacy": [0, 0], "new": [0, 0]})
+    parsers = (("legacy", legacy_outcome, legacy_actions), ("new", new_outcome, new_actions))
+
+    for name, text, expect, source in cases:
+        for parser, outcome, actions in parsers:
+            ok = matches(outcome(text), expect)
+
+            if source is not None and not actions(text) <= source:
+                ok = False
+                if unsafe is not None:
+                    unsafe[parser] += 1
+
+            row = results[name][parser]
+            row[0] += ok
+            row[1] += 1
+
+    return results
+
+def timing(texts: List[str], repeat: int) -> Dict[str, float]:
+    timings = {}
+    for parser, function in (("legacy", legacy_parse), ("new", TaskDiff.parse)):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for text in texts:
+                function(text)
+        timings[parser] = (time.perf_counter() - started) / (repeat * len(texts)) * 1e6
+    return timings
+
+def print_table(title: str, results: Dict[str, Dict[str, List[int]]]) -> None:
+    print(f"\n{title}")
+    print(f"  {'case':<42} {'legacy':>8} {'new':>8}")
+
+    totals = {"legacy": [0, 0], "new": [0, 0]}
+    for name in sorted(results):
+        row = results[name]
+        for parser in totals:
+            totals[parser][0] += row[parser][0]
+            totals[parser][1] += row[parser][1]
+        print(f"  {name:<42} {row['legacy'][0]:>3}/{row['legacy'][1]:<4} {row['new'][0]:>3}/{row['new'][1]:<4}")
+
+    rates = {parser: ok / total * 100 if total else 0.0 for parser, (ok, total) in totals.items()}
+    print(f"  {'success rate':<42} {rates['legacy']:>7.1f}% {rates['new']:>7.1f}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--fuzz", type=int, default=2000, help="число фаззинг-случаев")
+    parser.add_argument("--repeat", type=int, default=200, help="повторов корпуса для замера времени")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Предупреждения о неразобранных ответах ожидаемы и мешают замеру
+    logger.setLevel("ERROR")
+
+    corpus = load_corpus(args.corpus)
+    print_table("corpus", evaluate([(case["case"], case["text"], case["expect"], None) for case in corpus]))
+
+    unsafe: Counter = Counter()
+    print_table("fuzz", evaluate(fuzz_cases(corpus, args.fuzz, args.seed), unsafe))
+    print(f"\nunsafe actions: legacy {unsafe['legacy']}, new {unsafe['new']}")
+
+    statuses = Counter(TaskDiff.parse(case["text"]).status for case in corpus)
+    print(f"\ncorpus parse status: {dict(statuses)}")
+
+    timings = timing([case["text"] for case in corpus], args.repeat)
+    print(f"time per parse: legacy {timings['legacy']:.1f}us, new {timings['new']:.1f}us")
+
+    sys.exit(1 if unsafe["new"] else 0)
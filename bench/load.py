@@ -0,0 +1,357 @@
+"""Нагрузочные сценарии бота на заглушках Telegram и OpenRouter.
+
+Сценарии:
+  chat       — виртуальные пользователи пишут боту (handle_ai_chat), задержка до ответа
+  digest     — утренний всплеск: daily_morning_notification для одного часового пояса
+               (с --pregenerate тексты заранее готовит DigestDrafts, как в окне до отправки)
+  reminders  — накопившаяся очередь напоминаний: check_reminders с доставкой через outbox
+  tasks      — /tasks и листание страниц кнопками «Далее» до конца списка и обратно
+
+Отчет (задержки p50/p95/p99, пропускная способность, число запросов к БД по
+типам, статистика заглушек) печатается и сохраняется в JSON для сравнения
+версий через python -m bench.compare.
+
+Запуск:
+  python -m bench.load chat --users 200 --turns 5 --llm-latency 0.4
+  python -m bench.load digest --users 5000
+  python -m bench.load reminders --users 20000 --tasks 5 --due-ratio 1
+  python -m bench.load tasks --users 200 --tasks 100 --turns 3
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Sequence
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(_tmp.name, 'load.sqlite3')}")
+os.environ["AI_CACHE_PATH"] = os.path.join(_tmp.name, "ai_cache.json")
+
+from sqlalchemy import event
+from aiogram import Bot
+from aiogram.types import CallbackQuery, Message
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+import run
+from app.ai import AI as ai
+from app.fanout import FanOut
+from app.digests import DigestDrafts
+from app.handlers import cb_tasks_page, cmd_tasks, handle_ai_chat
+from app.outbox import OutboxDispatcher
+from app.reminders import ReminderQueue
+from app.database.cache import TaskPageCache
+from app.database.writer import writer
+from app.database.models import engine
+from app.database.migrations import async_main
+from app.database.request import Request as rq
+
+from bench import datagen
+from bench.fakes import Behaviour, FakeOpenRouter, FakeTelegram
+
+REPORTS_DIR = os.path.join(os.path.dirname(__file__), "reports")
+
+class QueryCounter:
+    """Счетчик SQL-запросов движка по типу (SELECT/INSERT/UPDATE/...)"""
+
+    def __init__(self) -> None:
+        self.counts: Counter = Counter()
+        event.listen(engine.sync_engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.counts[statement.lstrip().split(None, 1)[0].upper()] += 1
+
+    def reset(self) -> None:
+        self.counts.clear()
+
+    def report(self) -> Dict[str, int]:
+        return {**dict(self.counts), "total": sum(self.counts.values())}
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "max": ordered[-1],
+    }
+
+def is_final_reply(method: str, text: str) -> bool:
+
+    """Итоговый ответ хода: не плейсхолдер и не промежуточная правка стрима"""
+
+    return text != "⏳" and not text.endswith("▌")
+
+async def scenario_chat(args: argparse.Namespace, bot: Bot, telegram: FakeTelegram, queries: QueryCounter) -> Dict[str, Any]:
+    dataset = await datagen.generate(engine, args.users, args.tasks, args.history, seed=args.seed)
+    rng = random.Random(args.seed)
+    ai.STREAM_REPLIES = args.stream
+    queries.reset()
+
+    waiting: Dict[int, asyncio.Future] = {}
+
+    def on_message(chat_id: int, method: str, text: str) -> None:
+        future = waiting.get(chat_id)
+        if future and not future.done() and is_final_reply(method, text):
+            future.set_result(time.perf_counter())
+
+    telegram.on_message = on_message
+    latencies: List[float] = []
+    timeouts = 0
+
+    async def virtual_user(index: int, tg_id: int) -> None:
+        nonlocal timeouts
+        await asyncio.sleep(rng.uniform(0, args.ramp))
+
+        for turn in range(args.turns):
+            message = Message.model_validate({
+                "message_id": index * 1000 + turn,
+                "date": int(time.time()),
+                "chat": {"id": tg_id, "type": "private"},
+                "from": {"id": tg_id, "is_bot": False, "first_name": "bench"},
+                "text": rng.choice(datagen.PHRASES),
+            }, context={"bot": bot})
+
+            waiting[tg_id] = asyncio.get_running_loop().create_future()
+            started = time.perf_counter()
+            await handle_ai_chat(message)
+
+            try:
+                latencies.append(await asyncio.wait_for(waiting[tg_id], args.turn_timeout) - started)
+
+            except asyncio.TimeoutError:
+                timeouts += 1
+
+            if args.think_time:
+                await asyncio.sleep(rng.uniform(0, args.think_time))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(i, tg_id) for i, tg_id in enumerate(dataset.tg_ids)))
+    wall_time = time.perf_counter() - started
+
+    return {
+        "wall_time": wall_time,
+        "throughput": len(latencies) / wall_time,
+        "latency": percentiles(latencies),
+        "timeouts": timeouts,
+    }
+
+async def scenario_digest(args: argparse.Namespace, bot: Bot, telegram: FakeTelegram, queries: QueryCounter) -> Dict[str, Any]:
+    tz_offset = 3
+    await datagen.generate(engine, args.users, args.tasks, args.history, timezones=[tz_offset], seed=args.seed)
+
+    pregenerate_time = 0.0
+    if args.pregenerate:
+        local_date = (datetime.now(timezone.utc) + timedelta(hours=tz_offset)).date()
+        pregenerate_started = time.perf_counter()
+        await DigestDrafts.prepare_bucket(tz_offset, local_date)
+        pregenerate_time = time.perf_counter() - pregenerate_started
+
+    queries.reset()
+
+    started = time.perf_counter()
+    await run.daily_morning_notification(bot, tz_offset)
+    wall_time = time.perf_counter() - started
+
+    latencies = [t - started for t in telegram.delivered if t >= started]
+    return {
+        "wall_time": wall_time,
+        "throughput": len(latencies) / wall_time,
+        "latency": percentiles(latencies),
+        "pregenerate_time": pregenerate_time,
+    }
+
+async def scenario_reminders(args: argparse.Namespace, bot: Bot, telegram: FakeTelegram, queries: QueryCounter) -> Dict[str, Any]:
+    dataset = await datagen.generate(
+        engine, args.users, args.tasks, args.history, timezones=[0, 3, 5], due_ratio=args.due_ratio, seed=args.seed
+    )
+    queries.reset()
+
+    seed_started = time.perf_counter()
+    ReminderQueue.seed(await rq.get_pending_reminders())
+    seed_time = time.perf_counter() - seed_started
+
+    started = time.perf_counter()
+    await run.check_reminders(bot)
+
+    # Остаток outbox сверх одной пачки в боте дошлет периодическая задача
+    while True:
+        stats = await OutboxDispatcher.deliver(bot)
+        if not stats.sent and not stats.failed:
+            break
+    wall_time = time.perf_counter() - started
+
+    latencies = [t - started for t in telegram.delivered if t >= started]
+    return {
+        "wall_time": wall_time,
+        "throughput": len(latencies) / wall_time,
+        "latency": percentiles(latencies),
+        "tasks": dataset.tasks,
+        "queue_seed_time": seed_time,
+    }
+
+async def scenario_tasks(args: argparse.Namespace, bot: Bot, telegram: FakeTelegram, queries: QueryCounter) -> Dict[str, Any]:
+    dataset = await datagen.generate(engine, args.users, args.tasks, args.history, seed=args.seed)
+    rng = random.Random(args.seed)
+    queries.reset()
+
+    latencies: List[float] = []
+
+    def button(tg_id: int, prefix: str) -> Any:
+        markup = telegram.markups.get(tg_id)
+        buttons = markup["inline_keyboard"][0] if markup else []
+        return next((item["callback_data"] for item in buttons if item["callback_data"].startswith(prefix)), None)
+
+    async def timed(call: Any) -> None:
+        started = time.perf_counter()
+        await call
+        latencies.append(time.perf_counter() - started)
+
+    async def virtual_user(index: int, tg_id: int) -> None:
+        await asyncio.sleep(rng.uniform(0, args.ramp))
+        chat = {"id": tg_id, "type": "private"}
+        sender = {"id": tg_id, "is_bot": False, "first_name": "bench"}
+
+        for turn in range(args.turns):
+            message = Message.model_validate({
+                "message_id": index * 1000 + turn, "date": int(time.time()), "chat": chat, "from": sender, "text": "/tasks",
+            }, context={"bot": bot})
+            await timed(cmd_tasks(message))
+
+            # Вперед до последней страницы, затем обратно к первой
+            for prefix in ("tasks:n", "tasks:p"):
+                while data := button(tg_id, prefix):
+                    callback = CallbackQuery.model_validate({
+                        "id": f"{tg_id}-{turn}", "chat_instance": str(tg_id), "from": sender, "data": data,
+                        "message": {"message_id": message.message_id, "date": int(time.time()), "chat": chat, "text": "..."},
+                    }, context={"bot": bot})
+                    await timed(cb_tasks_page(callback))
+
+            if args.think_time:
+                await asyncio.sleep(rng.uniform(0, args.think_time))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(i, tg_id) for i, tg_id in enumerate(dataset.tg_ids)))
+    wall_time = time.perf_counter() - started
+
+    return {
+        "wall_time": wall_time,
+        "throughput": len(latencies) / wall_time,
+        "latency": percentiles(latencies),
+        "page_cache": {"hits": TaskPageCache.hits, "misses": TaskPageCache.misses},
+    }
+
+SCENARIOS = {
+    "chat": scenario_chat,
+    "digest": scenario_digest,
+    "reminders": scenario_reminders,
+    "tasks": scenario_tasks,
+}
+
+def revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    random.seed(args.seed)
+
+    telegram = await FakeTelegram(Behaviour(args.tg_latency, args.tg_jitter, args.tg_error_rate)).start()
+    openrouter = await FakeOpenRouter(Behaviour(args.llm_latency, args.llm_jitter, args.llm_error_rate)).start()
+
+    ai.BASE_URL = f"{openrouter.url}/v1"
+    FanOut.configure(global_rate=args.global_rate, per_chat_rate=args.chat_rate)
+
+    await async_main()
+    if engine.dialect.name == "sqlite":
+        writer.start()
+
+    bot = Bot(token="123456:bench", session=AiohttpSession(api=TelegramAPIServer.from_base(telegram.url)))
+    queries = QueryCounter()
+
+    try:
+        result = await SCENARIOS[args.scenario](args, bot, telegram, queries)
+        db_queries = queries.report()
+
+    finally:
+        await bot.session.close()
+        await ai.close()
+        await writer.stop()
+        await engine.dispose()
+        await telegram.stop()
+        await openrouter.stop()
+
+    params = {key: value for key, value in vars(args).items() if key not in ("scenario", "out")}
+    report = {
+        "scenario": args.scenario,
+        "revision": revision(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "params": params,
+        **result,
+        "db_queries": db_queries,
+        "db_queries_per_op": db_queries["total"] / max(1, result["latency"].get("count", 0)),
+        "telegram": telegram.stats(),
+        "llm": openrouter.stats(),
+        "ai_cache": ai.cache_stats(),
+    }
+    return report
+
+def parse_args(argv: Sequence[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=5, help="задач на пользователя")
+    parser.add_argument("--history", type=int, default=10, help="сообщений истории на пользователя")
+    parser.add_argument("--turns", type=int, default=5, help="chat: ходов на пользователя")
+    parser.add_argument("--ramp", type=float, default=1.0, help="chat: разброс старта пользователей, с")
+    parser.add_argument("--think-time", type=float, default=0.0, help="chat: пауза между ходами, с")
+    parser.add_argument("--turn-timeout", type=float, default=60.0)
+    parser.add_argument("--stream", action="store_true", help="chat: потоковые ответы")
+    parser.add_argument("--pregenerate", action="store_true", help="digest: заранее сгенерировать заготовки")
+    parser.add_argument("--due-ratio", type=float, default=1.0, help="reminders: доля просроченных задач")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--tg-latency", type=float, default=0.02)
+    parser.add_argument("--tg-jitter", type=float, default=0.01)
+    parser.add_argument("--tg-error-rate", type=float, default=0.0)
+    parser.add_argument("--global-rate", type=float, default=1000.0, help="лимит отправки FanOut (реальный Telegram ~30/с)")
+    parser.add_argument("--chat-rate", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="путь JSON-отчета (по умолчанию bench/reports/<scenario>-<время>.json)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    report = asyncio.run(main(args))
+
+    out = args.out or os.path.join(REPORTS_DIR, f"{args.scenario}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    latency = report["latency"]
+    print(
+        f"{args.scenario}: {latency.get('count', 0)} ops in {report['wall_time']:.2f}s -> {report['throughput']:.1f} ops/sec | "
+        f"p50 {latency.get('p50', 0) * 1000:.0f}ms p95 {latency.get('p95', 0) * 1000:.0f}ms p99 {latency.get('p99', 0) * 1000:.0f}ms | "
+        f"{report['db_queries']['total']} queries ({report['db_queries_per_op']:.1f}/op)"
+    )
+    print(f"report: {out}")
@@ -0,0 +1,84 @@
+"""Зависания цикла событий при интенсивном логировании: прямые обработчики против очереди.
+
+Корутины пишут в лог в плотном цикле, LoopMonitor замеряет задержку пробуждения
+цикла. Для каждого режима печатаются p50/p99/max задержки и число записей в секунду.
+
+Запуск: python -m bench.logging_stall --writers 50 --records 2000
+"""
+
+import os
+import time
+import asyncio
+import contextlib
+import argparse
+import tempfile
+from typing import Any, Dict
+from logging.handlers import RotatingFileHandler
+
+from app.logger import LogManager
+from app.metrics import LoopMonitor
+
+DEVNULL = open(os.devnull, "w")
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] if ordered else 0.0
+
+async def run_mode(queued: bool, args: argparse.Namespace, directory: str) -> Dict[str, Any]:
+    mode = "queue" if queued else "direct"
+
+    # Консольный обработчик берет sys.stdout при создании — направляем его в /dev/null
+    with contextlib.redirect_stdout(DEVNULL):
+        logger = LogManager.setup_logger(
+            f"bench.{mode}", queued=queued, log_file=os.path.join(directory, f"{mode}.log"), json_output=args.json, libraries=()
+        )
+
+    # Частая ротация, чтобы в замер попала и она
+    for handler in [*logger.handlers, *(h for listener in LogManager._listeners for h in listener.handlers)]:
+        if isinstance(handler, RotatingFileHandler):
+            handler.maxBytes = args.rotate_bytes
+
+    monitor = LoopMonitor()
+    monitor.INTERVAL = 0.01
+    monitor.start()
+
+    async def writer(index: int) -> None:
+        for i in range(args.records):
+            logger.info(f"writer {index} record {i}: user {index * 7919 % 100000} processed in {i % 97} ms")
+            if i % args.yield_every == 0:
+                await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(i) for i in range(args.writers)))
+    wall_time = time.perf_counter() - started
+    await monitor.stop()
+
+    samples = list(monitor.samples)
+    return {
+        "mode": mode,
+        "dropped": sum(getattr(handler, "dropped", 0) for handler in logger.handlers),
+        "records_per_sec": args.writers * args.records / wall_time,
+        "p50": percentile(samples, 50),
+        "p99": percentile(samples, 99),
+        "max": monitor.max_lag,
+    }
+
+async def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        for queued in (False, True):
+            result = await run_mode(queued, args, directory)
+            print(
+                f"{result['mode']:<6} {result['records_per_sec']:>10.0f} records/sec | loop lag "
+                f"p50 {result['p50'] * 1000:.1f}ms p99 {result['p99'] * 1000:.1f}ms max {result['max'] * 1000:.1f}ms | "
+                f"dropped {result['dropped']}"
+            )
+        LogManager.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=50)
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--yield-every", type=int, default=10, help="отдавать управление циклу каждые N записей")
+    parser.add_argument("--rotate-bytes", type=int, default=1024 * 1024)
+    parser.add_argument("--json", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,94 @@
+"""Сравнение пропускной способности записи SQLite до и после тюнинга.
+
+Запуск: python -m bench.sqlite_commits --writes 2000 --concurrency 50
+"""
+
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+from typing import Callable, Dict
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database.writer import Writer
+from app.database.sqlite import SQLiteTuning
+from app.database.models import Base, User, MessageHistory
+
+async def _prepare(url: str) -> None:
+    engine = create_async_engine(url)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with async_sessionmaker(engine)() as session:
+        session.add(User(id=1, tg_id=1, name="bench", timezone=0))
+        await session.commit()
+
+    await engine.dispose()
+
+async def _run(url: str, tuned: bool, writes: int, concurrency: int) -> Dict[str, float]:
+    await _prepare(url)
+
+    engine = create_async_engine(url)
+    if tuned:
+        SQLiteTuning.install(engine)
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    writer = Writer(session_factory)
+    if tuned:
+        writer.start()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def write(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            try:
+                async with writer.transaction() as session:
+                    session.add(MessageHistory(user_id=1, role="user", content=f"message {i}"))
+
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(write(i) for i in range(writes)))
+    elapsed = time.perf_counter() - started
+
+    await writer.stop()
+    await engine.dispose()
+
+    return {
+        "writes": writes - errors,
+        "errors": errors,
+        "seconds": elapsed,
+        "writes_per_sec": (writes - errors) / elapsed,
+        "commits": writer.batches if tuned else writes - errors,
+    }
+
+async def main(writes: int, concurrency: int) -> None:
+    results = {}
+
+    for label, tuned in (("before", False), ("after", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.sqlite3')}"
+            results[label] = await _run(url, tuned, writes, concurrency)
+
+    for label, r in results.items():
+        print(
+            f"{label:>6}: {r['writes']:.0f} writes in {r['seconds']:.2f}s -> "
+            f"{r['writes_per_sec']:.0f} writes/sec, {r['commits']:.0f} commits, {r['errors']:.0f} errors"
+        )
+
+    speedup = results["after"]["writes_per_sec"] / results["before"]["writes_per_sec"]
+    print(f"speedup: x{speedup:.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.writes, args.concurrency))
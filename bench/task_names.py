@@ -0,0 +1,71 @@
+"""Проверка разрешения названий задач от ИИ (app.task_index.TaskNameIndex).
+
+Удаление и изменение задач идут по id, поэтому уверенное совпадение с чужой
+задачей необратимо портит данные. Каждый случай задает список задач, название
+из ответа модели и ожидаемый итог: выбранная задача, кандидаты для
+подтверждения или ничего. Похожие названия-соседи («Позвонить папе» при
+задаче «Позвонить маме») не должны выбираться сами.
+
+Запуск: python -m bench.task_names (код возврата 1, если хоть один случай не прошел)
+"""
+
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+from typing import List, Optional, Sequence, Tuple
+
+from app.task_index import TaskNameIndex
+
+SIBLINGS = ["Купить молоко", "Позвонить маме", "Встреча с Иваном"]
+WORKOUTS = ["Тренировка", "Тренировка в зале", "Сдать отчёт"]
+CALLS = ["Позвонить маме", "Позвонить папе"]
+
+# (задачи, название от ИИ, выбранная задача, кандидаты)
+CASES: List[Tuple[Sequence[str], str, Optional[str], Sequence[str]]] = [
+    # Соседи с одним общим словом — только подсказка
+    (SIBLINGS, "Позвонить папе", None, ["Позвонить маме"]),
+    (SIBLINGS, "Купить хлеб", None, ["Купить молоко"]),
+    (SIBLINGS, "Встреча с Петей", None, ["Встреча с Иваном"]),
+    (SIBLINGS, "Сходить в спортзал", None, []),
+
+    # Точный ключ и варианты написания
+    (SIBLINGS, "купить молоко", "Купить молоко", []),
+    (SIBLINGS, "«Купить молоко»!", "Купить молоко", []),
+    (WORKOUTS, "Сдать oтчет", "Сдать отчёт", []),
+
+    # Все слова запроса есть в названии (с точностью до окончаний)
+    (SIBLINGS, "молоко", "Купить молоко", []),
+    (SIBLINGS, "купить молока", "Купить молоко", []),
+    (SIBLINGS, "встречу с Иваном", "Встреча с Иваном", []),
+    (SIBLINGS, "позвонить", "Позвонить маме", []),
+
+    # Несколько задач подходят одинаково — выбор за пользователем
+    (WORKOUTS, "тренировку", None, ["Тренировка", "Тренировка в зале"]),
+    (CALLS, "Позвонить", None, ["Позвонить маме", "Позвонить папе"]),
+    (CALLS, "Позвонить брату", None, ["Позвонить маме", "Позвонить папе"]),
+    (["Встреча", "Встреча"], "встреча", None, ["Встреча", "Встреча"]),
+
+    # Слишком много лишних слов в названии
+    (["Купить молоко и хлеб в магазине у дома"], "молоко", None, []),
+]
+
+def run_case(names: Sequence[str], query: str) -> Tuple[Optional[str], List[str]]:
+    tasks = [SimpleNamespace(id=i, name=name, deadline=datetime(2030, 1, 1)) for i, name in enumerate(names)]
+    match = TaskNameIndex(tasks).resolve(query)
+    return (match.task.name if match.task else None), [task.name for task in match.candidates]
+
+def main() -> int:
+    failed = 0
+
+    for names, query, task, candidates in CASES:
+        got_task, got_candidates = run_case(names, query)
+        ok = got_task == task and (got_task is not None or sorted(got_candidates) == sorted(candidates))
+        failed += not ok
+
+        print(f"[{'ok' if ok else 'FAIL'}] {query!r} -> {got_task!r} {got_candidates}" + ("" if ok else f" (expected {task!r} {list(candidates)})"))
+
+    print(f"\n{len(CASES)} cases, {failed} failed")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import os
 import asyncio
 from typing import List, Dict
 from aiogram import Dispatcher, Bot
@@ -7,88 +8,195 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from config import TOKEN
 from app.ai import AI as ai
-from app.logger import logger
+from app.ai_cache import ResponseCache
+from app.logger import logger, LogManager, LogContextMiddleware
 from app.handlers import router
+from app.cluster import Cluster, LeaderElection
+from app.webhook import WebhookServer
+from app.scheduler import DigestBuckets
+from app.digests import DigestDrafts
+from app.fanout import FanOut
+from app.mailbox import Mailbox
+from app.metrics import Metrics, LoopMonitor
+from app.outbox import OutboxDispatcher
+from app.reminders import ReminderQueue
+from app.retention import HistoryRetention
 from app.database.request import Request as rq
-from app.database.models import async_main, engine, User, Task
+from app.database.cache import ContextCache
+from app.database.writer import writer
+from app.database.migrations import async_main
+from app.database.models import engine, User, Task
 
-from config import MORNING_REPORT_HOUR, MORNING_REPORT_MINUTE
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+loop_monitor = LoopMonitor()
 
-async def daily_morning_notification(bot: Bot) -> None:
+
+async def daily_morning_notification(bot: Bot, tz_offset: int) -> None:
     
-    """Фоновая задача: отправка утреннего дайджеста задач в 9:00 по времени пользователя"""
+    """
+    Фоновая задача: отправка утреннего дайджеста пользователям одного часового пояса.
+    Получившие дайджест за этот день пропускаются: запуск мог повториться после
+    смены лидера или перезапуска в пределах допуска на пропуск запуска
+    """
+
+    users: List[User] = await rq.get_users_by_timezone(tz_offset)
+
+    if not users:
+        DigestBuckets.remove(tz_offset)
+        return
 
-    users: List[User] = await rq.get_all_users()
+    now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+    local_date = (now_utc + timedelta(hours=tz_offset)).date()
 
-    for user in users:
-        user_now = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=user.timezone)
+    sent = await rq.get_digest_sent_user_ids(tz_offset, local_date)
+    if sent:
+        logger.info(f"Digest UTC{tz_offset:+d} for {local_date}: {len(sent)} users already received it")
+        users = [user for user in users if user.id not in sent]
+        if not users:
+            return
 
-        if user_now.hour == MORNING_REPORT_HOUR and user_now.minute == MORNING_REPORT_MINUTE:
-            try:
-                tasks = await rq.get_tasks_for_day(user.id, user_now.date())
-                report = await ai.generate_morning_report(user.name, tasks)
+    reports = await DigestDrafts.reports_for(tz_offset, users, local_date)
 
-                await bot.send_message(user.tg_id, report, parse_mode=ParseMode.MARKDOWN)
-                logger.info(f"Morning report sent to user {user.id}")
+    async def send_report(user: User) -> None:
+        report = reports.get(user.id)
+        if report is None:
+            raise RuntimeError("morning report was not generated")
 
-            except Exception as e:
-                logger.error(f"Failed to send morning report to user {user.id}: {e}")
+        await FanOut.send_message(bot, user.tg_id, report, parse_mode=ParseMode.MARKDOWN)
+        await rq.mark_digest_sent(user.id, local_date, now_utc)
+        logger.info(f"Morning report sent to user {user.id}")
+
+    await FanOut.run(f"morning_digest UTC{tz_offset:+d}", users, send_report, label=lambda u: f"user {u.id}")
 
 async def check_reminders(bot: Bot) -> None:
     
-    """Фоновая задача: проверка дедлайнов и отправка групповых напоминаний черех ИИ"""
+    """Фоновая задача: генерация групповых напоминаний по наступившим дедлайнам и постановка в outbox"""
+
+    now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    # Задачи могли создать другие воркеры, поэтому в общем режиме источник — БД
+    if Cluster.shared:
+        due = []
+        due_ids = await rq.get_due_reminder_ids(now_utc)
+    else:
+        due = ReminderQueue.pop_due(now_utc)
+        due_ids = [task_id for task_id, _ in due]
 
-    reminders = await rq.get_pending_reminders()
-    if not reminders:
+    if not due_ids:
         return
-    
+
+    try:
+        reminders = await rq.get_reminders_by_ids(due_ids)
+
+    except Exception:
+
+        # Извлеченные из очереди задачи иначе пропали бы до перезапуска
+        ReminderQueue.restore(due)
+        raise
+
     user_task_map: Dict[int, List[Task]] = {}
     user_obj_map: Dict[int, User] = {}
 
     for task, user in reminders:
-        user_now = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=user.timezone)
-
-        if user_now >= task.deadline:
-            if user.id not in user_task_map:
-                user_task_map[user.id] = []
-                user_obj_map[user.id] = user
-            
-            user_task_map[user.id].append(task)
+        if user.id not in user_task_map:
+            user_task_map[user.id] = []
+            user_obj_map[user.id] = user
+        
+        user_task_map[user.id].append(task)
 
-    for user_id, tasks in user_task_map.items():
-        user = user_obj_map[user.id]
+    async def send_reminder(user_id: int) -> None:
+        user = user_obj_map[user_id]
+        tasks = user_task_map[user_id]
 
         task_summary = "\n".join([f"- {t.name}" + (f" ({t.description})" if t.description else "") for t in tasks])
 
         try:
             reminder_text = await ai.generate_ai_reminder_text(user.name, task_summary)
+            await rq.enqueue_outbox(user.id, user.tg_id, 'reminder', reminder_text, [t.id for t in tasks], now_utc)
+            logger.info(f"Queued {len(tasks)} reminders for user {user_id}")
 
-            await bot.send_message(user.tg_id, reminder_text, parse_mode=ParseMode.MARKDOWN)
+        except Exception:
 
-            await rq.add_history(user.id, 'assistant', reminder_text)
-            for task in tasks:
-                await rq.mark_as_reminded(task.id)
+            # В общем режиме задачи останутся невыполненными в БД и попадут в следующий запуск
+            if not Cluster.shared:
+                for task in tasks:
+                    ReminderQueue.push(task.id, task.deadline_utc)
+            raise
 
-            logger.info(f"Sent {len(tasks)} reminders to user {user_id}")
+    await FanOut.run("reminders", list(user_task_map), send_reminder, label=lambda uid: f"user {uid}")
+    await OutboxDispatcher.deliver(bot)
 
-        except Exception as e:
-            logger.error(f"Error sending grouped reminders to user {user_id}: {e}")
+async def sync_digest_buckets() -> None:
+
+    """Фоновая задача: подхватывает часовые пояса пользователей, зарегистрированных другими воркерами"""
+
+    for tz_offset in await rq.get_timezones():
+        DigestBuckets.add(tz_offset)
+
+def build_scheduler(bot: Bot) -> AsyncIOScheduler:
+    scheduler = AsyncIOScheduler()
+
+    DigestBuckets.bind(scheduler, daily_morning_notification, args=[bot])
+    scheduler.add_job(check_reminders, 'interval', minutes=1, args=[bot], max_instances=1, coalesce=True)
+    scheduler.add_job(OutboxDispatcher.deliver, 'interval', seconds=30, args=[bot], max_instances=1, coalesce=True)
+    if DigestDrafts.WINDOW_MINUTES > 0:
+        scheduler.add_job(DigestDrafts.prepare, 'interval', minutes=DigestDrafts.INTERVAL_MINUTES, max_instances=1, coalesce=True)
+
+    scheduler.add_job(HistoryRetention.run, 'cron', hour=3, minute=30, max_instances=1, coalesce=True)
+
+    if Cluster.shared:
+        scheduler.add_job(sync_digest_buckets, 'interval', minutes=5, max_instances=1, coalesce=True)
+
+    Metrics.watch_scheduler(scheduler)
+    return scheduler
+
+async def start_metrics(port_offset: int = 0) -> None:
+
+    """Очереди процесса и потери логов как метрики и HTTP /metrics (у воркеров вебхука — свой порт)"""
+
+    Metrics.MAILBOX_DEPTH.set_function(Mailbox.total_depth)
+    Metrics.REMINDER_QUEUE.set_function(ReminderQueue.size)
+    Metrics.CONTEXT_CACHE_USERS.set_function(ContextCache.size)
+    Metrics.WRITER_QUEUE.set_function(lambda: writer.pending)
+    Metrics.LOG_DROPPED.set_function(LogManager.dropped)
+    loop_monitor.start()
+    await Metrics.start_server(port_offset)
+
+async def shutdown(bot: Bot) -> None:
+    await loop_monitor.stop()
+    await Metrics.stop_server()
+    ResponseCache.save()
+    logger.info(f"AI response cache: {ai.cache_stats()}")
+    await bot.session.close()
+    await ai.close()
+    await writer.stop()
+    await engine.dispose()
+    logger.info("Connections closed. Bot stopped")
+    LogManager.stop()
 
 async def main() -> None:
     
-    """Инициализация систем и запуск бота"""
+    """Инициализация систем и запуск бота (один процесс, long polling)"""
 
     logger.info("Starting TimeM Bot...")
 
     await async_main()
 
+    if engine.dialect.name == 'sqlite':
+        writer.start()
+
+    await rq.fill_missing_deadlines_utc()
+    ReminderQueue.seed(await rq.get_pending_reminders())
+    logger.info(f"Reminder queue seeded with {ReminderQueue.size()} tasks")
+
     bot = Bot(token=TOKEN)
-    dp = Dispatcher()
+    dp = Dispatcher(storage=Cluster.configure(shared=False))
+    dp.update.outer_middleware(LogContextMiddleware())
     dp.include_router(router)
 
-    scheduler = AsyncIOScheduler()
-    scheduler.add_job(daily_morning_notification, 'interval', minutes=1, args=[bot])
-    scheduler.add_job(check_reminders, 'interval', minutes=1, args=[bot])
+    await sync_digest_buckets()
+    await start_metrics()
+    scheduler = build_scheduler(bot)
     scheduler.start()
     logger.info("Scheduler started successfully")
 
@@ -99,13 +207,71 @@ async def main() -> None:
     finally:
         logger.info("Shutting down...")
         scheduler.shutdown()
+        await shutdown(bot)
+
+async def prepare_webhook() -> None:
+
+    """Общая подготовка перед запуском воркеров: миграции, данные, регистрация вебхука"""
+
+    logger.info("Starting TimeM Bot in webhook mode...")
+
+    await async_main()
+    await rq.fill_missing_deadlines_utc()
+
+    bot = Bot(token=TOKEN)
+    try:
+        await WebhookServer.register(bot)
+
+    finally:
         await bot.session.close()
         await engine.dispose()
-        logger.info("Connections closed. Bot stopped")
+
+async def webhook_worker(index: int = 0) -> None:
+
+    """Воркер вебхука: общие FSM и блокировки, планировщик работает только у лидера"""
+
+    if engine.dialect.name == 'sqlite':
+        writer.start()
+
+    bot = Bot(token=TOKEN)
+    dp = Dispatcher(storage=Cluster.configure(shared=True))
+    dp.update.outer_middleware(LogContextMiddleware())
+    dp.include_router(router)
+
+    await start_metrics(port_offset=index)
+    scheduler = build_scheduler(bot)
+    scheduler.start(paused=True)
+
+    async def on_elected() -> None:
+        await sync_digest_buckets()
+        scheduler.resume()
+
+    async def on_lost() -> None:
+        scheduler.pause()
+
+    leader = LeaderElection(Cluster.locks, on_elected, on_lost)
+    leader.start()
+
+    try:
+        await WebhookServer.serve(dp, bot)
+
+    finally:
+        logger.info("Shutting down...")
+        await leader.stop()
+        scheduler.shutdown()
+        await dp.storage.close()
+        await shutdown(bot)
+
+def run_webhook_worker(index: int) -> None:
+    asyncio.run(webhook_worker(index))
 
 if __name__ == '__main__':
     try:
-        asyncio.run(main())
+        if BOT_MODE == 'webhook':
+            asyncio.run(prepare_webhook())
+            WebhookServer.spawn(run_webhook_worker)
+        else:
+            asyncio.run(main())
     
     except (KeyboardInterrupt, SystemExit):
         pass